@@ -0,0 +1,142 @@
+# Scaling benchmark of the configuration generation pipeline on synthetic
+# hardware maps (see synthetic_hwmap.py), reporting the wall time, CPU time
+# and peak python memory of each stage, as daqconf_multiru_gen --profile
+# does. The stages are the same as in daqconf_multiru_gen, with the
+# generators' default parameters.
+#
+#   python benchmark_generation.py                         # the SCALES below
+#   python benchmark_generation.py n_hosts n_cards n_links [swtpg]
+#
+# in an environment where daqconf and its schemas are available. Memory is
+# measured with tracemalloc, which slows everything down: set
+# BENCHMARK_NO_MEMORY=1 to only measure time.
+
+import math
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+from detchannelmaps._daq_detchannelmaps_py import HardwareMapService
+
+from daqconf.core.system import System
+from daqconf.core.profiling import StageProfiler
+from daqconf.core.sourceid import SourceIDBroker, get_tpg_mode
+from daqconf.core.conf_utils import make_system_connections, make_app_command_data, write_json_files
+from daqconf.core.fragment_producers import connect_all_fragment_producers, set_mlt_links
+from daqconf.apps.readout_gen import get_readout_app
+from daqconf.apps.trigger_gen import get_trigger_app
+from daqconf.apps.fake_hsi_gen import get_fake_hsi_app
+from daqconf.apps.dfo_gen import get_dfo_app
+from daqconf.apps.dataflow_gen import get_dataflow_app
+
+from synthetic_hwmap import write_hardware_map
+
+# (n_hosts, n_cards, n_links), up to production scale
+SCALES = [
+    (1, 1, 4),
+    (4, 2, 10),
+    (20, 2, 20),
+    (50, 4, 32),
+    (200, 4, 64),
+]
+
+CLOCK_SPEED_HZ = 62500000
+DATA_REQUEST_TIMEOUT = 1000
+
+
+def run_pipeline(hwmap_file, json_dir, software_tpg=False, n_dataflow=2, profiler=None):
+    """Generate the configuration for `hwmap_file` into `json_dir`, profiling each stage with `profiler`"""
+    profiler = profiler if profiler is not None else StageProfiler()
+
+    with profiler.stage("hardware map"):
+        dro_infos = HardwareMapService(hwmap_file).get_all_dro_info()
+
+    with profiler.stage("source ids"):
+        sourceid_broker = SourceIDBroker()
+        tp_mode = get_tpg_mode(False, software_tpg)
+        df_confs = {}
+        for i in range(n_dataflow):
+            source_id = sourceid_broker.get_next_source_id("TRBuilder")
+            sourceid_broker.register_source_id("TRBuilder", source_id, None)
+            df_confs[f"dataflow{i}"] = SimpleNamespace(source_id=source_id, token_count=10)
+        sourceid_broker.register_readout_source_ids(dro_infos, tp_mode)
+        sourceid_broker.generate_trigger_source_ids(dro_infos, tp_mode)
+        tp_infos = sourceid_broker.get_all_source_ids("Trigger")
+        hsi_source_id = sourceid_broker.get_next_source_id("HW_Signals_Interface")
+        sourceid_broker.register_source_id("HW_Signals_Interface", hsi_source_id, None)
+
+    the_system = System()
+
+    with profiler.stage("readout apps"):
+        for dro_info in dro_infos:
+            ru_name = f"ru{dro_info.host.replace('-', '')}{dro_info.card}"
+            the_system.apps[ru_name] = get_readout_app(HOST=dro_info.host,
+                                                       DRO_CONFIG=dro_info,
+                                                       CLOCK_SPEED_HZ=CLOCK_SPEED_HZ,
+                                                       SOFTWARE_TPG_ENABLED=software_tpg,
+                                                       DATA_REQUEST_TIMEOUT=DATA_REQUEST_TIMEOUT,
+                                                       SOURCEID_BROKER=sourceid_broker)
+
+    with profiler.stage("trigger app"):
+        the_system.apps["trigger"] = get_trigger_app(CLOCK_SPEED_HZ=CLOCK_SPEED_HZ,
+                                                     TP_CONFIG=tp_infos,
+                                                     DATA_REQUEST_TIMEOUT=DATA_REQUEST_TIMEOUT)
+
+    with profiler.stage("other apps"):
+        the_system.apps["hsi"] = get_fake_hsi_app(CLOCK_SPEED_HZ=CLOCK_SPEED_HZ, HSI_SOURCE_ID=hsi_source_id)
+        the_system.apps["dfo"] = get_dfo_app(DF_CONF=df_confs)
+        trb_timeout = int(math.sqrt(len(dro_infos)) * 2 * DATA_REQUEST_TIMEOUT)
+        for app_name, df_conf in df_confs.items():
+            the_system.apps[app_name] = get_dataflow_app(HOSTIDX=df_conf.source_id,
+                                                         APP_NAME=app_name,
+                                                         TRB_TIMEOUT=trb_timeout,
+                                                         HARDWARE_MAP_FILE=hwmap_file)
+
+    with profiler.stage("fragment producers"):
+        connect_all_fragment_producers(the_system)
+        set_mlt_links(the_system, "trigger")
+
+    with profiler.stage("system connections"):
+        make_system_connections(the_system)
+
+    with profiler.stage("app command data"):
+        app_command_datas = {name: make_app_command_data(the_system, app, name)
+                             for name, app in the_system.apps.items()}
+
+    with profiler.stage("write json"):
+        write_json_files(app_command_datas, {}, json_dir)
+
+    return the_system
+
+
+def benchmark(n_hosts, n_cards, n_links, software_tpg=False, trace_memory=True):
+    """Run the pipeline on a synthetic map, and return the per-stage records of StageProfiler"""
+    profiler = StageProfiler(trace_memory=trace_memory)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        hwmap_file = write_hardware_map(os.path.join(tmp_dir, "hwmap.txt"), n_hosts, n_cards, n_links)
+        run_pipeline(hwmap_file, os.path.join(tmp_dir, "json"), software_tpg, profiler=profiler)
+    return profiler.stages
+
+
+def print_stages(n_hosts, n_cards, n_links, stages):
+    print(f"{n_hosts} hosts x {n_cards} cards x {n_links} links = {n_hosts * n_cards * n_links} links")
+    print(f"  {'stage':<20} {'time [s]':>10} {'cpu [s]':>10} {'peak [MB]':>10}")
+    for s in stages:
+        peak = s["peak_memory_bytes"]
+        peak_str = f"{peak / 1e6:>10.1f}" if peak is not None else f"{'-':>10}"
+        print(f"  {s['stage']:<20} {s['wall_time_s']:>10.3f} {s['cpu_time_s']:>10.3f} {peak_str}")
+    print(f"  {'total':<20} {sum(s['wall_time_s'] for s in stages):>10.3f}")
+
+
+def main(*args):
+    trace_memory = not os.getenv("BENCHMARK_NO_MEMORY")
+    scales = [tuple(int(arg) for arg in args[:3])] if args else SCALES
+    software_tpg = len(args) > 3 and args[3] == "swtpg"
+    for n_hosts, n_cards, n_links in scales:
+        stages = benchmark(n_hosts, n_cards, n_links, software_tpg, trace_memory)
+        print_stages(n_hosts, n_cards, n_links, stages)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
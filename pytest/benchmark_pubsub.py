@@ -0,0 +1,71 @@
+# Microbenchmark of the pub/sub part of make_system_connections against the
+# number of TPSets links.
+#
+# Each RU link publishes its TPSets on its own connection, to which the
+# trigger app subscribes, and each RU also subscribes to the Timesync
+# topic, which the HSI and the DQM apps publish. Every subscriber gets a
+# connection per publisher of its topics, so adding them must not scan
+# the app's existing connections every time. Run with
+#
+#   python benchmark_pubsub.py [max_links]
+#
+# in an environment where daqconf and its schemas are available.
+
+import sys
+import time
+
+from daqconf.core.app import App, ModuleGraph
+from daqconf.core.conf_utils import Direction, make_system_connections
+from daqconf.core.daqmodule import DAQModule
+from daqconf.core.system import System
+
+
+def make_system(n_links, links_per_ru=10):
+    """Make a System with the TPSets and Timesync topic endpoints of the
+    readout, trigger, HSI and DQM apps for `n_links` links"""
+    the_system = System()
+    n_rus = (n_links + links_per_ru - 1) // links_per_ru
+
+    trigger = ModuleGraph([DAQModule(name="tpsets_sub", plugin="TPSetSubscriber")])
+    for ru in range(n_rus):
+        mgraph = ModuleGraph([DAQModule(name="dlh", plugin="DataLinkHandler")])
+        for link in range(ru * links_per_ru, min(n_links, (ru + 1) * links_per_ru)):
+            mgraph.add_endpoint(f"tpsets_ru{ru}_link{link}", "dlh.tpset_out", Direction.OUT, ["TPSets"])
+            trigger.add_endpoint(f"tpsets_{link}_sub", "tpsets_sub.tpset_in", Direction.IN, ["TPSets"])
+        mgraph.add_endpoint(f"timesync_{ru}", "dlh.timesync_in", Direction.IN, ["Timesync"])
+        the_system.apps[f"ru{ru}"] = App(mgraph, name=f"ru{ru}")
+    the_system.apps["trigger"] = App(trigger, name="trigger")
+
+    hsi = ModuleGraph([DAQModule(name="hsi", plugin="FakeHSIEventGenerator")])
+    hsi.add_endpoint("timesync_hsi", "hsi.timesync_out", Direction.OUT, ["Timesync"])
+    the_system.apps["hsi"] = App(hsi, name="hsi")
+
+    dqm = ModuleGraph([DAQModule(name="dqm", plugin="DQMProcessor")])
+    dqm.add_endpoint("timesync_dqm", "dqm.timesync_out", Direction.OUT, ["Timesync"])
+    the_system.apps["dqm"] = App(dqm, name="dqm")
+    return the_system
+
+
+def time_pubsub(n_links, repeats=3):
+    """Return the best of `repeats` wall times for making the connections of a system with `n_links` TPSets links"""
+    best = None
+    for _ in range(repeats):
+        the_system = make_system(n_links)
+        start = time.perf_counter()
+        make_system_connections(the_system)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, sum(len(c) for c in the_system.connections.values())
+
+
+def main(max_links=2000):
+    print(f"{'links':>8} {'conns':>8} {'time [s]':>10} {'us/link':>10}")
+    n_links = 125
+    while n_links <= max_links:
+        elapsed, n_connections = time_pubsub(n_links)
+        print(f"{n_links:>8} {n_connections:>8} {elapsed:>10.4f} {1e6 * elapsed / n_links:>10.1f}")
+        n_links *= 2
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
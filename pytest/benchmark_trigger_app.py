@@ -0,0 +1,69 @@
+# Microbenchmark of trigger app generation time against the number of TP links.
+#
+# The trigger app adds several modules and queues per TP link, so any
+# per-module or per-queue linear scan in ModuleGraph makes building it
+# quadratic in the link count. Run with
+#
+#   python benchmark_trigger_app.py [max_links]
+#
+# in an environment where daqconf and its schemas are available.
+
+import sys
+import time
+from types import SimpleNamespace
+
+from daqconf.core.sourceid import TPInfo, TAInfo, TCInfo
+from daqconf.apps.trigger_gen import get_trigger_app
+
+
+def make_tp_config(n_links, links_per_region=40):
+    """Make a Trigger SourceID -> info map like SourceIDBroker.generate_trigger_source_ids does for software TPG"""
+    tp_config = {}
+    ta_infos = {}
+    sid = 0
+    for link in range(n_links):
+        region_id = link // links_per_region
+        tp_config[sid] = TPInfo(SimpleNamespace(dro_host=f"host-{region_id}",
+                                                dro_card=0,
+                                                det_crate=region_id,
+                                                dro_source_id=link))
+        sid += 1
+        if region_id not in ta_infos:
+            ta_infos[region_id] = TAInfo()
+            ta_infos[region_id].region_id = region_id
+            ta_infos[region_id].link_count = 0
+        ta_infos[region_id].link_count += 1
+
+    for ta_info in ta_infos.values():
+        tp_config[sid] = ta_info
+        sid += 1
+    tc_info = TCInfo()
+    tc_info.ru_count = len(ta_infos)
+    tp_config[sid] = tc_info
+    return tp_config
+
+
+def time_trigger_app(n_links, repeats=3):
+    """Return the best of `repeats` wall times for building the trigger app with `n_links` TP links"""
+    tp_config = make_tp_config(n_links)
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        get_trigger_app(TP_CONFIG=tp_config)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(max_links=2560):
+    print(f"{'links':>8} {'modules':>8} {'time [s]':>10} {'us/link':>10}")
+    n_links = 10
+    while n_links <= max_links:
+        elapsed = time_trigger_app(n_links)
+        n_modules = len(get_trigger_app(TP_CONFIG=make_tp_config(n_links)).modulegraph.module_names())
+        print(f"{n_links:>8} {n_modules:>8} {elapsed:>10.4f} {1e6 * elapsed / n_links:>10.1f}")
+        n_links *= 2
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,6 @@
+# Let a plain `pytest` run in this directory find the daqconf package of
+# this repository when it isn't installed, eg outside of a work area
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "python"))
@@ -0,0 +1,59 @@
+# Synthetic detector hardware maps, in the text format read by
+# detchannelmaps' HardwareMapService, for benchmarking the generation of
+# configurations far larger than the ones in the test area.
+#
+#   python synthetic_hwmap.py n_hosts n_cards n_links [output_file]
+#
+# writes (or prints) a map with n_hosts RU hosts, n_cards cards per host
+# and n_links links per card.
+
+import sys
+
+# HD_TPC, HD_PDS, VD_Bottom_TPC and VD_Top_TPC: one per card, in turn
+DEFAULT_DET_IDS = (3, 2, 10, 11)
+
+MAX_CARDS_PER_HOST = 4
+MAX_LINKS_PER_CARD = 64
+LINKS_PER_SLR = 32
+
+HEADER = "# DRO_SourceID DetLink DetSlot DetCrate DetID DRO_Host DRO_Card DRO_SLR DRO_Link"
+
+
+def host_name(host_idx):
+    return f"np04-srv-{host_idx:03d}"
+
+
+def make_hardware_map(n_hosts, n_cards=1, n_links=10, det_ids=DEFAULT_DET_IDS):
+    """Return the text of a hardware map with `n_links` links on each of
+    `n_cards` cards of `n_hosts` RU hosts. Each card reads one detector
+    type, cycling through `det_ids`, and each host is its own crate"""
+    if not 1 <= n_cards <= MAX_CARDS_PER_HOST:
+        raise ValueError(f"n_cards must be between 1 and {MAX_CARDS_PER_HOST}, not {n_cards}")
+    if not 1 <= n_links <= MAX_LINKS_PER_CARD:
+        raise ValueError(f"n_links must be between 1 and {MAX_LINKS_PER_CARD}, not {n_links}")
+
+    lines = [HEADER]
+    source_id = 0
+    for host_idx in range(n_hosts):
+        for card in range(n_cards):
+            det_id = det_ids[(host_idx * n_cards + card) % len(det_ids)]
+            for link in range(n_links):
+                slr, dro_link = divmod(link, LINKS_PER_SLR)
+                lines.append(f"{source_id} {link} {card} {host_idx + 1} {det_id} "
+                             f"{host_name(host_idx)} {card} {slr} {dro_link}")
+                source_id += 1
+    return "\n".join(lines) + "\n"
+
+
+def write_hardware_map(path, n_hosts, n_cards=1, n_links=10, det_ids=DEFAULT_DET_IDS):
+    with open(path, "w") as f:
+        f.write(make_hardware_map(n_hosts, n_cards, n_links, det_ids))
+    return path
+
+
+if __name__ == "__main__":
+    n_hosts, n_cards, n_links = [int(arg) for arg in sys.argv[1:4]]
+    if len(sys.argv) > 4:
+        write_hardware_map(sys.argv[4], n_hosts, n_cards, n_links)
+    else:
+        print(make_hardware_map(n_hosts, n_cards, n_links), end="")
@@ -0,0 +1,38 @@
+from daqconf.core.app import App, ModuleGraph
+from daqconf.core.conf_utils import Direction, cmd_set, make_app_command_datas, make_system_connections
+from daqconf.core.daqmodule import DAQModule
+from daqconf.core.system import System
+
+
+def make_system(n_apps=4):
+    """A System of `n_apps` apps, each with a queue between two modules,
+    all but the last sending to the next one over the network"""
+    the_system = System()
+    for i in range(n_apps):
+        mgraph = ModuleGraph([DAQModule(name="source", plugin="FakeSource"),
+                              DAQModule(name="sink", plugin="FakeSink")])
+        mgraph.connect_modules("source.output", "sink.input", f"queue_{i}")
+        if i < n_apps - 1:
+            mgraph.add_endpoint(f"data_{i}", "sink.output", Direction.OUT)
+        if i > 0:
+            mgraph.add_endpoint(f"data_{i-1}", "source.input", Direction.IN)
+        the_system.apps[f"app{i}"] = App(mgraph, name=f"app{i}")
+    make_system_connections(the_system)
+    return the_system
+
+
+def test_serial_and_parallel_match():
+    the_system = make_system()
+    serial = make_app_command_datas(the_system, jobs=1)
+    parallel = make_app_command_datas(the_system, jobs=3)
+
+    assert list(serial.keys()) == list(the_system.apps.keys())
+    assert serial == parallel
+    # Pods on every path, so that callers don't have to serialise them
+    for command_datas in serial.values():
+        assert list(command_datas.keys()) == cmd_set
+        assert all(isinstance(data, dict) for data in command_datas.values())
+
+
+if __name__ == "__main__":
+    test_serial_and_parallel_match()
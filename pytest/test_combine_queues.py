@@ -0,0 +1,66 @@
+import random
+
+from daqconf.core.conf_utils import Queue
+from daqconf.core.app import ModuleGraph
+
+
+def reference_combine_queues(queues):
+    """The original list-scanning ModuleGraph.combine_queues, working on (name, push_modules, pop_modules) tuples"""
+    output_queues = []
+
+    for name, push_modules, pop_modules in queues:
+        match = False
+        for oq in output_queues:
+            if oq[0] == name:
+                match = True
+                for push_mod in push_modules:
+                    if push_mod not in oq[1]:
+                        oq[1].append(push_mod)
+                for pop_mod in pop_modules:
+                    if pop_mod not in oq[2]:
+                        oq[2].append(pop_mod)
+                break
+        if not match:
+            output_queues.append((name, list(push_modules), list(pop_modules)))
+
+    return output_queues
+
+
+def make_synthetic_queues(rng, n_queues, n_names, n_modules):
+    """Make `n_queues` Queues drawn from `n_names` names, some with several push/pop modules"""
+    queues = []
+    for _ in range(n_queues):
+        name = f"queue_{rng.randrange(n_names)}"
+        q = Queue(f"mod{rng.randrange(n_modules)}.output", f"mod{rng.randrange(n_modules)}.input", name)
+        for _ in range(rng.randrange(3)):
+            q.add_module_link(f"mod{rng.randrange(n_modules)}.output", f"mod{rng.randrange(n_modules)}.input")
+        queues.append(q)
+    return queues
+
+
+def test_combine_queues_matches_reference():
+    rng = random.Random(1234)
+    for n_queues, n_names, n_modules in [(1, 1, 1), (10, 3, 4), (100, 10, 20), (500, 500, 50), (2000, 40, 200)]:
+        queues = make_synthetic_queues(rng, n_queues, n_names, n_modules)
+        expected = reference_combine_queues([(q.name, q.push_modules, q.pop_modules) for q in queues])
+
+        mgraph = ModuleGraph(queues=queues)
+        result = [(q.name, q.push_modules, q.pop_modules) for q in mgraph.queues]
+
+        assert result == expected
+
+
+def test_named_queue_with_several_producers():
+    # The same pattern as the errored_frames_q in readout_gen: many producers, one consumer
+    queues = [Queue(f"datahandler_{i}.errored_frames", "errored_frame_consumer.input_queue", "errored_frames_q") for i in range(100)]
+    queues += [Queue(f"datahandler_{i}.errored_frames", "errored_frame_consumer.input_queue", "errored_frames_q") for i in range(50)]
+    mgraph = ModuleGraph(queues=queues)
+
+    assert len(mgraph.queues) == 1
+    assert mgraph.queues[0].push_modules == [f"datahandler_{i}.errored_frames" for i in range(100)]
+    assert mgraph.queues[0].pop_modules == ["errored_frame_consumer.input_queue"]
+
+
+if __name__ == "__main__":
+    test_combine_queues_matches_reference()
+    test_named_queue_with_several_producers()
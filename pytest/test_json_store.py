@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from daqconf.core.conf_utils import cmd_set, make_app_command_datas, write_json_files
+
+from test_app_command_datas import make_system
+
+
+EXPAND_SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "daqconf_expand_json"
+
+
+def make_system_command_datas(the_system):
+    """The system command data of conf_utils.make_system_command_datas,
+    without the boot command that needs a full configuration"""
+    return {c: {"apps": {app_name: f'data/{app_name}_{c}' for app_name in the_system.apps.keys()}}
+            for c in cmd_set}
+
+
+def read_files(json_dir):
+    return {str(path.relative_to(json_dir)): path.read_bytes()
+            for path in sorted(json_dir.rglob('*')) if path.is_file()}
+
+
+def test_expand_json_store(tmp_path):
+    the_system = make_system()
+    app_command_datas = make_app_command_datas(the_system)
+    system_command_datas = make_system_command_datas(the_system)
+
+    write_json_files(app_command_datas, system_command_datas, tmp_path / "classic")
+    write_json_files(app_command_datas, system_command_datas, tmp_path / "store", deduplicate=True)
+    assert (tmp_path / "store" / "data" / "store").is_dir()
+    assert not (tmp_path / "store" / "data" / "app0_init.json").exists()
+
+    subprocess.run([sys.executable, str(EXPAND_SCRIPT), str(tmp_path / "store")], check=True,
+                   env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+
+    classic = read_files(tmp_path / "classic")
+    assert len(classic) == len(cmd_set) * (len(the_system.apps) + 1)
+    assert read_files(tmp_path / "store") == classic
+
+
+if __name__ == "__main__":
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_expand_json_store(Path(tmp_dir))
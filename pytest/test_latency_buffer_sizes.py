@@ -0,0 +1,64 @@
+from math import ceil
+from types import SimpleNamespace
+
+from daqconf.apps.readout_gen import get_fixed_latency_buffer_size, get_latency_buffer_sizes
+from daqconf.core.latency_buffers import LATENCY_BUFFER_ALIGNMENT, LATENCY_BUFFER_ELEMENTS, LatencyBufferSize
+
+
+HD_TPC = 3
+HD_PDS = 2
+VD_TOP_TPC = 11
+
+
+def make_dro_config(det_id, n_links=2):
+    """A stand-in for the DROInfo of a card with `n_links` links"""
+    return SimpleNamespace(host="np04-srv-001", card=0,
+                           links=[SimpleNamespace(det_id=det_id, dro_source_id=100 + i) for i in range(n_links)])
+
+
+def test_sizes_from_data_rate():
+    # WIB superchunks are 12 * 464 bytes: 64 elements are the smallest aligned buffer
+    sizes = get_latency_buffer_sizes(make_dro_config(HD_TPC), CLOCK_SPEED_HZ=50000000, BUFFER_TIME_MS=10)
+    # 50 MHz / 300 ticks per superchunk for 10 ms is 1666.7 superchunks, rounded up to 27 * 64
+    assert sizes == {100: LatencyBufferSize(1728, 12 * 464), 101: LatencyBufferSize(1728, 12 * 464)}
+
+    # A buffer that holds nothing still gets one step of elements
+    sizes = get_latency_buffer_sizes(make_dro_config(HD_TPC), CLOCK_SPEED_HZ=50000000, BUFFER_TIME_MS=0)
+    assert sizes[100].elements == 64
+
+
+def test_rounding_to_the_alignment():
+    for frontend_type, det_id, clock_speed_hz in [("wib", HD_TPC, 50000000), ("wib2", HD_TPC, 62500000)]:
+        element = LATENCY_BUFFER_ELEMENTS[frontend_type]
+        for slowdown in [1, 10]:
+            elements_per_ms = clock_speed_hz / (element.ticks * slowdown) / 1000
+            for buffer_time_ms in [0.5, 1, 3.3, 100, 1000.7]:
+                sizes = get_latency_buffer_sizes(make_dro_config(det_id, 1), CLOCK_SPEED_HZ=clock_speed_hz,
+                                                 DATA_RATE_SLOWDOWN_FACTOR=slowdown, BUFFER_TIME_MS=buffer_time_ms)
+                # The smallest buffer that is aligned and big enough, found the slow way
+                needed = elements_per_ms * buffer_time_ms
+                expected = next(elements for elements in range(1, ceil(needed) + LATENCY_BUFFER_ALIGNMENT + 1)
+                                if elements >= needed and (elements * element.size) % LATENCY_BUFFER_ALIGNMENT == 0)
+                assert sizes[100] == LatencyBufferSize(expected, element.size)
+
+
+def test_fixed_sizes():
+    # Without a buffer time, the configured size
+    sizes = get_latency_buffer_sizes(make_dro_config(HD_TPC), LATENCY_BUFFER_SIZE=1000)
+    assert sizes[100] == LatencyBufferSize(1000, 12 * 464)
+
+    # Frontend types that aren't in LATENCY_BUFFER_ELEMENTS keep the configured size
+    sizes = get_latency_buffer_sizes(make_dro_config(HD_PDS), LATENCY_BUFFER_SIZE=1000, BUFFER_TIME_MS=10)
+    assert sizes[100] == LatencyBufferSize(1000, None)
+
+    # TDE always has 4096 elements
+    assert get_fixed_latency_buffer_size("tde", 1000) == 4096
+    assert get_fixed_latency_buffer_size("wib", 1000) == 1000
+    sizes = get_latency_buffer_sizes(make_dro_config(VD_TOP_TPC), LATENCY_BUFFER_SIZE=1000, BUFFER_TIME_MS=10)
+    assert sizes[100] == LatencyBufferSize(4096, None)
+
+
+if __name__ == "__main__":
+    test_sizes_from_data_rate()
+    test_rounding_to_the_alignment()
+    test_fixed_sizes()
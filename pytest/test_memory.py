@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+from daqconf.core.latency_buffers import LatencyBufferSize
+from daqconf.core.memory import (APP_BASE_MEMORY, DEFAULT_ELEMENT_SIZE, GiB, check_host_memory, estimate_app_memory,
+                                 k8s_memory_request)
+
+
+def make_module(name, plugin, conf):
+    return SimpleNamespace(name=name, plugin=plugin, conf=conf)
+
+
+def handler_conf(latency_buffer_size, stream_buffer_size=8388608):
+    return {"latencybufferconf": {"latency_buffer_size": latency_buffer_size},
+            "requesthandlerconf": {"stream_buffer_size": stream_buffer_size}}
+
+
+def make_app(modules, host="np04-srv-001"):
+    """A stand-in for an App with the modules `modules`"""
+    return SimpleNamespace(host=host, modulegraph=SimpleNamespace(modules=modules))
+
+
+def test_estimate_readout_app():
+    app = make_app([make_module("datahandler_0", "DataLinkHandler", handler_conf(1000)),
+                    make_module("tp_datahandler_100", "DataLinkHandler", handler_conf(2000)),
+                    make_module("tpbuffer", "TPBuffer", handler_conf(3000, 0)),
+                    make_module("flxcard_0", "FelixCardReader", {"dma_memory_size_gb": 4}),
+                    make_module("fragment_sender", "FragmentSender", {})])
+    connections = [SimpleNamespace(uid="wib_link_0", uri="queue://FollySPSC:100", service_type="kQueue"),
+                   SimpleNamespace(uid="sw_tp_link_0", uri="queue://FollySPSC:50", service_type="kQueue"),
+                   SimpleNamespace(uid="timesync", uri="tcp://{host}:12345", service_type="kNetSender")]
+    memory = estimate_app_memory(app, connections, {0: LatencyBufferSize(1000, 5568)})
+
+    assert memory == {"base": APP_BASE_MEMORY,
+                      # The link's elements have the frontend's size, the others a default
+                      "latency buffers": 1000 * 5568 + 2000 * DEFAULT_ELEMENT_SIZE + 3000 * 64,
+                      "stream buffers": 2 * 8388608,
+                      "dma": 4 * GiB,
+                      "queues": 100 * 5568 + 50 * DEFAULT_ELEMENT_SIZE}
+
+
+def test_k8s_memory_request():
+    assert k8s_memory_request({"base": 1}) == "1Gi"
+    assert k8s_memory_request({"base": GiB, "queues": 1}) == "2Gi"
+    assert k8s_memory_request({"base": GiB}, minimum_gi=32) == "32Gi"
+    assert k8s_memory_request({"base": 40 * GiB}, minimum_gi=32) == "40Gi"
+
+
+def test_check_host_memory():
+    the_system = SimpleNamespace(apps={"ru0": make_app([], "np04-srv-001"),
+                                       "ru1": make_app([], "np04-srv-001"),
+                                       "trigger": make_app([], "np04-srv-002")})
+    app_memory = {"ru0": {"base": 3 * GiB}, "ru1": {"base": 2 * GiB, "dma": GiB}, "trigger": {"base": GiB}}
+
+    totals = check_host_memory(the_system, app_memory, host_memory_gb={"np04-srv-001": 8})
+    assert totals == {"np04-srv-001": 6 * GiB, "np04-srv-002": GiB}
+
+    # Too much only warns unless asked to fail
+    check_host_memory(the_system, app_memory, host_memory_gb={"np04-srv-001": 4})
+    try:
+        check_host_memory(the_system, app_memory, host_memory_gb={"np04-srv-001": 8}, default_host_memory_gb=0.5, fail=True)
+        assert False, "np04-srv-002 has less RAM than its apps need"
+    except RuntimeError as e:
+        assert "np04-srv-002" in str(e) and "np04-srv-001" not in str(e)
+
+
+if __name__ == "__main__":
+    test_estimate_readout_app()
+    test_k8s_memory_request()
+    test_check_host_memory()
@@ -0,0 +1,113 @@
+from daqconf.core.app import App, ModuleGraph
+from daqconf.core.daqmodule import DAQModule
+from daqconf.core.fragment_producers import MLTLinks, mlt, remove_mlt_link, set_mlt_links
+from daqconf.core.sourceid import ensure_subsystem_string
+from daqconf.core.system import System
+
+
+def make_system(n_rus=3, n_links=5):
+    """A System with a trigger app holding the MLT and `n_rus` readout
+    apps with `n_links` Detector_Readout fragment producers each"""
+    the_system = System()
+    for ru in range(n_rus):
+        mgraph = ModuleGraph()
+        for link in range(n_links):
+            source_id = ru * 100 + link
+            mgraph.add_module(f"datahandler_{source_id}", plugin="DataLinkHandler")
+            mgraph.add_fragment_producer(id=source_id, subsystem="Detector_Readout",
+                                         requests_in=f"datahandler_{source_id}.request_input",
+                                         fragments_out=f"datahandler_{source_id}.fragment_queue")
+        the_system.apps[f"ru{ru}"] = App(mgraph, name=f"ru{ru}")
+
+    mgraph = ModuleGraph([DAQModule(name="mlt", plugin="ModuleLevelTrigger",
+                                    conf=mlt.ConfParams(links=[], dfo_connection="td_to_dfo",
+                                                        dfo_busy_connection="df_busy_signal",
+                                                        hsi_trigger_type_passthrough=False,
+                                                        buffer_timeout=100,
+                                                        td_out_of_timeout=True,
+                                                        td_readout_limit=1000))])
+    mgraph.add_fragment_producer(id=0, subsystem="Trigger",
+                                 requests_in="mlt.data_request_input_queue",
+                                 fragments_out="mlt.fragment_queue")
+    the_system.apps["trigger"] = App(mgraph, name="trigger")
+    return the_system
+
+
+def reference_mlt_links(the_system):
+    """The links of the original set_mlt_links, which made the list of all the MLT producers in one go"""
+    return [{"subsystem": ensure_subsystem_string(producer.source_id.subsystem), "element": producer.source_id.id}
+            for producer in the_system.get_fragment_producers() if producer.is_mlt_producer]
+
+
+def mlt_conf(the_system):
+    return the_system.apps["trigger"].modulegraph.get_module("mlt").conf.pod()
+
+
+def test_set_mlt_links_matches_reference():
+    the_system = make_system()
+    expected = reference_mlt_links(the_system)
+    set_mlt_links(the_system)
+
+    conf = mlt_conf(the_system)
+    assert conf["links"] == expected
+    # The rest of the configuration is kept
+    assert conf["dfo_connection"] == "td_to_dfo"
+    assert conf["dfo_busy_connection"] == "df_busy_signal"
+    assert conf["td_readout_limit"] == 1000
+
+
+def test_remove_matches_reference():
+    the_system = make_system()
+    expected = reference_mlt_links(the_system)
+    set_mlt_links(the_system)
+
+    # The original remove_mlt_link did a list.remove on the links
+    removed = {"subsystem": "Detector_Readout", "element": 102}
+    expected.remove(removed)
+    remove_mlt_link(the_system, removed)
+    assert mlt_conf(the_system)["links"] == expected
+
+    try:
+        remove_mlt_link(the_system, removed)
+        assert False, "Removing a link that isn't there should raise"
+    except ValueError:
+        pass
+
+
+def test_select_and_remove_selected():
+    the_system = make_system()
+    mlt_links = set_mlt_links(the_system)
+    expected = reference_mlt_links(the_system)
+
+    assert mlt_links.select("Detector_Readout", 100, 200) == [("Detector_Readout", e) for e in range(100, 105)]
+    assert mlt_links.select("Detector_Readout", min_element=202) == [("Detector_Readout", e) for e in [202, 203, 204]]
+    assert mlt_links.select("Detector_Readout", max_element=2) == [("Detector_Readout", 0), ("Detector_Readout", 1)]
+    assert mlt_links.select("Trigger") == [("Trigger", 0)]
+    # Without a subsystem, the links of all subsystems in the range, in their order
+    assert mlt_links.select(min_element=0, max_element=1) == [("Detector_Readout", 0), ("Trigger", 0)]
+
+    # Elements added out of order are still found
+    mlt_links.add("Detector_Readout", 150)
+    assert ("Detector_Readout", 150) in mlt_links
+    assert mlt_links.select("Detector_Readout", 100, 200)[-1] == ("Detector_Readout", 150)
+
+    removed = mlt_links.remove_selected("Detector_Readout", 100, 200)
+    assert len(removed) == 6
+    assert mlt_links.select("Detector_Readout", 100, 200) == []
+
+    # Nothing changes in the MLT's configuration until apply()
+    assert mlt_conf(the_system)["links"] == expected
+    mlt_links.apply()
+    expected = [link for link in expected
+                if not (link["subsystem"] == "Detector_Readout" and 100 <= link["element"] < 200)]
+    assert mlt_conf(the_system)["links"] == expected
+    assert len(mlt_links) == len(expected)
+
+    # A new MLTLinks starts from the MLT's configuration
+    assert list(MLTLinks(the_system)) == [(link["subsystem"], link["element"]) for link in expected]
+
+
+if __name__ == "__main__":
+    test_set_mlt_links_matches_reference()
+    test_remove_matches_reference()
+    test_select_and_remove_selected()
@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+from daqconf.core.numa_plan import make_numa_plan, make_thread_pinning, LINK_HANDLER_THREADS, THREAD_NAME_LENGTH
+
+
+CPU_TOPOLOGY = [{'host': 'np04-srv-001',
+                 'numa_nodes': [{'numa_id': 0, 'cpus': '0-7'}, {'numa_id': 1, 'cpus': '8-15'}],
+                 'isolated_cpus': '4-7,12-15'},
+                {'host': 'np04-srv-002',
+                 'numa_nodes': [{'numa_id': 0, 'cpus': '0'}],
+                 'isolated_cpus': ''}]
+
+
+def make_app(host, source_ids, software_tpg=False):
+    """A stand-in for a readout App with a DataLinkHandler per source ID"""
+    modules = [SimpleNamespace(name=f"datahandler_{sid}", plugin="DataLinkHandler",
+                               conf={'readoutmodelconf': {'source_id': sid},
+                                     'rawdataprocessorconf': {'enable_software_tpg': software_tpg}})
+               for sid in source_ids]
+    return SimpleNamespace(host=host, modulegraph=SimpleNamespace(modules=modules))
+
+
+def test_numa_plan_without_dpdk():
+    plan = make_numa_plan('np04-srv-001', 0, CPU_TOPOLOGY)
+    assert plan.cpus == [0, 1, 2, 3]
+    assert plan.worker_cpus == [4, 5, 6, 7]
+    assert plan.eal_args is None
+
+    # A single CPU is enough when there are no lcores to place
+    plan = make_numa_plan('np04-srv-002', 0, CPU_TOPOLOGY)
+    assert plan.cpus == [0]
+    assert plan.worker_cpus == [0]
+
+
+def test_numa_plan_with_dpdk():
+    plan = make_numa_plan('np04-srv-001', 1, CPU_TOPOLOGY, "-l 0-1 -n 3")
+    assert plan.cpus == [8, 9, 10, 11]
+    assert plan.worker_cpus == [14, 15]
+    assert plan.eal_args == "--lcores 0@12,1@13 -n 3"
+
+
+def test_thread_pinning_round_robin():
+    numa_plans = {'ru0': make_numa_plan('np04-srv-001', 0, CPU_TOPOLOGY),
+                  'ru1': make_numa_plan('np04-srv-001', 0, CPU_TOPOLOGY)}
+    apps = {'ru0': make_app('np04-srv-001', [0, 1]), 'ru1': make_app('np04-srv-001', [2])}
+    pinning = make_thread_pinning(numa_plans, apps)["daq_application"]
+
+    assert pinning["--name ru0"]["parent"] == "0-3"
+    # The two apps share the worker CPUs of the node
+    cpus = [int(cpu) for name in ["--name ru0", "--name ru1"] for cpu in pinning[name]["threads"].values()]
+    assert cpus == [4 + i % 4 for i in range(3 * len(LINK_HANDLER_THREADS))]
+
+
+def test_thread_names_fit():
+    numa_plans = {'ru0': make_numa_plan('np04-srv-001', 1, CPU_TOPOLOGY)}
+    apps = {'ru0': make_app('np04-srv-001', [1, 10, 11], software_tpg=True)}
+    threads = make_thread_pinning(numa_plans, apps)["daq_application"]["--name ru0"]["threads"]
+
+    assert all(len(thread.rstrip("$")) <= THREAD_NAME_LENGTH for thread in threads)
+    assert threads["consumer-10$"] == "14"
+    # postprocess-0-10 and postprocess-0-11 are both postprocess-0-1 to
+    # the kernel, like the thread of source ID 1: they share their CPUs
+    assert threads["postprocess-0-1$"] == "13,15"
+
+
+if __name__ == "__main__":
+    test_numa_plan_without_dpdk()
+    test_numa_plan_with_dpdk()
+    test_thread_pinning_round_robin()
+    test_thread_names_fit()
@@ -0,0 +1,92 @@
+from math import ceil
+
+from daqconf.core.app import App, ModuleGraph
+from daqconf.core.conf_utils import Direction, make_system_connections
+from daqconf.core.daqmodule import DAQModule
+from daqconf.core.latency_buffers import LATENCY_BUFFER_ELEMENTS
+from daqconf.core.queue_sizing import MIN_QUEUE_SIZE, QueueRates, compute_app_queue_sizes, size_queues
+from daqconf.core.system import System
+
+
+RATES = QueueRates(clock_speed_hz=62500000,
+                   data_rate_slowdown_factor=1,
+                   tp_rate_per_link_hz=1000,
+                   tpset_rate_per_link_hz=100,
+                   ta_rate_hz=10,
+                   trigger_rate_hz=1)
+
+
+def make_system():
+    """A readout app with a card reader, a link and its TP handler, sending
+    its timesync messages to a trigger app over the network"""
+    the_system = System()
+    mgraph = ModuleGraph([DAQModule(name="flxcard_0", plugin="FelixCardReader"),
+                          DAQModule(name="datahandler_0", plugin="DataLinkHandler"),
+                          DAQModule(name="tp_datahandler_100", plugin="DataLinkHandler"),
+                          DAQModule(name="errored_frame_consumer", plugin="ErroredFrameConsumer")])
+    mgraph.connect_modules("flxcard_0.output_0", "datahandler_0.raw_input", "wib2_link_0", 100000)
+    mgraph.connect_modules("datahandler_0.tp_out", "tp_datahandler_100.raw_input", "sw_tp_link_0", 100000)
+    mgraph.connect_modules("datahandler_0.errored_frames", "errored_frame_consumer.input_queue", "errored_frames_q", 1000)
+    mgraph.add_endpoint("timesync_ru0", "datahandler_0.timesync_output", Direction.OUT)
+    the_system.apps["ru0"] = App(mgraph, name="ru0")
+
+    mgraph = ModuleGraph([DAQModule(name="tpzipper", plugin="FakeSink")])
+    mgraph.add_endpoint("timesync_ru0", "tpzipper.input", Direction.IN)
+    the_system.apps["trigger"] = App(mgraph, name="trigger")
+    make_system_connections(the_system)
+    return the_system
+
+
+def test_rate_times_burst():
+    the_system = make_system()
+    sizes = compute_app_queue_sizes(the_system.apps["ru0"], the_system.connections["ru0"], RATES, 10)
+
+    # A WIB2 superchunk every 384 ticks, for the 10 ms burst and the 1 ms latency of the DataLinkHandler
+    frame_rate = 62500000 / LATENCY_BUFFER_ELEMENTS["wib2"].ticks
+    assert sizes["wib2_link_0"] == ceil(frame_rate * 11 / 1000) == 1791
+    assert sizes["sw_tp_link_0"] == ceil(1000 * 11 / 1000)
+    # The ErroredFrameConsumer's input rate isn't known
+    assert "errored_frames_q" not in sizes
+
+    # Slowing the data down slows the frames, not the TPs
+    slow = compute_app_queue_sizes(the_system.apps["ru0"], the_system.connections["ru0"],
+                                   RATES._replace(data_rate_slowdown_factor=10), 10)
+    assert slow["wib2_link_0"] == ceil(frame_rate / 10 * 11 / 1000)
+    assert slow["sw_tp_link_0"] == sizes["sw_tp_link_0"]
+
+
+def test_floor_and_no_cap():
+    the_system = make_system()
+    # Rare TPs and no burst would need 1 element
+    sizes = compute_app_queue_sizes(the_system.apps["ru0"], the_system.connections["ru0"],
+                                    RATES._replace(tp_rate_per_link_hz=1), 0)
+    assert sizes["sw_tp_link_0"] == MIN_QUEUE_SIZE
+
+    # There is no upper bound: a long burst gets all the elements it needs
+    sizes = compute_app_queue_sizes(the_system.apps["ru0"], the_system.connections["ru0"], RATES, 10000)
+    assert sizes["wib2_link_0"] == ceil(62500000 / 384 * 10001 / 1000)
+
+
+def test_size_queues_leaves_other_connections_alone():
+    the_system = make_system()
+    before = {app_name: {c.uid: (c.service_type, c.uri) for c in connections}
+              for app_name, connections in the_system.connections.items()}
+
+    resized = size_queues(the_system, RATES, 10)
+    assert resized == {"ru0": {"wib2_link_0": (100000, 1791), "sw_tp_link_0": (100000, 11)}}
+
+    after = {app_name: {c.uid: (c.service_type, c.uri) for c in connections}
+             for app_name, connections in the_system.connections.items()}
+    assert after["ru0"]["wib2_link_0"] == ("kQueue", before["ru0"]["wib2_link_0"][1].replace(":100000", ":1791"))
+    for app_name, connections in before.items():
+        for uid, connection in connections.items():
+            if (app_name, uid) not in [("ru0", "wib2_link_0"), ("ru0", "sw_tp_link_0")]:
+                assert after[app_name][uid] == connection
+    # The network connections are in there, untouched
+    assert any(service_type != "kQueue" for service_type, _ in after["ru0"].values())
+
+
+if __name__ == "__main__":
+    test_rate_times_burst()
+    test_floor_and_no_cap()
+    test_size_queues_leaves_other_connections_alone()
@@ -0,0 +1,95 @@
+from daqconf.core.sourceid import SourceIDBroker, FWTPID, FWTPOUTID
+
+
+def reference_next_source_id(used, start_id=0):
+    """The original get_next_source_id, which tried each ID from start_id in turn"""
+    next_id = start_id
+    while next_id in used:
+        next_id += 1
+    return next_id
+
+
+def test_next_source_id_skips_used_ids():
+    broker = SourceIDBroker()
+    assert broker.get_next_source_id("Trigger") == 0
+
+    for sid in [0, 1, 2, 5, 6, 10]:
+        broker.register_source_id("Trigger", sid, None)
+    used = set(broker.get_all_source_ids("Trigger"))
+
+    for start_id in range(15):
+        assert broker.get_next_source_id("Trigger", start_id) == reference_next_source_id(used, start_id)
+    # Each subsystem has its own IDs
+    assert broker.get_next_source_id("Detector_Readout") == 0
+
+
+def test_reserved_ids_in_the_middle_of_a_range():
+    broker = SourceIDBroker()
+    # IDs registered out of order split the free intervals in the middle
+    for sid in [50, 20, 21, 22, 49, 51, 35]:
+        broker.register_source_id("Trigger", sid, None)
+    # Then hand out IDs from 0 the way the generators do
+    handed_out = []
+    for _ in range(60):
+        sid = broker.get_next_source_id("Trigger")
+        broker.register_source_id("Trigger", sid, None)
+        handed_out.append(sid)
+
+    reserved = {50, 20, 21, 22, 49, 51, 35}
+    assert handed_out == [sid for sid in range(67) if sid not in reserved]
+    assert broker.get_next_source_id("Trigger", 20) == 67
+
+    try:
+        broker.register_source_id("Trigger", 35, None)
+        assert False, "Registering an ID twice should raise"
+    except ValueError:
+        pass
+
+
+def test_running_out_of_ids():
+    broker = SourceIDBroker(max_source_id=3)
+    for sid in [0, 2]:
+        broker.register_source_id("Trigger", sid, None)
+    assert broker.get_next_source_id("Trigger") == 1
+    assert broker.get_next_source_id("Trigger", 2) == 3
+    broker.register_source_id("Trigger", 3, None)
+
+    try:
+        broker.get_next_source_id("Trigger", 2)
+        assert False, "There should be no free ID from 2"
+    except RuntimeError:
+        pass
+    assert broker.get_next_source_id("Trigger") == 1
+
+    try:
+        broker.register_source_id("Trigger", 4, None)
+        assert False, "IDs past max_source_id can't be registered"
+    except ValueError:
+        pass
+
+
+def test_find_source_ids_by_info():
+    broker = SourceIDBroker()
+    broker.register_source_id("Detector_Readout", 7, FWTPID("host-a", 0, 1))
+    broker.register_source_id("Detector_Readout", 3, FWTPID("host-a", 0, 0))
+    broker.register_source_id("Detector_Readout", 4, FWTPID("host-b", 0, 0))
+    broker.register_source_id("Detector_Readout", 8, FWTPOUTID("host-a", 0, 3))
+    # Unhashable info objects are still found
+    broker.register_source_id("Detector_Readout", 0, ["link"])
+
+    assert broker.find_source_ids("Detector_Readout", FWTPID("host-a", 0, 0)) == [3]
+    assert broker.find_source_ids("Detector_Readout", ["link"]) == [0]
+    # A FWTPOUTID with the same values as a FWTPID is a different info
+    assert broker.find_source_ids("Detector_Readout", FWTPOUTID("host-a", 0, 0)) == []
+
+    assert broker.find_infos("Detector_Readout", FWTPID, host="host-a", card=0) == [(3, FWTPID("host-a", 0, 0)),
+                                                                                   (7, FWTPID("host-a", 0, 1))]
+    assert broker.find_infos("Detector_Readout", FWTPOUTID, host="host-a", card=0) == [(8, FWTPOUTID("host-a", 0, 3))]
+    assert broker.find_infos("Detector_Readout", FWTPID, host="host-c") == []
+
+
+if __name__ == "__main__":
+    test_next_source_id_skips_used_ids()
+    test_reserved_ids_in_the_middle_of_a_range()
+    test_running_out_of_ids()
+    test_find_source_ids_by_info()
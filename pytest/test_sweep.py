@@ -0,0 +1,118 @@
+import copy
+import json
+import os
+
+from daqconf.core.sweep import (apply_sweep_point, link_identical_files, load_sweep_file, prune_store,
+                                sweep_points, unlink_shared_files)
+
+
+class FakeConfig:
+    """A stand-in for a moo record like confgen.daqconf_multiru_gen: the
+    default is a fresh copy of DEFAULTS, update() merges a nested dict"""
+    DEFAULTS = {"readout": {"latency_buffer_size": 499968, "data_file": "frames.bin"},
+                "dataflow": {"apps": [{"app_name": "dataflow0", "token_count": 10},
+                                      {"app_name": "dataflow1", "token_count": 10}]},
+                "trigger": {"trigger_rate_hz": 1.0}}
+
+    def __init__(self):
+        self._data = copy.deepcopy(self.DEFAULTS)
+
+    def pod(self):
+        return copy.deepcopy(self._data)
+
+    def update(self, data):
+        self._data.update(copy.deepcopy(data))
+
+
+def test_sweep_points(tmp_path):
+    sweep_file = tmp_path / "sweep.json"
+    sweep_file.write_text(json.dumps({"readout.latency_buffer_size": [1, 2], "trigger.trigger_rate_hz": [1.0, 10.0, 100.0]}))
+    points = sweep_points(load_sweep_file(sweep_file))
+    assert len(points) == 6
+    assert points[0] == {"readout.latency_buffer_size": 1, "trigger.trigger_rate_hz": 1.0}
+    assert points[-1] == {"readout.latency_buffer_size": 2, "trigger.trigger_rate_hz": 100.0}
+
+    sweep_file.write_text(json.dumps({"readout.latency_buffer_size": []}))
+    try:
+        load_sweep_file(sweep_file)
+        assert False, "A parameter without values should be refused"
+    except RuntimeError:
+        pass
+
+
+def test_apply_sweep_point():
+    config = FakeConfig()
+    point = apply_sweep_point(config, {"readout.latency_buffer_size": 999936,
+                                       "dataflow.apps[*].token_count": 20,
+                                       "dataflow.apps[1].app_name": "df1"})
+    data = point.pod()
+    assert data["readout"] == {"latency_buffer_size": 999936, "data_file": "frames.bin"}
+    assert data["dataflow"]["apps"] == [{"app_name": "dataflow0", "token_count": 20},
+                                        {"app_name": "df1", "token_count": 20}]
+    assert data["trigger"] == {"trigger_rate_hz": 1.0}
+    # The original configuration is left alone
+    assert config.pod() == FakeConfig.DEFAULTS
+
+    for bad_path in ["readout.latency_buffer", "dataflow.apps[2].token_count", "readout[0].data_file", "readout.data file"]:
+        try:
+            apply_sweep_point(config, {bad_path: 1})
+            assert False, f"{bad_path} shouldn't apply"
+        except RuntimeError:
+            pass
+
+
+def write_configuration(output_dir, files):
+    output_dir.mkdir(parents=True)
+    for name, content in files.items():
+        path = output_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def test_link_identical_files(tmp_path):
+    store = tmp_path / "store"
+    write_configuration(tmp_path / "point0", {"boot.json": "boot", "data/ru0_conf.json": "ru0", "data/tp_conf.json": "tp0"})
+    write_configuration(tmp_path / "point1", {"boot.json": "boot", "data/ru0_conf.json": "ru0", "data/tp_conf.json": "tp1"})
+
+    assert link_identical_files(tmp_path / "point0", store) == 0
+    assert len(list(store.iterdir())) == 3
+    assert link_identical_files(tmp_path / "point1", store) == 2
+    assert len(list(store.iterdir())) == 4
+
+    assert os.path.samefile(tmp_path / "point0" / "boot.json", tmp_path / "point1" / "boot.json")
+    assert os.path.samefile(tmp_path / "point0" / "data" / "ru0_conf.json", tmp_path / "point1" / "data" / "ru0_conf.json")
+    assert not os.path.samefile(tmp_path / "point0" / "data" / "tp_conf.json", tmp_path / "point1" / "data" / "tp_conf.json")
+    assert (tmp_path / "point1" / "data" / "tp_conf.json").read_text() == "tp1"
+    # Linking again finds everything in the store and changes nothing
+    assert link_identical_files(tmp_path / "point1", store) == 3
+    assert len(list(store.iterdir())) == 4
+
+
+def test_unlink_before_rewrite(tmp_path):
+    store = tmp_path / "store"
+    for point in ["point0", "point1"]:
+        write_configuration(tmp_path / point, {"boot.json": "boot", "data/ru0_conf.json": "ru0"})
+        link_identical_files(tmp_path / point, store)
+
+    # Rewriting a configuration in place must not change the other one
+    assert unlink_shared_files(tmp_path / "point1") == 2
+    (tmp_path / "point1" / "boot.json").write_text("new boot")
+    assert (tmp_path / "point0" / "boot.json").read_text() == "boot"
+    assert (tmp_path / "point1" / "data" / "ru0_conf.json").read_text() == "ru0"
+    assert not os.path.samefile(tmp_path / "point0" / "boot.json", tmp_path / "point1" / "boot.json")
+
+    # point0 still shares its files with the store, which keeps them
+    assert prune_store(store) == 0
+    assert unlink_shared_files(tmp_path / "point0") == 2
+    assert prune_store(store) == 2
+    assert list(store.iterdir()) == []
+    assert (tmp_path / "point0" / "boot.json").read_text() == "boot"
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for test in [test_sweep_points, test_link_identical_files, test_unlink_before_rewrite]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test(Path(tmp_dir))
+    test_apply_sweep_point()
@@ -1,35 +1,19 @@
 
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
-# Load configuration types
-import moo.otypes
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('appfwk/cmd.jsonnet')
-moo.otypes.load_types('appfwk/app.jsonnet')
-
-moo.otypes.load_types('dfmodules/triggerrecordbuilder.jsonnet')
-moo.otypes.load_types('dfmodules/datawriter.jsonnet')
-moo.otypes.load_types('dfmodules/hdf5datastore.jsonnet')
-moo.otypes.load_types('dfmodules/fragmentreceiver.jsonnet')
-moo.otypes.load_types('dfmodules/triggerdecisionreceiver.jsonnet')
-
+# Configuration types, loaded when a generator first uses them
+from daqconf.core.schema import lazy_types
 
 # Import new types
-import dunedaq.cmdlib.cmd as basecmd # AddressedCmd,
-import dunedaq.rcif.cmd as rccmd # AddressedCmd,
-import dunedaq.appfwk.cmd as cmd # AddressedCmd,
-import dunedaq.appfwk.app as app # AddressedCmd,
-import dunedaq.dfmodules.triggerrecordbuilder as trb
-import dunedaq.dfmodules.datawriter as dw
-import dunedaq.hdf5libs.hdf5filelayout as h5fl
-import dunedaq.dfmodules.hdf5datastore as hdf5ds
-import dunedaq.dfmodules.fragmentreceiver as frcv
-import dunedaq.dfmodules.triggerdecisionreceiver as tdrcv
+basecmd = lazy_types('dunedaq.cmdlib.cmd', 'rcif/cmd.jsonnet') # AddressedCmd,
+rccmd = lazy_types('dunedaq.rcif.cmd', 'rcif/cmd.jsonnet') # AddressedCmd,
+cmd = lazy_types('dunedaq.appfwk.cmd', 'appfwk/cmd.jsonnet') # AddressedCmd,
+app = lazy_types('dunedaq.appfwk.app', 'appfwk/app.jsonnet') # AddressedCmd,
+trb = lazy_types('dunedaq.dfmodules.triggerrecordbuilder', 'dfmodules/triggerrecordbuilder.jsonnet')
+dw = lazy_types('dunedaq.dfmodules.datawriter', 'dfmodules/datawriter.jsonnet')
+h5fl = lazy_types('dunedaq.hdf5libs.hdf5filelayout', 'dfmodules/hdf5datastore.jsonnet')
+hdf5ds = lazy_types('dunedaq.dfmodules.hdf5datastore', 'dfmodules/hdf5datastore.jsonnet')
+frcv = lazy_types('dunedaq.dfmodules.fragmentreceiver', 'dfmodules/fragmentreceiver.jsonnet')
+tdrcv = lazy_types('dunedaq.dfmodules.triggerdecisionreceiver', 'dfmodules/triggerdecisionreceiver.jsonnet')
 
-from appfwk.utils import acmd, mcmd, mrccmd, mspec
 from daqconf.core.app import App, ModuleGraph
 from daqconf.core.daqmodule import DAQModule
 from daqconf.core.conf_utils import Direction, data_request_endpoint_name
@@ -1,15 +1,9 @@
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
-# Load configuration types
+# Configuration types, loaded when a generator first uses them
+from daqconf.core.schema import lazy_types
 import moo.otypes
 
-moo.otypes.load_types('dfmodules/datafloworchestrator.jsonnet')
-
 # Import new types
-import dunedaq.dfmodules.datafloworchestrator as dfo
+dfo = lazy_types('dunedaq.dfmodules.datafloworchestrator', 'dfmodules/datafloworchestrator.jsonnet')
 
 from daqconf.core.app import App, ModuleGraph
 from daqconf.core.daqmodule import DAQModule
@@ -1,16 +1,8 @@
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-
-moo.io.default_load_path = get_moo_model_path()
-
-# Load configuration types
-import moo.otypes
-
-moo.otypes.load_types("dpdklibs/nicsender.jsonnet")
+# Configuration types, loaded when a generator first uses them
+from daqconf.core.schema import lazy_types
 
 # Import new types
-import dunedaq.dpdklibs.nicsender as nsc
+nsc = lazy_types('dunedaq.dpdklibs.nicsender', 'dpdklibs/nicsender.jsonnet')
 
 from daqconf.core.app import App, ModuleGraph
 from daqconf.core.daqmodule import DAQModule
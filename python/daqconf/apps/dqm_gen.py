@@ -1,27 +1,15 @@
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
-# Load configuration types
-import moo.otypes
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('appfwk/cmd.jsonnet')
-moo.otypes.load_types('appfwk/app.jsonnet')
-moo.otypes.load_types('dfmodules/triggerrecordbuilder.jsonnet')
-moo.otypes.load_types('dfmodules/fragmentreceiver.jsonnet')
-moo.otypes.load_types('dqm/dqmprocessor.jsonnet')
+# Configuration types, loaded when a generator first uses them
+from daqconf.core.schema import lazy_types
 
 # Import new types
-import dunedaq.cmdlib.cmd as basecmd # AddressedCmd,
-import dunedaq.rcif.cmd as rccmd # AddressedCmd,
-import dunedaq.appfwk.cmd as cmd # AddressedCmd,
-import dunedaq.appfwk.app as app # AddressedCmd,
-import dunedaq.dfmodules.triggerrecordbuilder as trb
-import dunedaq.dfmodules.fragmentreceiver as frcv
-import dunedaq.dqm.dqmprocessor as dqmprocessor
-
-from appfwk.utils import acmd, mcmd, mrccmd, mspec
+basecmd = lazy_types('dunedaq.cmdlib.cmd', 'rcif/cmd.jsonnet') # AddressedCmd,
+rccmd = lazy_types('dunedaq.rcif.cmd', 'rcif/cmd.jsonnet') # AddressedCmd,
+cmd = lazy_types('dunedaq.appfwk.cmd', 'appfwk/cmd.jsonnet') # AddressedCmd,
+app = lazy_types('dunedaq.appfwk.app', 'appfwk/app.jsonnet') # AddressedCmd,
+trb = lazy_types('dunedaq.dfmodules.triggerrecordbuilder', 'dfmodules/triggerrecordbuilder.jsonnet')
+frcv = lazy_types('dunedaq.dfmodules.fragmentreceiver', 'dfmodules/fragmentreceiver.jsonnet')
+dqmprocessor = lazy_types('dunedaq.dqm.dqmprocessor', 'dqm/dqmprocessor.jsonnet')
+
 
 from daqconf.core.conf_utils import Direction
 from daqconf.core.daqmodule import DAQModule
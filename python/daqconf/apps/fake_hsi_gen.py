@@ -11,29 +11,17 @@
 # fragments are provided by the FakeDataProd module from dfmodules
 
 
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
-# Load configuration types
-import moo.otypes
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('appfwk/cmd.jsonnet')
-moo.otypes.load_types('appfwk/app.jsonnet')
-
-moo.otypes.load_types('hsilibs/fakehsieventgenerator.jsonnet')
-moo.otypes.load_types('readoutlibs/readoutconfig.jsonnet')
+# Configuration types, loaded when a generator first uses them
+from daqconf.core.schema import lazy_types
 
 # Import new types
-import dunedaq.cmdlib.cmd as basecmd # AddressedCmd,
-import dunedaq.rcif.cmd as rccmd # AddressedCmd,
-import dunedaq.appfwk.cmd as cmd # AddressedCmd,
-import dunedaq.appfwk.app as app # AddressedCmd,
-import dunedaq.hsilibs.fakehsieventgenerator as fhsig
-import dunedaq.readoutlibs.readoutconfig as rconf
+basecmd = lazy_types('dunedaq.cmdlib.cmd', 'rcif/cmd.jsonnet') # AddressedCmd,
+rccmd = lazy_types('dunedaq.rcif.cmd', 'rcif/cmd.jsonnet') # AddressedCmd,
+cmd = lazy_types('dunedaq.appfwk.cmd', 'appfwk/cmd.jsonnet') # AddressedCmd,
+app = lazy_types('dunedaq.appfwk.app', 'appfwk/app.jsonnet') # AddressedCmd,
+fhsig = lazy_types('dunedaq.hsilibs.fakehsieventgenerator', 'hsilibs/fakehsieventgenerator.jsonnet')
+rconf = lazy_types('dunedaq.readoutlibs.readoutconfig', 'readoutlibs/readoutconfig.jsonnet')
 
-from appfwk.utils import acmd, mcmd, mrccmd, mspec
     
 from daqconf.core.daqmodule import DAQModule
 from daqconf.core.app import ModuleGraph, App
@@ -14,22 +14,13 @@ import math
 from rich.console import Console
 console = Console()
 
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
+# Configuration types, loaded when a generator first uses them
+from daqconf.core.schema import lazy_types
 
-# Load configuration types
-import moo.otypes
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('hsilibs/hsireadout.jsonnet')
-moo.otypes.load_types('hsilibs/hsicontroller.jsonnet')
-moo.otypes.load_types('readoutlibs/readoutconfig.jsonnet')
-
-import dunedaq.rcif.cmd as rccmd # AddressedCmd, 
-import dunedaq.hsilibs.hsireadout as hsir
-import dunedaq.hsilibs.hsicontroller as hsic
-import dunedaq.readoutlibs.readoutconfig as rconf
+rccmd = lazy_types('dunedaq.rcif.cmd', 'rcif/cmd.jsonnet') # AddressedCmd, 
+hsir = lazy_types('dunedaq.hsilibs.hsireadout', 'hsilibs/hsireadout.jsonnet')
+hsic = lazy_types('dunedaq.hsilibs.hsicontroller', 'hsilibs/hsicontroller.jsonnet')
+rconf = lazy_types('dunedaq.readoutlibs.readoutconfig', 'readoutlibs/readoutconfig.jsonnet')
 
 from daqconf.core.app import App, ModuleGraph
 from daqconf.core.daqmodule import DAQModule
@@ -1,43 +1,30 @@
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
-# Load configuration types
-import moo.otypes
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('appfwk/cmd.jsonnet')
-moo.otypes.load_types('appfwk/app.jsonnet')
-
-moo.otypes.load_types('flxlibs/felixcardreader.jsonnet')
-moo.otypes.load_types('dtpctrllibs/dtpcontroller.jsonnet')
-moo.otypes.load_types('readoutlibs/sourceemulatorconfig.jsonnet')
-moo.otypes.load_types('readoutlibs/readoutconfig.jsonnet')
-moo.otypes.load_types('lbrulibs/pacmancardreader.jsonnet')
-moo.otypes.load_types('dfmodules/fakedataprod.jsonnet')
-moo.otypes.load_types("dpdklibs/nicreader.jsonnet")
-
+# Configuration types, loaded when a generator first uses them
+from daqconf.core.schema import lazy_types
 
 # Import new types
-import dunedaq.cmdlib.cmd as basecmd # AddressedCmd,
-import dunedaq.rcif.cmd as rccmd # AddressedCmd,
-import dunedaq.appfwk.cmd as cmd # AddressedCmd,
-import dunedaq.appfwk.app as app # AddressedCmd,
-import dunedaq.readoutlibs.sourceemulatorconfig as sec
-import dunedaq.flxlibs.felixcardreader as flxcr
-import dunedaq.dtpctrllibs.dtpcontroller as dtpctrl
-import dunedaq.readoutlibs.readoutconfig as rconf
-import dunedaq.lbrulibs.pacmancardreader as pcr
+basecmd = lazy_types('dunedaq.cmdlib.cmd', 'rcif/cmd.jsonnet') # AddressedCmd,
+rccmd = lazy_types('dunedaq.rcif.cmd', 'rcif/cmd.jsonnet') # AddressedCmd,
+cmd = lazy_types('dunedaq.appfwk.cmd', 'appfwk/cmd.jsonnet') # AddressedCmd,
+app = lazy_types('dunedaq.appfwk.app', 'appfwk/app.jsonnet') # AddressedCmd,
+sec = lazy_types('dunedaq.readoutlibs.sourceemulatorconfig', 'readoutlibs/sourceemulatorconfig.jsonnet')
+flxcr = lazy_types('dunedaq.flxlibs.felixcardreader', 'flxlibs/felixcardreader.jsonnet')
+dtpctrl = lazy_types('dunedaq.dtpctrllibs.dtpcontroller', 'dtpctrllibs/dtpcontroller.jsonnet')
+rconf = lazy_types('dunedaq.readoutlibs.readoutconfig', 'readoutlibs/readoutconfig.jsonnet')
+pcr = lazy_types('dunedaq.lbrulibs.pacmancardreader', 'lbrulibs/pacmancardreader.jsonnet')
 # import dunedaq.dfmodules.triggerrecordbuilder as trb
-import dunedaq.dfmodules.fakedataprod as fdp
-import dunedaq.dpdklibs.nicreader as nrc
+fdp = lazy_types('dunedaq.dfmodules.fakedataprod', 'dfmodules/fakedataprod.jsonnet')
+nrc = lazy_types('dunedaq.dpdklibs.nicreader', 'dpdklibs/nicreader.jsonnet')
 
-from appfwk.utils import acmd, mcmd, mrccmd, mspec
 from os import path
+from math import ceil, gcd
 
 import json
 from daqconf.core.conf_utils import Direction, Queue
 from daqconf.core.sourceid import TPInfo, SourceIDBroker, FWTPID, FWTPOUTID
+from daqconf.core.latency_buffers import LATENCY_BUFFER_ALIGNMENT, LATENCY_BUFFER_ELEMENTS, LatencyBufferSize
+
+from rich.console import Console
+console = Console()
 from daqconf.core.daqmodule import DAQModule
 from daqconf.core.app import App,ModuleGraph
 
@@ -48,6 +35,75 @@ QUEUE_POP_WAIT_MS = 10 # This affects stop time, as each link will wait this lon
 # local clock speed Hz
 # CLOCK_SPEED_HZ = 50000000;
 
+def get_frontend_type(DRO_CONFIG, CLOCK_SPEED_HZ):
+    """The frontend type of the links of DRO_CONFIG, and the fragment type of their fake data"""
+
+    # Hack on strings to be used for connection instances: will be solved when data_type is properly used.
+
+    FAKEDATA_FRAGMENT_TYPE = "Unknown"
+    FRONTEND_TYPE = DetID.subdetector_to_string(DetID.Subdetector(DRO_CONFIG.links[0].det_id))
+    if ((FRONTEND_TYPE== "HD_TPC" or FRONTEND_TYPE== "VD_Bottom_TPC") and CLOCK_SPEED_HZ== 50000000):
+        FRONTEND_TYPE = "wib"
+        FAKEDATA_FRAGMENT_TYPE = "ProtoWIB"
+    elif ((FRONTEND_TYPE== "HD_TPC" or FRONTEND_TYPE== "VD_Bottom_TPC") and CLOCK_SPEED_HZ== 62500000):
+        FRONTEND_TYPE = "wib2"
+        FAKEDATA_FRAGMENT_TYPE = "WIB"
+    elif FRONTEND_TYPE== "HD_PDS" or FRONTEND_TYPE== "VD_Cathode_PDS" or FRONTEND_TYPE=="VD_Membrane_PDS":
+        FRONTEND_TYPE = "pds_list"
+        FAKEDATA_FRAGMENT_TYPE = "DAPHNE"
+    elif FRONTEND_TYPE== "VD_Top_TPC":
+        FRONTEND_TYPE = "tde"
+        FAKEDATA_FRAGMENT_TYPE = "TDE_AMC"
+    elif FRONTEND_TYPE== "ND_LAr":
+        FRONTEND_TYPE = "pacman"
+        FAKEDATA_FRAGMENT_TYPE = "PACMAN"
+    return FRONTEND_TYPE, FAKEDATA_FRAGMENT_TYPE
+
+def get_fixed_latency_buffer_size(FRONTEND_TYPE, LATENCY_BUFFER_SIZE=499968):
+    """
+    The number of elements of the latency buffers that aren't sized from
+    their data rate: LATENCY_BUFFER_SIZE, except for TDE
+    """
+    # For raw recording to work the size of the LB has to be a multiple of 4096 bytes so that gives
+    # us the following problem:
+    # number_of_elements * element_size = 4096 * M,  where M is an arbitrary integer,
+    # so only a value of number_elements that satisfies the equation above is valid.
+    if FRONTEND_TYPE == 'tde':
+        # number_of_elements = 4096 is always a solution by construction and
+        # the total size happens to be quite close to the one when using WIB
+        # as the frontend type
+        return 4096
+    return LATENCY_BUFFER_SIZE
+
+def get_latency_buffer_sizes(DRO_CONFIG,
+                             CLOCK_SPEED_HZ=50000000,
+                             DATA_RATE_SLOWDOWN_FACTOR=1,
+                             LATENCY_BUFFER_SIZE=499968,
+                             BUFFER_TIME_MS=None):
+    """
+    The LatencyBufferSize of each link of DRO_CONFIG, by source ID.
+
+    With BUFFER_TIME_MS, the latency buffers of the frontend types of
+    LATENCY_BUFFER_ELEMENTS are sized to hold that much data at the links'
+    frame rate, rounded up so that they are a multiple of
+    LATENCY_BUFFER_ALIGNMENT bytes. The others, and all of them without
+    BUFFER_TIME_MS, get get_fixed_latency_buffer_size elements.
+    """
+    FRONTEND_TYPE, _ = get_frontend_type(DRO_CONFIG, CLOCK_SPEED_HZ)
+    element = LATENCY_BUFFER_ELEMENTS.get(FRONTEND_TYPE)
+    if BUFFER_TIME_MS is not None and element is not None:
+        elements_per_s = CLOCK_SPEED_HZ / (element.ticks * DATA_RATE_SLOWDOWN_FACTOR)
+        # number_of_elements * element_size has to be a multiple of the alignment
+        step = LATENCY_BUFFER_ALIGNMENT // gcd(element.size, LATENCY_BUFFER_ALIGNMENT)
+        elements = max(step, ceil(elements_per_s * BUFFER_TIME_MS / 1000 / step) * step)
+    else:
+        elements = get_fixed_latency_buffer_size(FRONTEND_TYPE, LATENCY_BUFFER_SIZE)
+        if BUFFER_TIME_MS is not None:
+            console.log(f"WARNING! The latency buffers of {FRONTEND_TYPE} links can't be sized from their data rate, "
+                        f"{DRO_CONFIG.host} card {DRO_CONFIG.card} keeps {elements} elements", style="bold red")
+    element_size = element.size if element is not None else None
+    return {link.dro_source_id: LatencyBufferSize(elements, element_size) for link in DRO_CONFIG.links}
+
 def get_readout_app(DRO_CONFIG=None,
                     EMULATOR_MODE=False,
                     DATA_RATE_SLOWDOWN_FACTOR=1,
@@ -64,6 +120,7 @@ def get_readout_app(DRO_CONFIG=None,
                     TPG_CHANNEL_MAP= "ProtoDUNESP1ChannelMap",
                     USE_FAKE_DATA_PRODUCERS=False,
                     LATENCY_BUFFER_SIZE=499968,
+                    LATENCY_BUFFER_SIZES=None,
                     DATA_REQUEST_TIMEOUT=1000,
                     HOST="localhost",
                     SOURCEID_BROKER : SourceIDBroker = None,
@@ -74,43 +131,30 @@ def get_readout_app(DRO_CONFIG=None,
                     BASE_SOURCE_IP="10.73.139.",
                     DESTINATION_IP="10.73.139.17",
                     NUMA_ID=0,
+                    LATENCY_BUFFER_NUMA_AWARE=False,
                     DEBUG=False):
-    """Generate the json configuration for the readout process"""
+    """Generate the json configuration for the readout process
+
+    LATENCY_BUFFER_SIZES optionally gives the LatencyBufferSize of each
+    link by source ID (see get_latency_buffer_sizes), for the links'
+    DataLinkHandlers, instead of the fixed size of LATENCY_BUFFER_SIZE. With
+    LATENCY_BUFFER_NUMA_AWARE, the latency buffers are allocated on NUMA
+    node NUMA_ID
+    """
     
     if DRO_CONFIG is None:
         raise RuntimeError(f"ERROR: DRO_CONFIG is None!")
 
-    # Hack on strings to be used for connection instances: will be solved when data_type is properly used.
-
-    FAKEDATA_FRAGMENT_TYPE = "Unknown"
-    FRONTEND_TYPE = DetID.subdetector_to_string(DetID.Subdetector(DRO_CONFIG.links[0].det_id))
-    if ((FRONTEND_TYPE== "HD_TPC" or FRONTEND_TYPE== "VD_Bottom_TPC") and CLOCK_SPEED_HZ== 50000000):
-        FRONTEND_TYPE = "wib"
-        FAKEDATA_FRAGMENT_TYPE = "ProtoWIB"
-    elif ((FRONTEND_TYPE== "HD_TPC" or FRONTEND_TYPE== "VD_Bottom_TPC") and CLOCK_SPEED_HZ== 62500000):
-        FRONTEND_TYPE = "wib2"
-        FAKEDATA_FRAGMENT_TYPE = "WIB"
-    elif FRONTEND_TYPE== "HD_PDS" or FRONTEND_TYPE== "VD_Cathode_PDS" or FRONTEND_TYPE=="VD_Membrane_PDS":
-        FRONTEND_TYPE = "pds_list"
-        FAKEDATA_FRAGMENT_TYPE = "DAPHNE"
-    elif FRONTEND_TYPE== "VD_Top_TPC":
-        FRONTEND_TYPE = "tde"
-        FAKEDATA_FRAGMENT_TYPE = "TDE_AMC"
-    elif FRONTEND_TYPE== "ND_LAr":
-        FRONTEND_TYPE = "pacman"
-        FAKEDATA_FRAGMENT_TYPE = "PACMAN"
+    FRONTEND_TYPE, FAKEDATA_FRAGMENT_TYPE = get_frontend_type(DRO_CONFIG, CLOCK_SPEED_HZ)
 
     if DEBUG: print(f'FRONTENT_TYPE={FRONTEND_TYPE}')
 
-    # For raw recording to work the size of the LB has to be a multiple of 4096 bytes so that gives
-    # us the following problem:
-    # number_of_elements * element_size = 4096 * M,  where M is an arbitrary integer,
-    # so only a value of number_elements that satisfies the equation above is valid.
-    if FRONTEND_TYPE == 'tde':
-        # number_of_elements = 4096 is always a solution by construction and
-        # the total size happens to be quite close to the one when using WIB
-        # as the frontend type
-        LATENCY_BUFFER_SIZE = 4096
+    if LATENCY_BUFFER_SIZES is None:
+        LATENCY_BUFFER_SIZES = get_latency_buffer_sizes(DRO_CONFIG, CLOCK_SPEED_HZ, DATA_RATE_SLOWDOWN_FACTOR, LATENCY_BUFFER_SIZE)
+    # The TP latency buffers hold TPs, which come at the rate of the hits on
+    # the channels rather than at the frame rate of LATENCY_BUFFER_ELEMENTS:
+    # they keep the fixed size
+    LATENCY_BUFFER_SIZE = get_fixed_latency_buffer_size(FRONTEND_TYPE, LATENCY_BUFFER_SIZE)
 
     if (ENABLE_DPDK_SENDER or ENABLE_DPDK_READER) and FRONTEND_TYPE != 'tde':
         raise RuntimeError(f'DPDK is only supported when using the frontend type TDE, current frontend type is {FRONTEND_TYPE}')
@@ -119,6 +163,12 @@ def get_readout_app(DRO_CONFIG=None,
 
     cmd_data = {}
 
+    if LATENCY_BUFFER_NUMA_AWARE:
+        latency_buffer_numa_conf = dict(latency_buffer_numa_aware = True,
+                                        latency_buffer_numa_node = NUMA_ID)
+    else:
+        latency_buffer_numa_conf = {}
+
     RATE_KHZ = CLOCK_SPEED_HZ / (25 * 12 * DATA_RATE_SLOWDOWN_FACTOR * 1000)
     
     if DEBUG: print(f"ReadoutApp.__init__ with host={DRO_CONFIG.host} and {len(DRO_CONFIG.links)} links enabled")
@@ -140,15 +190,15 @@ def get_readout_app(DRO_CONFIG=None,
             link_to_tp_sid_map[link.dro_source_id] = SOURCEID_BROKER.get_next_source_id("Trigger")
             SOURCEID_BROKER.register_source_id("Trigger", link_to_tp_sid_map[link.dro_source_id], None)
     if FIRMWARE_TPG_ENABLED:
-        for fwsid,fwconf in SOURCEID_BROKER.get_all_source_ids("Detector_Readout").items():
-            if isinstance(fwconf, FWTPID) and fwconf.host == DRO_CONFIG.host and fwconf.card == DRO_CONFIG.card:
-                if DEBUG: print(f"SSB fwsid: {fwsid}")
-                fw_tp_id_map[fwconf] = fwsid
-                link_to_tp_sid_map[fwconf] = SOURCEID_BROKER.get_next_source_id("Trigger")
-                SOURCEID_BROKER.register_source_id("Trigger", link_to_tp_sid_map[fwconf], None)
-            if isinstance(fwconf, FWTPOUTID) and fwconf.host == DRO_CONFIG.host and fwconf.card == DRO_CONFIG.card:
-                if DEBUG: print(f"SSB fw tp out id: {fwconf}")
-                fw_tp_out_id_map[fwconf] = fwsid
+        # The FW TP IDs of this card, in SourceID order
+        for fwsid,fwconf in SOURCEID_BROKER.find_infos("Detector_Readout", FWTPID, host=DRO_CONFIG.host, card=DRO_CONFIG.card):
+            if DEBUG: print(f"SSB fwsid: {fwsid}")
+            fw_tp_id_map[fwconf] = fwsid
+            link_to_tp_sid_map[fwconf] = SOURCEID_BROKER.get_next_source_id("Trigger")
+            SOURCEID_BROKER.register_source_id("Trigger", link_to_tp_sid_map[fwconf], None)
+        for fw_tp_out_sid,fw_tp_out_conf in SOURCEID_BROKER.find_infos("Detector_Readout", FWTPOUTID, host=DRO_CONFIG.host, card=DRO_CONFIG.card):
+            if DEBUG: print(f"SSB fw tp out id: {fw_tp_out_conf}")
+            fw_tp_out_id_map[fw_tp_out_conf] = fw_tp_out_sid
 
         if DEBUG: print(f"SSB fw_tp source ID map: {fw_tp_id_map}")
         if DEBUG: print(f"SSB fw_tp_out source ID map: {fw_tp_out_id_map}")
@@ -159,7 +209,8 @@ def get_readout_app(DRO_CONFIG=None,
                                plugin = "DataLinkHandler",
                                conf = rconf.Conf(readoutmodelconf = rconf.ReadoutModelConf(source_queue_timeout_ms = QUEUE_POP_WAIT_MS,
                                                                                          source_id = link_to_tp_sid_map[link.dro_source_id]),
-                                                 latencybufferconf = rconf.LatencyBufferConf(latency_buffer_size = LATENCY_BUFFER_SIZE,
+                                                 latencybufferconf = rconf.LatencyBufferConf(**latency_buffer_numa_conf,
+                                                                                            latency_buffer_size = LATENCY_BUFFER_SIZE,
                                                                                             source_id =  link_to_tp_sid_map[link.dro_source_id]),
                                                  rawdataprocessorconf = rconf.RawDataProcessorConf(source_id = link_to_tp_sid_map[link.dro_source_id],
                                                                                                    enable_software_tpg = False,
@@ -183,7 +234,8 @@ def get_readout_app(DRO_CONFIG=None,
                                plugin = "DataLinkHandler",
                                conf = rconf.Conf(readoutmodelconf = rconf.ReadoutModelConf(source_queue_timeout_ms = QUEUE_POP_WAIT_MS,
                                                                                          source_id = tp_out),
-                                                 latencybufferconf = rconf.LatencyBufferConf(latency_buffer_size = LATENCY_BUFFER_SIZE,
+                                                 latencybufferconf = rconf.LatencyBufferConf(**latency_buffer_numa_conf,
+                                                                                            latency_buffer_size = LATENCY_BUFFER_SIZE,
                                                                                             source_id = tp_out),
                                                  rawdataprocessorconf = rconf.RawDataProcessorConf(source_id =  tp_out,
                                                                                                    enable_software_tpg = False,
@@ -210,6 +262,7 @@ def get_readout_app(DRO_CONFIG=None,
                                           timesync_topic_name = "Timesync",
                                       ),
                                       latencybufferconf= rconf.LatencyBufferConf(
+                                          **latency_buffer_numa_conf,
                                           latency_buffer_alignment_size = 4096,
                                           latency_buffer_size = LATENCY_BUFFER_SIZE,
                                           source_id = tp,
@@ -269,6 +322,7 @@ def get_readout_app(DRO_CONFIG=None,
                 tpset_topic = "TPSets"
             else:
                 tpset_topic = "None"
+            link_latency_buffer_size = LATENCY_BUFFER_SIZES[link.dro_source_id].elements
             modules += [DAQModule(name = f"datahandler_{link.dro_source_id}",
                                   plugin = "DataLinkHandler", 
                                   conf = rconf.Conf(
@@ -280,8 +334,9 @@ def get_readout_app(DRO_CONFIG=None,
                                           timesync_topic_name = "Timesync",
                                       ),
                                       latencybufferconf= rconf.LatencyBufferConf(
+                                          **latency_buffer_numa_conf,
                                           latency_buffer_alignment_size = 4096,
-                                          latency_buffer_size = LATENCY_BUFFER_SIZE,
+                                          latency_buffer_size = link_latency_buffer_size,
                                           source_id =  link.dro_source_id,
                                       ),
                                       rawdataprocessorconf= rconf.RawDataProcessorConf(
@@ -295,7 +350,7 @@ def get_readout_app(DRO_CONFIG=None,
                                           tpset_sourceid=link_to_tp_sid_map[link.dro_source_id] if SOFTWARE_TPG_ENABLED else 0
                                       ),
                                       requesthandlerconf= rconf.RequestHandlerConf(
-                                          latency_buffer_size = LATENCY_BUFFER_SIZE,
+                                          latency_buffer_size = link_latency_buffer_size,
                                           pop_limit_pct = 0.8,
                                           pop_size_pct = 0.1,
                                           source_id = link.dro_source_id,
@@ -14,15 +14,10 @@ import math
 from rich.console import Console
 console = Console()
 
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
-# Load configuration types
-import moo.otypes
-moo.otypes.load_types('timinglibs/timingpartitioncontroller.jsonnet')
-import dunedaq.timinglibs.timingpartitioncontroller as tprtc
+# Configuration types, loaded when a generator first uses them
+from daqconf.core.schema import lazy_types
+
+tprtc = lazy_types('dunedaq.timinglibs.timingpartitioncontroller', 'timinglibs/timingpartitioncontroller.jsonnet')
 
 from daqconf.core.app import App, ModuleGraph
 from daqconf.core.daqmodule import DAQModule
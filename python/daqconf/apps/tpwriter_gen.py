@@ -1,22 +1,11 @@
 
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
-# Load configuration types
-import moo.otypes
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('appfwk/cmd.jsonnet')
-moo.otypes.load_types('appfwk/app.jsonnet')
-
-moo.otypes.load_types('dfmodules/tpstreamwriter.jsonnet')
-moo.otypes.load_types('dfmodules/hdf5datastore.jsonnet')
+# Configuration types, loaded when a generator first uses them
+from daqconf.core.schema import lazy_types
 
 # Import new types
-import dunedaq.dfmodules.tpstreamwriter as tpsw
-import dunedaq.hdf5libs.hdf5filelayout as h5fl
-import dunedaq.dfmodules.hdf5datastore as hdf5ds
+tpsw = lazy_types('dunedaq.dfmodules.tpstreamwriter', 'dfmodules/tpstreamwriter.jsonnet')
+h5fl = lazy_types('dunedaq.hdf5libs.hdf5filelayout', 'dfmodules/hdf5datastore.jsonnet')
+hdf5ds = lazy_types('dunedaq.dfmodules.hdf5datastore', 'dfmodules/hdf5datastore.jsonnet')
 
 from daqconf.core.app import App, ModuleGraph
 from daqconf.core.daqmodule import DAQModule
@@ -1,31 +1,17 @@
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
-# Load configuration types
+# Configuration types, loaded when a generator first uses them
+from daqconf.core.schema import lazy_types
 import moo.otypes
 
-moo.otypes.load_types('trigger/triggeractivitymaker.jsonnet')
-moo.otypes.load_types('trigger/triggercandidatemaker.jsonnet')
-moo.otypes.load_types('trigger/triggerzipper.jsonnet')
-moo.otypes.load_types('trigger/moduleleveltrigger.jsonnet')
-moo.otypes.load_types('trigger/timingtriggercandidatemaker.jsonnet')
-moo.otypes.load_types('trigger/faketpcreatorheartbeatmaker.jsonnet')
-moo.otypes.load_types('trigger/txbuffer.jsonnet')
-moo.otypes.load_types('readoutlibs/readoutconfig.jsonnet')
-moo.otypes.load_types('trigger/tpchannelfilter.jsonnet')
-
 # Import new types
-import dunedaq.trigger.triggeractivitymaker as tam
-import dunedaq.trigger.triggercandidatemaker as tcm
-import dunedaq.trigger.triggerzipper as tzip
-import dunedaq.trigger.moduleleveltrigger as mlt
-import dunedaq.trigger.timingtriggercandidatemaker as ttcm
-import dunedaq.trigger.faketpcreatorheartbeatmaker as heartbeater
-import dunedaq.trigger.txbufferconfig as bufferconf
-import dunedaq.readoutlibs.readoutconfig as readoutconf
-import dunedaq.trigger.tpchannelfilter as chfilter
+tam = lazy_types('dunedaq.trigger.triggeractivitymaker', 'trigger/triggeractivitymaker.jsonnet')
+tcm = lazy_types('dunedaq.trigger.triggercandidatemaker', 'trigger/triggercandidatemaker.jsonnet')
+tzip = lazy_types('dunedaq.trigger.triggerzipper', 'trigger/triggerzipper.jsonnet')
+mlt = lazy_types('dunedaq.trigger.moduleleveltrigger', 'trigger/moduleleveltrigger.jsonnet')
+ttcm = lazy_types('dunedaq.trigger.timingtriggercandidatemaker', 'trigger/timingtriggercandidatemaker.jsonnet')
+heartbeater = lazy_types('dunedaq.trigger.faketpcreatorheartbeatmaker', 'trigger/faketpcreatorheartbeatmaker.jsonnet')
+bufferconf = lazy_types('dunedaq.trigger.txbufferconfig', 'trigger/txbuffer.jsonnet')
+readoutconf = lazy_types('dunedaq.readoutlibs.readoutconfig', 'readoutlibs/readoutconfig.jsonnet')
+chfilter = lazy_types('dunedaq.trigger.tpchannelfilter', 'trigger/tpchannelfilter.jsonnet')
 
 from daqconf.core.app import App, ModuleGraph
 from daqconf.core.daqmodule import DAQModule
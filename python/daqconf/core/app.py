@@ -20,32 +20,69 @@ class ModuleGraph:
     """
 
     def combine_queues(self, queues : [Queue]):
-        output_queues = []
+        """Merge queues with the same name, keeping the order in which each name first appears"""
+        output_queues = {}
 
         for q in queues:
-            match = False
-            for oq in output_queues:
-                if oq.name == q.name:
-                    match = True
-                    for push_mod in q.push_modules:
-                        if push_mod not in oq.push_modules:
-                            oq.push_modules.append(push_mod)
-                    for pop_mod in q.pop_modules:
-                        if pop_mod not in oq.pop_modules:
-                            oq.pop_modules.append(pop_mod)
-                    break
-            if not match:
-                output_queues.append(q)
-
-        return output_queues
+            if q.name in output_queues:
+                output_queues[q.name].merge(q)
+            else:
+                output_queues[q.name] = q
+
+        return list(output_queues.values())
 
     def __init__(self, modules:[DAQModule]=None, endpoints:[Endpoint]=None, fragment_producers:{FragmentProducer}=None, queues:[Queue]=None, external_connections:[ExternalConnection]=None):
+        # Incremented every time the modulegraph is modified, so that
+        # users can tell whether anything they derived from it is stale
+        self.generation = 0
+        self._endpoint_index = None
+        # Modules and queues are stored in insertion-ordered dicts keyed
+        # by name, and endpoints in a list with a set of their names.
+        # The `modules`, `queues` and `endpoints` properties give tuples
+        # of them: they are changed through the methods below
         self.modules=modules if modules else []
         self.endpoints=endpoints if endpoints else []
         self.fragment_producers = fragment_producers if  fragment_producers else dict()
-        self.queues = self.combine_queues(queues) if queues else []
+        self.queues = queues if queues else []
         self.external_connections = external_connections if external_connections else []
 
+    def _changed(self):
+        self.generation += 1
+
+    @property
+    def modules(self):
+        return tuple(self._modules.values())
+
+    @modules.setter
+    def modules(self, modules):
+        if isinstance(modules, dict):
+            modules = modules.values()
+        self._modules = dict()
+        for module in modules:
+            if module.name in self._modules:
+                raise RuntimeError(f"Module {module.name} appears twice in the ModuleGraph")
+            self._modules[module.name] = module
+        self._changed()
+
+    @property
+    def queues(self):
+        return tuple(self._queues.values())
+
+    @queues.setter
+    def queues(self, queues):
+        self._queues = {q.name: q for q in self.combine_queues(queues)}
+        self._changed()
+
+    @property
+    def endpoints(self):
+        return tuple(self._endpoints)
+
+    @endpoints.setter
+    def endpoints(self, endpoints):
+        self._endpoints = list(endpoints)
+        self._endpoint_names = set((e.external_name, e.internal_name) for e in self._endpoints)
+        self._changed()
+
     def __repr__(self):
         return f"modulegraph(modules={self.modules}, endpoints={self.endpoints}, fragment_producers={self.fragment_producers})"
 
@@ -130,17 +167,21 @@ class ModuleGraph:
         return deps
 
     def get_module(self, name):
-        for mod in self.modules:
-            if mod.name == name:
-                return mod
-        return None
+        return self._modules.get(name)
+
+    def _replace_module(self, name, new_module):
+        if name not in self._modules:
+            raise RuntimeError(f'Module {name} not found!')
+        if new_module.name == name:
+            self._modules[name] = new_module
+        else:
+            # Keep the module in the same position under its new name
+            self._modules = {(new_module.name if n == name else n): (new_module if n == name else m)
+                             for n, m in self._modules.items()}
+        self._changed()
 
     def reset_module(self, name, new_module):
-        for i,mod in enumerate(self.modules):
-            if mod.name == name:
-                self.modules[i] = new_module
-                return
-        raise RuntimeError(f'Module {name} not found!')
+        self._replace_module(name, new_module)
 
     def reset_module_conf(self, name, new_conf):
         """Replace the configuration object of the module `name` with the new object `conf`"""
@@ -149,61 +190,79 @@ class ModuleGraph:
         # way (returning a copy of the attribute, not returning a
         # reference to it), which means we have to copy and replace the
         # whole module
-        for i,mod in enumerate(self.modules):
-            if mod.name == name:
-                old_module = self.modules[i]
-                new_module = DAQModule(name=name,
-                                       plugin=old_module.plugin,
-                                       conf=new_conf)
-                self.modules[i] = new_module
-                return
-        raise RuntimeError(f'Module {name} not found!')
+        old_module = self.get_module(name)
+        if old_module is None:
+            raise RuntimeError(f'Module {name} not found!')
+        self._replace_module(name, DAQModule(name=name,
+                                             plugin=old_module.plugin,
+                                             conf=new_conf))
 
     def module_names(self):
-        return [n.name for n in self.modules]
+        return list(self._modules.keys())
 
     def module_list(self):
-        return self.modules
+        return list(self.modules)
 
     def add_module(self, name, **kwargs):
-        if self.get_module(name):
+        if name in self._modules:
             raise RuntimeError(f"Module of name {name} already exists in this modulegraph")
         mod=DAQModule(name=name, **kwargs)
-        self.modules.append(mod)
+        self._modules[name] = mod
+        self._changed()
         return mod
 
     def has_endpoint(self, external_name, internal_name):
-        for endpoint in self.endpoints:
-            if endpoint.external_name == external_name and endpoint.internal_name == internal_name:
-                return True
-        return False
+        return (external_name, internal_name) in self._endpoint_names
+
+    def endpoint_index(self):
+        """
+        Index the endpoints of this modulegraph by (external_name, direction).
+        Each entry is a list of endpoints in the order they were added.
+        The index is kept until the modulegraph changes
+        """
+        if self._endpoint_index is None or self._endpoint_index[0] != self.generation:
+            index = {}
+            for endpoint in self._endpoints:
+                index.setdefault((endpoint.external_name, endpoint.direction), []).append(endpoint)
+            self._endpoint_index = (self.generation, index)
+        return self._endpoint_index[1]
 
     def add_endpoint(self, external_name, internal_name, inout, topic=[], toposort=False):
         if not self.has_endpoint(external_name, internal_name):
-            self.endpoints += [Endpoint(external_name, internal_name, inout, topic=topic, toposort=toposort)]
+            self._endpoints.append(Endpoint(external_name, internal_name, inout, topic=topic, toposort=toposort))
+            self._endpoint_names.add((external_name, internal_name))
+            self._changed()
+
+    def rename_endpoint(self, external_name, new_external_name):
+        """Change the external name of every endpoint called `external_name` to `new_external_name`"""
+        for endpoint in self._endpoints:
+            if endpoint.external_name == external_name:
+                self._endpoint_names.discard((endpoint.external_name, endpoint.internal_name))
+                endpoint.external_name = new_external_name
+                self._endpoint_names.add((endpoint.external_name, endpoint.internal_name))
+        self._changed()
 
     def add_external_connection(self, external_name, internal_name, inout, host, port, topic=[]):
         self.external_connections += [ExternalConnection(external_name, internal_name, inout, host, port, topic)]
+        self._changed()
 
     def connect_modules(self, push_addr, pop_addr, queue_name = "", size_hint = 10, toposort = True):
         queue_start = push_addr.split(".")
         queue_end = pop_addr.split(".")
-        if len(queue_start) < 2 or queue_start[0] not in self.module_names():
+        if len(queue_start) < 2 or queue_start[0] not in self._modules:
             raise RuntimeError(f"connect_modules called with invalid parameters. push_addr ({push_addr}) must be of form <module>.<internal name>, and the module must already be in the module graph!")
 
-        if len(queue_end) < 2 or queue_end[0] not in self.module_names():
+        if len(queue_end) < 2 or queue_end[0] not in self._modules:
             raise RuntimeError(f"connect_modules called with invalid parameters. pop_addr ({pop_addr}) must be of form <module>.<internal name>, and the module must already be in the module graph!")
 
         if queue_name == "":
-            self.queues.append(Queue(push_addr, pop_addr, push_addr + "_to_" + pop_addr, size_hint, toposort))
+            queue_name = push_addr + "_to_" + pop_addr
+
+        if queue_name in self._queues:
+            self._queues[queue_name].add_module_link(push_addr, pop_addr)
         else:
-            existing_queue = False
-            for queue in self.queues:
-                if queue.name == queue_name:
-                    queue.add_module_link(push_addr, pop_addr)
-                    existing_queue = True
-            if not existing_queue:
-                self.queues.append(Queue(push_addr, pop_addr, queue_name, size_hint, toposort))
+            self._queues[queue_name] = Queue(push_addr, pop_addr, queue_name, size_hint, toposort)
+        self._changed()
 
     def endpoint_names(self, inout=None):
         if inout is not None:
@@ -219,6 +278,7 @@ class ModuleGraph:
         # where all of the fragment producers are known
         queue_name = None
         self.fragment_producers[source_id] = FragmentProducer(source_id, requests_in, fragments_out, queue_name, is_mlt_producer)
+        self._changed()
 
 class App:
     """
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+def _pod(obj):
+    return obj.pod() if hasattr(obj, "pod") else obj
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, (bytes, str)):
+            part = json.dumps(part, sort_keys=True, separators=(',', ':'), default=str)
+        if isinstance(part, str):
+            part = part.encode()
+        h.update(hashlib.sha256(part).digest())
+    return h.hexdigest()
+
+def daqconf_version():
+    """A string identifying the daqconf code that generates the
+    configuration: the release it comes from and a hash of the python
+    sources of the daqconf package, so that any change to the
+    generators invalidates the cache"""
+    package_dir = Path(__file__).resolve().parent.parent
+    h = hashlib.sha256()
+    for source in sorted(package_dir.rglob("*.py")):
+        h.update(str(source.relative_to(package_dir)).encode())
+        h.update(source.read_bytes())
+    return f"{os.getenv('DUNE_DAQ_BASE_RELEASE', 'unknown')}:{h.hexdigest()}"
+
+def app_fingerprint(system, app_name):
+    """Everything in the system that make_app_command_data reads when
+    making the init and conf command data for `app_name`, as plain
+    data"""
+    mgraph = system.apps[app_name].modulegraph
+    return {
+        "modules": [(m.name, m.plugin, _pod(m.conf)) for m in mgraph.modules],
+        "endpoints": [(e.external_name, e.internal_name, e.direction.name) for e in mgraph.endpoints],
+        "external_connections": [(e.external_name, e.internal_name, e.direction.name) for e in mgraph.external_connections],
+        "queues": [(q.name, q.push_modules, q.pop_modules) for q in mgraph.queues],
+        "connections": [_pod(c) for c in system.connections[app_name]],
+    }
+
+class ConfigCache:
+    """Content-addressed store of the init/conf command data of apps
+
+    The command data of each app is stored under a hash of the app's
+    inputs (see app_fingerprint) and of the daqconf version, so it is
+    reused by any later generation that produces an identical app. On
+    top of that, each configuration (the parsed config, the hardware
+    map and the daqconf version) records which app hashes it produced,
+    so that regenerating an unchanged configuration doesn't even need
+    to fingerprint the apps.
+    """
+
+    def __init__(self, cache_dir, version=None):
+        self.cache_dir = Path(cache_dir)
+        self.version = version if version is not None else daqconf_version()
+        self.apps_dir = self.cache_dir / "apps"
+        self.configs_dir = self.cache_dir / "configs"
+        self.apps_dir.mkdir(parents=True, exist_ok=True)
+        self.configs_dir.mkdir(parents=True, exist_ok=True)
+
+    def config_key(self, config, hardware_map_file=None):
+        """Hash of the parsed configuration `config` (a dictionary of
+        config sections, moo objects or plain data), the contents of
+        the hardware map file and the daqconf version"""
+        config = {name: _pod(section) for name, section in config.items()}
+        hwmap = b""
+        if hardware_map_file is not None and os.path.exists(hardware_map_file):
+            hwmap = Path(hardware_map_file).read_bytes()
+        return _digest(self.version, config, hwmap)
+
+    def app_key(self, system, app_name):
+        return _digest(self.version, app_name, app_fingerprint(system, app_name))
+
+    def _write(self, path, data):
+        # Write to a temporary file and move it into place, so that
+        # concurrent generations never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, sort_keys=True, separators=(',', ':'))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _read(self, path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, json.decoder.JSONDecodeError):
+            return None
+
+    def get_app(self, app_key):
+        """The cached command data pods for `app_key`, or None"""
+        return self._read(self.apps_dir / f"{app_key}.json")
+
+    def put_app(self, app_key, pods):
+        self._write(self.apps_dir / f"{app_key}.json", pods)
+
+    def get_config(self, config_key):
+        """The app name -> app key map recorded for `config_key`, or None"""
+        return self._read(self.configs_dir / f"{config_key}.json")
+
+    def put_config(self, config_key, app_keys):
+        self._write(self.configs_dir / f"{config_key}.json", app_keys)
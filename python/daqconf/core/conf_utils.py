@@ -1,30 +1,27 @@
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
 import urllib
 from pathlib import Path
 from rich.console import Console
-from copy import deepcopy
 from collections import namedtuple, defaultdict
 import json
+import hashlib
 import os
+import shutil
+import threading
+import time
 from enum import Enum
 from graphviz import Digraph
 import networkx as nx
-import moo.otypes
-import copy as cp
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('appfwk/cmd.jsonnet')
-moo.otypes.load_types('appfwk/app.jsonnet')
-
-moo.otypes.load_types('iomanager/connection.jsonnet')
-
-from appfwk.utils import acmd, mcmd, mspec
-import dunedaq.appfwk.app as appfwk  # AddressedCmd,
-import dunedaq.rcif.cmd as rccmd  # AddressedCmd,
-import dunedaq.iomanager.connection as conn
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Configuration types, loaded when first used
+from daqconf.core.schema import lazy_types
+appfwk_utils = lazy_types('appfwk.utils')
+appfwk = lazy_types('dunedaq.appfwk.app', 'appfwk/app.jsonnet')  # AddressedCmd,
+rccmd = lazy_types('dunedaq.rcif.cmd', 'rcif/cmd.jsonnet')  # AddressedCmd,
+conn = lazy_types('dunedaq.iomanager.connection', 'iomanager/connection.jsonnet')
 
 from daqconf.core.daqmodule import DAQModule
 
@@ -76,17 +73,29 @@ class Queue:
     def __init__(self, push_module, pop_module, name = None, size=10, toposort=False):
         self.name = name
         self.size = size
-        self.push_modules = [push_module]
-        self.pop_modules = [pop_module]
+        # Insertion-ordered sets of "module.sink/source" addresses
+        self._push_modules = {push_module: None}
+        self._pop_modules = {pop_module: None}
         self.toposort = toposort
         if self.name is None:
             self.name = push_module + "_to_" + pop_module
 
+    @property
+    def push_modules(self):
+        return list(self._push_modules)
+
+    @property
+    def pop_modules(self):
+        return list(self._pop_modules)
+
     def add_module_link(self, push_module, pop_module):
-        if push_module not in self.push_modules:
-            self.push_modules.append(push_module)
-        if pop_module not in self.pop_modules:
-            self.pop_modules.append(pop_module)
+        self._push_modules[push_module] = None
+        self._pop_modules[pop_module] = None
+
+    def merge(self, other):
+        """Add the push and pop modules of `other` which aren't already in this queue"""
+        self._push_modules.update(dict.fromkeys(other._push_modules))
+        self._pop_modules.update(dict.fromkeys(other._pop_modules))
 
     def __repr__(self):
         return self.name
@@ -119,29 +128,30 @@ def make_module_deps(app, system_connections, verbose=False):
     Returns a networkx DiGraph object where nodes are module names
     """
 
+    start_time = time.perf_counter()
+
+    endpoint_index = app.modulegraph.endpoint_index()
+
+    # Group the incoming endpoints by the module they feed, so that each
+    # endpoint is only looked at once
+    module_in_endpoints = defaultdict(list)
+    for endpoint in app.modulegraph.endpoints:
+        if endpoint.internal_name is None or endpoint.direction != Direction.IN:
+            continue
+        mod_name, q_name = endpoint.internal_name.split(".")
+        module_in_endpoints[mod_name].append(endpoint)
+
     deps = nx.DiGraph()
     for module in app.modulegraph.modules:
         deps.add_node(module.name)
 
-        for endpoint in app.modulegraph.endpoints:
-            if endpoint.internal_name is None or endpoint.direction != Direction.IN:
-                continue
-            mod_name, q_name = endpoint.internal_name.split(".")
-            if module.name != mod_name:
-                continue
-            is_queue = False
-            for connection in system_connections:
-                if connection.uid == endpoint.external_name and connection.service_type == "kQueue":
-                    is_queue = True
-                    break
-
-            for other_endpoint in app.modulegraph.endpoints:
-                if other_endpoint.internal_name is None:
+        for endpoint in module_in_endpoints.get(module.name, []):
+            for other_endpoint in endpoint_index.get((endpoint.external_name, Direction.OUT), []):
+                if other_endpoint.internal_name is None or other_endpoint.internal_name == endpoint.internal_name:
                     continue
-                if other_endpoint.external_name == endpoint.external_name and other_endpoint.internal_name != endpoint.internal_name and other_endpoint.direction != Direction.IN:
-                    other_mod, other_q = other_endpoint.internal_name.split(".")
-                    if verbose: console.log(f"Adding generated dependency edge {other_mod} -> {mod_name}")
-                    deps.add_edge(other_mod, mod_name)
+                other_mod, other_q = other_endpoint.internal_name.split(".")
+                if verbose: console.log(f"Adding generated dependency edge {other_mod} -> {module.name}")
+                deps.add_edge(other_mod, module.name)
 
 
     for queue in app.modulegraph.queues:
@@ -154,7 +164,8 @@ def make_module_deps(app, system_connections, verbose=False):
                 if verbose: console.log(f"Adding queue dependency edge {push_mod} -> {pop_mod}")
                 deps.add_edge(push_mod, pop_mod)
 
-
+    if verbose:
+        console.log(f"Inferred module dependencies for {app.name} in {time.perf_counter() - start_time:.3f} s")
 
     return deps
 
@@ -188,39 +199,38 @@ def add_one_command_data(command_data, command, default_params, app):
     #     else:
     #         mod_and_params.append((module, default_params))
 
-    command_data[command] = acmd(mod_and_params)
+    command_data[command] = appfwk_utils.acmd(mod_and_params)
 
 def make_queue_connection(the_system, app, endpoint_name, in_apps, out_apps, size, verbose):
     if len(in_apps) == 1 and len(out_apps) == 1:
         if verbose:
             console.log(f"Connection {endpoint_name}, SPSC Queue")
-        the_system.connections[app] += [conn.ConnectionId(uid=endpoint_name, service_type="kQueue", data_type="", uri=f"queue://FollySPSC:{size}")]
+        the_system.connections[app].append(conn.ConnectionId(uid=endpoint_name, service_type="kQueue", data_type="", uri=f"queue://FollySPSC:{size}"))
     else:
         if verbose:
             console.log(f"Connection {endpoint_name}, MPMC Queue")
-        the_system.connections[app] += [conn.ConnectionId(uid=endpoint_name, service_type="kQueue", data_type="", uri=f"queue://FollyMPMC:{size}")]
+        the_system.connections[app].append(conn.ConnectionId(uid=endpoint_name, service_type="kQueue", data_type="", uri=f"queue://FollyMPMC:{size}"))
 
 def make_external_connection(the_system, endpoint_name, app_name, host, port, topic, inout, verbose):
     if verbose:
         console.log(f"External connection {endpoint_name}")
     address = f"tcp://{host}:{port}"
 
-    for connection in the_system.connections[app_name]:
-        if connection.uid == endpoint_name:
-            console.log(f"Duplicate external connection {endpoint_name} detected! Not adding to configuration!")
-            return
+    if endpoint_name in the_system.connections[app_name]:
+        console.log(f"Duplicate external connection {endpoint_name} detected! Not adding to configuration!")
+        return
     if len(topic) == 0:
         if inout==Direction.IN:
             new_address = replace_localhost_ip(address)
-            the_system.connections[app_name] += [conn.ConnectionId(uid=endpoint_name, service_type="kNetReceiver", data_type="", uri=new_address)]
+            the_system.connections[app_name].append(conn.ConnectionId(uid=endpoint_name, service_type="kNetReceiver", data_type="", uri=new_address))
         else:
-            the_system.connections[app_name] += [conn.ConnectionId(uid=endpoint_name, service_type='kNetSender', data_type="", uri=address)]
+            the_system.connections[app_name].append(conn.ConnectionId(uid=endpoint_name, service_type='kNetSender', data_type="", uri=address))
     else:
         if inout==Direction.IN:
-            the_system.connections[app_name] += [conn.ConnectionId(uid=endpoint_name, service_type="kSubscriber", data_type="", uri=address, topics=topic)]
+            the_system.connections[app_name].append(conn.ConnectionId(uid=endpoint_name, service_type="kSubscriber", data_type="", uri=address, topics=topic))
         else:
             new_address = replace_localhost_ip(address)
-            the_system.connections[app_name] += [conn.ConnectionId(uid=endpoint_name, service_type='kPublisher', data_type="", uri=new_address, topics=topic)]
+            the_system.connections[app_name].append(conn.ConnectionId(uid=endpoint_name, service_type='kPublisher', data_type="", uri=new_address, topics=topic))
 
 def make_network_connection(the_system, endpoint_name, in_apps, out_apps, verbose, use_k8s=False):
     if verbose:
@@ -231,9 +241,9 @@ def make_network_connection(the_system, endpoint_name, in_apps, out_apps, verbos
     port = the_system.next_unassigned_port()
     address_receiver = f'tcp://0.0.0.0:{port}'
     address_sender = f'tcp://{{{in_apps[0]}}}:{port}' if not use_k8s else f'tcp://{in_apps[0]}:{port}'
-    the_system.connections[in_apps[0]] += [conn.ConnectionId(uid=endpoint_name, service_type="kNetReceiver", data_type="", uri=address_receiver)]
+    the_system.connections[in_apps[0]].append(conn.ConnectionId(uid=endpoint_name, service_type="kNetReceiver", data_type="", uri=address_receiver))
     for app in set(out_apps):
-        the_system.connections[app] += [conn.ConnectionId(uid=endpoint_name, service_type="kNetSender", data_type="", uri=address_sender)]
+        the_system.connections[app].append(conn.ConnectionId(uid=endpoint_name, service_type="kNetSender", data_type="", uri=address_sender))
 
 def make_system_connections(the_system, verbose=False, use_k8s=False):
     """Given a system with defined apps and endpoints, create the
@@ -259,7 +269,7 @@ def make_system_connections(the_system, verbose=False, use_k8s=False):
     topic_map = defaultdict(list)
 
     for app in the_system.apps:
-      the_system.connections[app] = []
+      the_system.reset_connections(app)
       for queue in the_system.apps[app].modulegraph.queues:
             make_queue_connection(the_system, app, queue.name, queue.push_modules, queue.pop_modules, queue.size, verbose)
       for external_conn in the_system.apps[app].modulegraph.external_connections:
@@ -321,9 +331,7 @@ def make_system_connections(the_system, verbose=False, use_k8s=False):
 
                 if paired_exactly:
                     for in_app in in_apps:
-                        for app_endpoint in the_system.apps[in_app].modulegraph.endpoints:
-                            if app_endpoint.external_name == endpoint_name:
-                                app_endpoint.external_name = f"{in_app}.{endpoint_name}"
+                        the_system.apps[in_app].modulegraph.rename_endpoint(endpoint_name, f"{in_app}.{endpoint_name}")
                         make_queue_connection(the_system,in_app, f"{in_app}.{endpoint_name}", [in_app], [in_app], size, verbose)
 
             if paired_exactly == False:
@@ -332,7 +340,10 @@ def make_system_connections(the_system, verbose=False, use_k8s=False):
         else:
             make_network_connection(the_system, endpoint_name, in_apps, out_apps, verbose, use_k8s=use_k8s)
 
-    pubsub_connectionids = {}
+    # Publisher uid -> (uri, topics) of its kPublisher connection, from
+    # which the per-app publisher and subscriber connections are made
+    pubsub_connections = {}
+
     for topic, endpoints in topic_map.items():
         if verbose:
             console.log(f"Processing {topic} with defined endpoints {endpoints}")
@@ -348,16 +359,10 @@ def make_system_connections(the_system, verbose=False, use_k8s=False):
                 subscribers += [endpoint["app"]]
             else:
                 publishers += [endpoint["app"]]
-                if endpoint['endpoint'].external_name not in pubsub_connectionids:
+                if endpoint['endpoint'].external_name not in pubsub_connections:
                     port = the_system.next_unassigned_port()
                     address = f'tcp://{{{endpoint["app"]}}}:{port}' if not use_k8s else f'tcp://{endpoint["app"]}:{port}'
-                    pubsub_connectionids[endpoint['endpoint'].external_name] = conn.ConnectionId(
-                        uid=endpoint['endpoint'].external_name,
-                        service_type="kPublisher",
-                        data_type="",
-                        uri=address,
-                        topics=endpoint['endpoint'].topic
-                    )
+                    pubsub_connections[endpoint['endpoint'].external_name] = (address, endpoint['endpoint'].topic)
                 topic_connectionuids += [endpoint['endpoint'].external_name]
                 if endpoint['app'] not in publisher_uids.keys(): publisher_uids[endpoint["app"]] = []
                 publisher_uids[endpoint["app"]] += [endpoint['endpoint'].external_name]
@@ -367,21 +372,20 @@ def make_system_connections(the_system, verbose=False, use_k8s=False):
         if len(publishers) == 0:
             raise ValueError(f"Topic {topic} has no publishers!")
 
-        for subscriber in subscribers:
-            subscriber_connections = [c.uid for c in the_system.connections[subscriber]]
+        # An app is listed once per endpoint, but only needs visiting once
+        for subscriber in dict.fromkeys(subscribers):
+            subscriber_connections = the_system.connections[subscriber]
             for connid in topic_connectionuids:
-                if connid + "_sub" not in subscriber_connections:
-                    conn_copy = cp.deepcopy(pubsub_connectionids[connid])
-                    conn_copy.service_type = "kSubscriber"
-                    conn_copy.uid += "_sub"
-                    the_system.connections[subscriber] += [conn_copy]
-        for publisher in publishers:
-            publisher_connections = [c.uid for c in the_system.connections[publisher]]
+                uid = connid + "_sub"
+                if uid not in subscriber_connections:
+                    uri, topics = pubsub_connections[connid]
+                    subscriber_connections.append(conn.ConnectionId(uid=uid, service_type="kSubscriber", data_type="", uri=uri, topics=list(topics)))
+        for publisher in dict.fromkeys(publishers):
+            publisher_connections = the_system.connections[publisher]
             for connid in publisher_uids[publisher]:
                 if connid not in publisher_connections:
-                    conn_copy = cp.deepcopy(pubsub_connectionids[connid])
-                    conn_copy.uri = replace_localhost_ip(conn_copy.uri)
-                    the_system.connections[publisher] += [conn_copy]
+                    uri, topics = pubsub_connections[connid]
+                    publisher_connections.append(conn.ConnectionId(uid=connid, service_type="kPublisher", data_type="", uri=replace_localhost_ip(uri), topics=list(topics)))
 
 def make_app_command_data(system, app, appkey, verbose=False, use_k8s=False):
     """Given an App instance, create the 'command data' suitable for
@@ -446,14 +450,14 @@ def make_app_command_data(system, app, appkey, verbose=False, use_k8s=False):
 
     if verbose:
         console.log(f"Creating mod_specs for {[ (mod.name, mod.plugin) for mod in app.modulegraph.modules ]}")
-    mod_specs = [ mspec(mod.name, mod.plugin, app_connrefs[mod.name]) for mod in app.modulegraph.modules ]
+    mod_specs = [ appfwk_utils.mspec(mod.name, mod.plugin, app_connrefs[mod.name]) for mod in app.modulegraph.modules ]
 
     # Fill in the "standard" command entries in the command_data structure
     command_data['init'] = appfwk.Init(modules=mod_specs,
-                                       connections=system.connections[appkey])
+                                       connections=list(system.connections[appkey]))
 
     # TODO: Conf ordering
-    command_data['conf'] = acmd([
+    command_data['conf'] = appfwk_utils.acmd([
         (mod.name, mod.conf) for mod in app.modulegraph.modules
     ])
 
@@ -474,6 +478,73 @@ def make_app_command_data(system, app, appkey, verbose=False, use_k8s=False):
 
     return command_data
 
+# The System used by make_app_command_datas worker processes. Forked
+# workers inherit it from the parent, so it never has to be pickled
+_worker_system = None
+
+def _make_app_command_data_pods(appkey, verbose, use_k8s, cache=None, app_key=None):
+    """Make the `cmd_set` command data of app `appkey` of `_worker_system`
+    as pods, taking it from `cache` if it's there. Returns the app's cache
+    key (None without a cache), the pods, and whether they were cached"""
+    if cache is not None:
+        if app_key is None:
+            app_key = cache.app_key(_worker_system, appkey)
+        pods = cache.get_app(app_key)
+        if pods is not None:
+            if verbose:
+                console.log(f"Using cached command data for {appkey}")
+            return app_key, pods, True
+    command_data = make_app_command_data(_worker_system, _worker_system.apps[appkey], appkey, verbose, use_k8s)
+    pods = {c: command_data[c].pod() for c in cmd_set}
+    if cache is not None:
+        cache.put_app(app_key, pods)
+    return app_key, pods, False
+
+def make_app_command_datas(system, jobs=1, verbose=False, use_k8s=False, cache=None, config_key=None):
+    """Make the `cmd_set` command data of every app in the system,
+    serialised with `.pod()`, as a dictionary from app name to command
+    to pod. make_system_connections must have been run on the system.
+
+    With `jobs` > 1, the apps are processed in a pool of `jobs` forked
+    processes. The result is the same either way.
+
+    With a `cache` (a daqconf.core.cache.ConfigCache), the command data
+    of apps that are already in the cache is reused rather than made
+    again, and the rest is added to it. If `config_key` is given, the
+    app keys recorded for it are used instead of fingerprinting the
+    apps, and the keys of this generation are recorded under it.
+    """
+    global _worker_system
+
+    app_names = list(system.apps.keys())
+    known_keys = dict()
+    if cache is not None and config_key is not None:
+        known_keys = cache.get_config(config_key) or dict()
+    args = [app_names, [verbose]*len(app_names), [use_k8s]*len(app_names),
+            [cache]*len(app_names), [known_keys.get(name) for name in app_names]]
+
+    _worker_system = system
+    try:
+        if jobs <= 1:
+            results = list(map(_make_app_command_data_pods, *args))
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            import multiprocessing
+
+            console.log(f"Generating app command data for {len(system.apps)} apps with {jobs} processes")
+            with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("fork")) as executor:
+                results = list(executor.map(_make_app_command_data_pods, *args))
+    finally:
+        _worker_system = None
+
+    if cache is not None:
+        hits = sum(1 for _, _, hit in results if hit)
+        console.log(f"Reused cached command data for {hits} of {len(app_names)} apps")
+        if config_key is not None:
+            cache.put_config(config_key, {name: key for name, (key, _, _) in zip(app_names, results)})
+
+    return {name: pods for name, (_, pods, _) in zip(app_names, results)}
+
 def data_request_endpoint_name(producer):
     return f"data_request_{geoid_raw_str(producer.geoid)}"
 
@@ -726,8 +797,57 @@ def set_loose_affinity(apps, run_with_me_if_u_can):
 cmd_set = ["init", "conf"]
 
 
-def make_app_json(app_name, app_command_data, data_dir, verbose=False):
-    """Make the json files for a single application"""
+def dump_json(data, compact=False):
+    """Serialise `data` to a json string with sorted keys, indented by
+    4 spaces, or on a single line if `compact` is set. orjson is used for
+    the compact form when it is installed"""
+    if compact:
+        if orjson is not None:
+            try:
+                return orjson.dumps(data, option=orjson.OPT_SORT_KEYS).decode()
+            except TypeError:
+                # e.g. integers that don't fit in 64 bits: let json deal with them
+                pass
+        return json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return json.dumps(data, indent=4, sort_keys=True)
+
+def _same_json(path, text):
+    """Whether the json file `path` exists and holds the same data as `text`"""
+    try:
+        with open(path, 'r') as f:
+            old_text = f.read()
+    except OSError:
+        return False
+    if old_text == text:
+        return True
+    # Same data written with another layout, eg --compact-json
+    try:
+        return json.loads(old_text) == json.loads(text)
+    except json.decoder.JSONDecodeError:
+        return False
+
+def write_json_file(path, data, compact=False, update=False):
+    """Write `data` (a moo object or an already-serialised one) to the json file `path`
+
+    With `update`, the file is left alone if it already holds the same
+    data. Returns whether the file was written
+    """
+    if hasattr(data, 'pod'):
+        data = data.pod()
+    text = dump_json(data, compact)
+    if update and _same_json(path, text):
+        return False
+    if update and os.path.exists(path) and os.stat(path).st_nlink > 1:
+        # The file is shared with other configurations (see
+        # sweep.link_identical_files): give this one its own copy
+        os.unlink(path)
+    with open(path, 'w') as f:
+        f.write(text)
+    return True
+
+def make_app_json(app_name, app_command_data, data_dir, verbose=False, compact=False, update=False):
+    """Make the json files for a single application. Returns the list of
+    commands whose files were written"""
 
     # Backwards compatibility
     if isinstance(data_dir, str):
@@ -735,9 +855,8 @@ def make_app_json(app_name, app_command_data, data_dir, verbose=False):
 
     if verbose:
         console.log(f"make_app_json for app {app_name}")
-    for c in cmd_set:
-        with open(data_dir / f'{app_name}_{c}.json', 'w') as f:
-            json.dump(app_command_data[c].pod(), f, indent=4, sort_keys=True)
+    return [c for c in cmd_set
+            if write_json_file(data_dir / f'{app_name}_{c}.json', app_command_data[c], compact, update)]
 
 def make_system_command_datas(daqconf, the_system, forced_deps=[], verbose=False):
     """Generate the dictionary of commands and their data for the entire system"""
@@ -772,8 +891,79 @@ def make_system_command_datas(daqconf, the_system, forced_deps=[], verbose=False
 
     return system_command_datas
 
-def write_json_files(app_command_datas, system_command_datas, json_dir, verbose=False):
+def make_app_store_json(app_name, app_command_data, store_dir, verbose=False, compact=False):
+    """Write the json files for a single application to the content store
+    `store_dir`, where each distinct payload is stored once, under the
+    sha256 of its json. Returns the dictionary from command to the
+    reference of its file, to be used in the system command data"""
+
+    if verbose:
+        console.log(f"make_app_store_json for app {app_name}")
+    refs = {}
+    for c in cmd_set:
+        data = app_command_data[c]
+        if hasattr(data, 'pod'):
+            data = data.pod()
+        text = dump_json(data, compact)
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        path = store_dir / f'{digest}.json'
+        if not path.exists():
+            # Several apps can have the same payload: write it to a file of
+            # our own first so that the others never see it half-written
+            tmp_path = store_dir / f'.{digest}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        refs[c] = f'data/store/{digest}'
+    return refs
+
+def _read_app_data_refs(json_dir):
+    """The references to the app json files in the system command files
+    already in `json_dir`, as a dictionary from command to app to
+    reference"""
+    refs = {}
+    for c in cmd_set:
+        try:
+            with open(json_dir / f'{c}.json', 'r') as f:
+                refs[c] = json.load(f).get("apps", {})
+        except (OSError, json.decoder.JSONDecodeError, AttributeError):
+            refs[c] = {}
+    return refs
+
+def with_app_data_refs(system_command_datas, app_refs):
+    """A copy of `system_command_datas` whose commands refer to the app
+    json files of `app_refs`, a dictionary from app to command to reference"""
+    return {cmd: dict(cfg, apps={app_name: app_refs[app_name][cmd] for app_name in cfg["apps"]})
+                 if cmd in cmd_set else cfg
+            for cmd, cfg in system_command_datas.items()}
+
+def _run_tasks(tasks, jobs):
+    """Call each (function, arguments) of `tasks`, with a pool of `jobs`
+    threads if `jobs` > 1, and return their results"""
+    if jobs <= 1:
+        return [func(*args) for func, args in tasks]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(func, *args) for func, args in tasks]
+        # Re-raise the first exception from the writers, if any
+        return [future.result() for future in futures]
+
+def write_json_files(app_command_datas, system_command_datas, json_dir, verbose=False, jobs=1, compact=False, update=False, deduplicate=False):
     """Write the per-application and whole-system command data as json files in `json_dir`
+
+    With `jobs` > 1, the files are serialised and written by a pool of
+    `jobs` threads. With `compact`, the json is written without indentation.
+
+    With `deduplicate`, the app files are written to a content store,
+    data/store, where the payloads that several apps have in common are
+    only written once, and the system command files refer to them there
+    instead of to data/<app>_<cmd> (see expand_json_store).
+
+    With `update`, `json_dir` may already hold a configuration: only the
+    files whose data changed are rewritten, the app files of apps that
+    are no longer in the system are removed, and a summary of what
+    changed is printed. Returns a dictionary from app (or system command)
+    name to the list of written commands, with "removed" for removed apps
     """
 
     # Backwards compatibility
@@ -783,18 +973,109 @@ def write_json_files(app_command_datas, system_command_datas, json_dir, verbose=
     console.rule("JSON file creation")
 
     data_dir = json_dir / 'data'
-    data_dir.mkdir(parents=True)
+    data_dir.mkdir(parents=True, exist_ok=update)
+    store_dir = data_dir / 'store'
 
     # Apps
-    for app_name, command_data in app_command_datas.items():
-        make_app_json(app_name, command_data, data_dir, verbose)
+    if deduplicate:
+        store_dir.mkdir(exist_ok=update)
+        old_refs = _read_app_data_refs(json_dir) if update else {c: {} for c in cmd_set}
+        app_refs = dict(zip(app_command_datas.keys(),
+                            _run_tasks([(make_app_store_json, (app_name, command_data, store_dir, verbose, compact))
+                                        for app_name, command_data in app_command_datas.items()], jobs)))
+        app_results = [[c for c in cmd_set if old_refs[c].get(app_name) != refs[c]]
+                       for app_name, refs in app_refs.items()]
+        system_command_datas = with_app_data_refs(system_command_datas, app_refs)
+    else:
+        app_tasks = [(make_app_json, (app_name, command_data, data_dir, verbose, compact, update))
+                     for app_name, command_data in app_command_datas.items()]
 
     # System commands
-    for cmd, cfg in system_command_datas.items():
-        with open(json_dir / f'{cmd}.json', 'w') as f:
-            json.dump(cfg, f, indent=4, sort_keys=True)
+    system_tasks = [(write_json_file, (json_dir / f'{cmd}.json', cfg, compact, update))
+                    for cmd, cfg in system_command_datas.items()]
 
-    console.log(f"System configuration generated in directory '{json_dir}'")
+    if deduplicate:
+        results = app_results + _run_tasks(system_tasks, jobs)
+    else:
+        results = _run_tasks(app_tasks + system_tasks, jobs)
+
+    changes = dict(zip(app_command_datas.keys(), results))
+    changes.update({cmd: [cmd] if written else []
+                    for cmd, written in zip(system_command_datas.keys(), results[len(app_command_datas):])})
+
+    if update:
+        stale_apps = set()
+        for c in cmd_set:
+            for path in data_dir.glob(f'*_{c}.json'):
+                app_name = path.name[:-len(f'_{c}.json')]
+                if app_name not in app_command_datas or deduplicate:
+                    # With deduplicate, the apps' files are in the store
+                    path.unlink()
+                    if app_name not in app_command_datas:
+                        stale_apps.add(app_name)
+            if deduplicate:
+                stale_apps.update(app_name for app_name in old_refs[c] if app_name not in app_command_datas)
+        if deduplicate:
+            used = {ref.split('/')[-1] for refs in app_refs.values() for ref in refs.values()}
+            for path in store_dir.glob('*.json'):
+                if path.stem not in used:
+                    path.unlink()
+        elif store_dir.exists():
+            shutil.rmtree(store_dir)
+        changes.update({app_name: "removed" for app_name in sorted(stale_apps)})
+
+        for name, changed in changes.items():
+            if changed == "removed":
+                console.log(f"{name}: removed")
+            elif changed:
+                console.log(f"{name}: changed ({', '.join(changed)})")
+            else:
+                console.log(f"{name}: unchanged")
+        n_changed = sum(1 for changed in changes.values() if changed)
+        console.log(f"{n_changed} of {len(changes)} apps and system commands changed")
+        console.log(f"System configuration updated in directory '{json_dir}'")
+    else:
+        console.log(f"System configuration generated in directory '{json_dir}'")
+
+    if deduplicate:
+        n_files = len(cmd_set) * len(app_refs)
+        n_stored = len({ref for refs in app_refs.values() for ref in refs.values()})
+        console.log(f"{n_files} app json files stored as {n_stored} distinct files in '{store_dir}'")
+
+    return changes
+
+def expand_json_store(json_dir, compact=False):
+    """Turn a configuration written by write_json_files with `deduplicate`
+    back into the classic layout: each app's files are copied from the
+    content store to data/<app>_<cmd>.json, the system command files refer
+    to them there, and the store is removed. Returns the number of app
+    files written"""
+
+    # Backwards compatibility
+    if isinstance(json_dir, str):
+        json_dir = Path(json_dir)
+
+    n_files = 0
+    for c in cmd_set:
+        path = json_dir / f'{c}.json'
+        with open(path, 'r') as f:
+            cfg = json.load(f)
+        for app_name, ref in cfg["apps"].items():
+            classic_ref = f'data/{app_name}_{c}'
+            if ref == classic_ref:
+                continue
+            app_path = json_dir / f'{classic_ref}.json'
+            if app_path.exists():
+                app_path.unlink()
+            shutil.copyfile(json_dir / f'{ref}.json', app_path)
+            cfg["apps"][app_name] = classic_ref
+            n_files += 1
+        write_json_file(path, cfg, compact, update=True)
+
+    store_dir = json_dir / 'data' / 'store'
+    if store_dir.exists():
+        shutil.rmtree(store_dir)
+    return n_files
 
 
 def get_version():
@@ -8,6 +8,7 @@ from collections import defaultdict
 from os.path import exists, join
 import random
 import string
+import inspect
 
 console = Console()
 # Set moo schema search path
@@ -19,6 +20,9 @@ moo.io.default_load_path = get_moo_model_path()
 # Load configuration types
 import moo.otypes
 import moo.oschema
+import click
+
+from daqconf.core.schema import load_types
 
 def _strict_recursive_update(dico1, dico2):
     for k, v in dico2.items():
@@ -138,30 +142,49 @@ def helptree(ost, prefix=''):
             output += f"\n{prefix}    {field['name']} (Default: {field['default']}){docstr}"
     return "\b\n"+output
 
+class _LazyHelpOption(click.Option):
+    """A click option whose help text is made by `help_factory` the
+    first time the help is shown, rather than when the CLI is built"""
+
+    def __init__(self, *args, help_factory=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.help_factory = help_factory
+
+    def get_help_record(self, ctx):
+        if self.help is None and self.help_factory is not None:
+            # click tidies up help strings the same way when they're given up front
+            self.help = inspect.cleandoc(self.help_factory())
+        return super().get_help_record(ctx)
+
 def generate_cli_from_schema(schema_file, schema_object_name, *args): ## doh
     def add_decorator(function):
-        moo.otypes.load_types(schema_file)
-        import importlib
-        module_name = schema_file.replace('.jsonnet', '').replace('/', '.')
-        config_module = importlib.import_module(f'dunedaq.{module_name}')
-        schema_object = getattr(config_module, schema_object_name)
-        extra_schemas = [getattr(config_module, obj)() for obj in args]
+        def config_module():
+            # Only evaluated when the config is parsed or the help is shown
+            load_types(schema_file)
+            import importlib
+            module_name = schema_file.replace('.jsonnet', '').replace('/', '.')
+            return importlib.import_module(f'dunedaq.{module_name}')
 
         def configure(ctx, param, filename):
+            schema_object = getattr(config_module(), schema_object_name)
             return parse_config_file(filename, schema_object())
 
-        import click
-
-        hlp = helptree(schema_object().ost)
-        for extra_schema in extra_schemas:
-            hlp+="\n\n\n"+helptree(extra_schema.ost)
+        def make_help():
+            module = config_module()
+            schema_object = getattr(module, schema_object_name)
+            extra_schemas = [getattr(module, obj)() for obj in args]
+            hlp = helptree(schema_object().ost)
+            for extra_schema in extra_schemas:
+                hlp+="\n\n\n"+helptree(extra_schema.ost)
+            return hlp
 
         return click.option(
             '-c', '--config',
+            cls          = _LazyHelpOption,
             type         = click.Path(dir_okay=False),
             default      = None,
             callback     = configure,
-            help         = hlp,
+            help_factory = make_help,
             show_default = True,
         )(function)
     return add_decorator
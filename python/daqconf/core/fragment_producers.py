@@ -1,28 +1,102 @@
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
 from rich.console import Console
 
-import moo.otypes
+import bisect
 import re
 
-moo.otypes.load_types('trigger/moduleleveltrigger.jsonnet')
-moo.otypes.load_types('dfmodules/fragmentreceiver.jsonnet')
-moo.otypes.load_types('dfmodules/requestreceiver.jsonnet')
-moo.otypes.load_types('dfmodules/triggerrecordbuilder.jsonnet')
-
-import dunedaq.trigger.moduleleveltrigger as mlt
-import dunedaq.dfmodules.fragmentreceiver as frcv
-import dunedaq.dfmodules.requestreceiver as rrcv
-import dunedaq.dfmodules.triggerrecordbuilder as trb
+# Configuration types, loaded when first used
+from daqconf.core.schema import lazy_types
+mlt = lazy_types('dunedaq.trigger.moduleleveltrigger', 'trigger/moduleleveltrigger.jsonnet')
+frcv = lazy_types('dunedaq.dfmodules.fragmentreceiver', 'dfmodules/fragmentreceiver.jsonnet')
+rrcv = lazy_types('dunedaq.dfmodules.requestreceiver', 'dfmodules/requestreceiver.jsonnet')
+trb = lazy_types('dunedaq.dfmodules.triggerrecordbuilder', 'dfmodules/triggerrecordbuilder.jsonnet')
 
 from daqconf.core.conf_utils import Direction
 from daqconf.core.sourceid import source_id_raw_str, ensure_subsystem_string
 
 console = Console()
 
+class MLTLinks:
+    """
+    The links that the ModuleLevelTrigger requests data from, keyed by
+    (subsystem, element), where subsystem is the subsystem string (eg
+    "Detector_Readout"). Links are added and removed here, and the MLT's
+    configuration is rebuilt once, by apply(). The links keep the order
+    in which they were first added.
+    """
+
+    def __init__(self, the_system, mlt_app_name="trigger", mlt_module_name="mlt"):
+        self.mgraph = the_system.apps[mlt_app_name].modulegraph
+        self.mlt_module_name = mlt_module_name
+        # (subsystem, element) -> None, as an insertion-ordered set
+        self._links = dict()
+        # subsystem -> sorted elements, for select(), made when needed
+        self._sorted_elements = dict()
+        for link in self.mgraph.get_module(mlt_module_name).conf.links:
+            self.add(link["subsystem"], link["element"])
+
+    def add(self, subsystem, element):
+        key = (ensure_subsystem_string(subsystem), element)
+        if key not in self._links:
+            self._links[key] = None
+            self._sorted_elements.pop(key[0], None)
+
+    def add_source_id(self, source_id):
+        self.add(source_id.subsystem, source_id.id)
+
+    def remove(self, subsystem, element):
+        key = (ensure_subsystem_string(subsystem), element)
+        if key not in self._links:
+            raise ValueError(f"SourceID {key} not in MLT links list")
+        del self._links[key]
+        self._sorted_elements.pop(key[0], None)
+
+    def __contains__(self, key):
+        subsystem, element = key
+        return (ensure_subsystem_string(subsystem), element) in self._links
+
+    def __len__(self):
+        return len(self._links)
+
+    def __iter__(self):
+        return iter(self._links)
+
+    def select(self, subsystem=None, min_element=None, max_element=None):
+        """
+        The (subsystem, element) keys of the links in `subsystem` (or in
+        any subsystem if None) with min_element <= element < max_element
+        (either bound may be None). For a given subsystem, the elements
+        are found by bisection, so this is cheap even with tens of
+        thousands of links
+        """
+        if subsystem is None:
+            return [(s, e) for (s, e) in self._links
+                    if (min_element is None or e >= min_element) and (max_element is None or e < max_element)]
+        subsystem = ensure_subsystem_string(subsystem)
+        if subsystem not in self._sorted_elements:
+            self._sorted_elements[subsystem] = sorted(e for (s, e) in self._links if s == subsystem)
+        elements = self._sorted_elements[subsystem]
+        lo = 0 if min_element is None else bisect.bisect_left(elements, min_element)
+        hi = len(elements) if max_element is None else bisect.bisect_left(elements, max_element)
+        return [(subsystem, e) for e in elements[lo:hi]]
+
+    def remove_selected(self, subsystem=None, min_element=None, max_element=None):
+        """Remove the links that select() returns for the same arguments, and return their keys"""
+        selected = self.select(subsystem, min_element, max_element)
+        for key in selected:
+            del self._links[key]
+        for changed in set(s for (s, e) in selected):
+            self._sorted_elements.pop(changed, None)
+        return selected
+
+    def apply(self, verbose=False):
+        """Rebuild the MLT's configuration with the current links"""
+        links = [{"subsystem": subsystem, "element": element} for (subsystem, element) in self._links]
+        if verbose:
+            console.log(f"Setting {len(links)} links in mlt.links: {links}")
+        old_mlt_conf = self.mgraph.get_module(self.mlt_module_name).conf
+        self.mgraph.reset_module_conf(self.mlt_module_name,
+                                      mlt.ConfParams(**dict(old_mlt_conf.pod(), links=links)))
+
 def set_mlt_links(the_system, mlt_app_name="trigger", verbose=False):
     """
     The MLT needs to know the full list of fragment producers in the
@@ -30,47 +104,68 @@ def set_mlt_links(the_system, mlt_app_name="trigger", verbose=False):
     function gets all the fragment producers in the system and adds their
     GeoIDs to the MLT's config. It assumes that the ModuleLevelTrigger
     lives in an application with name `mlt_app_name` and has the name
-    "mlt".
+    "mlt". Returns the MLTLinks, for further changes.
     """
-    mlt_links = []
+    mlt_links = MLTLinks(the_system, mlt_app_name)
     for producer in the_system.get_fragment_producers():
         if producer.is_mlt_producer:
-            source_id = producer.source_id
-            mlt_links.append( mlt.SourceID(subsystem=ensure_subsystem_string(source_id.subsystem), element=source_id.id) )
-    if verbose:
-        console.log(f"Adding {len(mlt_links)} links to mlt.links: {mlt_links}")
-    mgraph = the_system.apps[mlt_app_name].modulegraph
-    old_mlt_conf = mgraph.get_module("mlt").conf
-    mgraph.reset_module_conf("mlt", mlt.ConfParams(links=mlt_links, 
-                                                   dfo_connection=old_mlt_conf.dfo_connection, 
-                                                   dfo_busy_connection=old_mlt_conf.dfo_busy_connection,
-                                                   hsi_trigger_type_passthrough=old_mlt_conf.hsi_trigger_type_passthrough,
-						   buffer_timeout=old_mlt_conf.buffer_timeout,
-                                                   td_out_of_timeout=old_mlt_conf.td_out_of_timeout,
-                                                   td_readout_limit=old_mlt_conf.td_readout_limit))
+            mlt_links.add_source_id(producer.source_id)
+    mlt_links.apply(verbose)
+    return mlt_links
 
 def remove_mlt_link(the_system, source_id, mlt_app_name="trigger"):
     """
-    Remove the given source_id (which should be a dict with keys "system", "region", "element") from the list of links to request data from in the MLT.
+    Remove the given source_id (which should be a dict with keys "subsystem", "element") from the list of links to request data from in the MLT.
+    To remove many links, use MLTLinks, which rebuilds the MLT's configuration only once.
     """
-    mgraph = the_system.apps[mlt_app_name].modulegraph
-    old_mlt_conf = mgraph.get_module("mlt").conf
-    mlt_links = old_mlt_conf.links
-    if source_id not in mlt_links:
-        raise ValueError(f"SourceID {source_id} not in MLT links list")
-    mlt_links.remove(source_id)
-    mgraph.reset_module_conf("mlt", mlt.ConfParams(links=mlt_links, 
-                                                   dfo_connection=old_mlt_conf.dfo_connection, 
-                                                   dfo_busy_connection=old_mlt_conf.dfo_busy_connection,
-                                                   hsi_trigger_type_passthrough=old_mlt_conf.hsi_trigger_type_passthrough,
-                                                   buffer_timeout=old_mlt_conf.buffer_timeout,
-					       	   td_out_of_timeout=old_mlt_conf.td_out_of_timeout,
-                                                   td_readout_limit=old_mlt_conf.td_readout_limit))
+    mlt_links = MLTLinks(the_system, mlt_app_name)
+    mlt_links.remove(source_id["subsystem"], source_id["element"])
+    mlt_links.apply()
     
-def connect_fragment_producers(app_name, the_system, verbose=False):
+def get_trb_apps(the_system):
+    """
+    Get the (app name, TriggerRecordBuilder module name) pairs of all the
+    apps in the system that have a TriggerRecordBuilder, ie the dataflow
+    apps and DQM
+    """
+    trb_apps = []
+    for name, app in the_system.apps.items():
+        trb_modules = [n.name for n in app.modulegraph.module_list() if n.plugin == "TriggerRecordBuilder"]
+        if trb_modules:
+            trb_apps.append((name, trb_modules[0]))
+    return trb_apps
+
+def add_trb_maps(the_system, trb_maps):
+    """
+    Append the source_id-to-connections entries in `trb_maps`, a dict
+    from app name to a list of trb.sourceidinst, to the map of the
+    TriggerRecordBuilder of each of those apps, rebuilding each
+    TriggerRecordBuilder's configuration once
+    """
+    for trb_app_name, trb_module_name in get_trb_apps(the_system):
+        if trb_app_name not in trb_maps:
+            continue
+        df_mgraph = the_system.apps[trb_app_name].modulegraph
+        old_trb_conf = df_mgraph.get_module(trb_module_name).conf
+        new_trb_map = old_trb_conf.map + trb_maps[trb_app_name]
+        df_mgraph.reset_module_conf(trb_module_name, trb.ConfParams(general_queue_timeout=old_trb_conf.general_queue_timeout,
+                                                               source_id = old_trb_conf.source_id,
+                                                          reply_connection_name = f"fragments_to_{trb_app_name}",
+                                                          max_time_window = old_trb_conf.max_time_window,
+                                                          trigger_record_timeout_ms = old_trb_conf.trigger_record_timeout_ms,
+                                                          map=trb.mapsourceidconnections(new_trb_map)))
+
+def connect_fragment_producers(app_name, the_system, verbose=False, trb_apps=None, trb_maps=None):
     """Connect the data request and fragment sending queues from all of
        the fragment producers in the app with name `app_name` to the
-       appropriate endpoints of the dataflow app."""
+       appropriate endpoints of the dataflow app.
+
+       `trb_apps` is the result of get_trb_apps(the_system), which is
+       worked out if not given. If `trb_maps` is given, the app's
+       source_id-to-connections entries are added to it for each
+       TriggerRecordBuilder app, for add_trb_maps to configure them all
+       at once, rather than being added to the TriggerRecordBuilders
+       straight away."""
     if verbose:
         console.log(f"Connecting fragment producers in {app_name}")
 
@@ -135,28 +230,25 @@ def connect_fragment_producers(app_name, the_system, verbose=False):
                                  internal_name = "request_receiver.input", 
                                  inout = Direction.IN)
                                
-    trb_apps = [ (name,app) for (name,app) in the_system.apps.items() if "TriggerRecordBuilder" in [n.plugin for n in app.modulegraph.module_list()] ]
+    if trb_apps is None:
+        trb_apps = get_trb_apps(the_system)
     # Connect fragment sender output to TRB in DF app (via FragmentReceiver)
     fragment_endpoint_name = "{app_name}.fragments"
 
-    for trb_app_name, trb_app_conf in trb_apps:
+    pending_trb_maps = trb_maps if trb_maps is not None else dict()
+    for trb_app_name, trb_module_name in trb_apps:
         fragment_connection_name = f"fragments_to_{trb_app_name}"
         app.modulegraph.add_endpoint(fragment_connection_name, None, Direction.OUT)
-        df_mgraph = trb_app_conf.modulegraph
-        trb_module_name = [n.name for n in df_mgraph.module_list() if n.plugin == "TriggerRecordBuilder"][0]
+        df_mgraph = the_system.apps[trb_app_name].modulegraph
         df_mgraph.add_endpoint(fragment_connection_name, f"{trb_module_name}.data_fragment_all", Direction.IN, toposort=True)            
         df_mgraph.add_endpoint(request_connection_name, f"{trb_module_name}.request_output_{app_name}", Direction.OUT)
 
         # Add the new source_id-to-connections map to the
         # TriggerRecordBuilder.
-        old_trb_conf = df_mgraph.get_module(trb_module_name).conf
-        new_trb_map = old_trb_conf.map + trb_source_id_to_connection
-        df_mgraph.reset_module_conf(trb_module_name, trb.ConfParams(general_queue_timeout=old_trb_conf.general_queue_timeout,
-                                                               source_id = old_trb_conf.source_id,
-                                                          reply_connection_name = fragment_connection_name,
-                                                          max_time_window = old_trb_conf.max_time_window,
-                                                          trigger_record_timeout_ms = old_trb_conf.trigger_record_timeout_ms,
-                                                          map=trb.mapsourceidconnections(new_trb_map)))
+        pending_trb_maps.setdefault(trb_app_name, []).extend(trb_source_id_to_connection)
+
+    if trb_maps is None:
+        add_trb_maps(the_system, pending_trb_maps)
                           
 
 def connect_all_fragment_producers(the_system, dataflow_name="dataflow", verbose=False):
@@ -164,7 +256,11 @@ def connect_all_fragment_producers(the_system, dataflow_name="dataflow", verbose
     Connect all fragment producers in the system to the appropriate
     queues in the dataflow app.
     """
+    trb_apps = get_trb_apps(the_system)
+    trb_maps = dict()
     for name, app in the_system.apps.items():
         if name==dataflow_name:
             continue
-        connect_fragment_producers(name, the_system, verbose)
+        connect_fragment_producers(name, the_system, verbose, trb_apps=trb_apps, trb_maps=trb_maps)
+    # Configure each TriggerRecordBuilder once, with the entries for all the producers
+    add_trb_maps(the_system, trb_maps)
@@ -0,0 +1,18 @@
+from collections import namedtuple
+
+# For raw recording to work the size of the LB has to be a multiple of this many bytes
+LATENCY_BUFFER_ALIGNMENT = 4096
+
+# What a latency buffer element of each frontend type holds: its size in
+# bytes, and the number of clock ticks of data in it (a superchunk of 12
+# frames for the WIBs). The latency buffers of the other frontend types
+# aren't sized from their data rate
+LatencyBufferElement = namedtuple('LatencyBufferElement', ['size', 'ticks'])
+LATENCY_BUFFER_ELEMENTS = {
+    'wib': LatencyBufferElement(size=12 * 464, ticks=12 * 25),
+    'wib2': LatencyBufferElement(size=12 * 472, ticks=12 * 32),
+}
+
+# The latency buffer of a link: its number of elements, and the size of an
+# element in bytes, or None if it isn't known for the frontend type
+LatencyBufferSize = namedtuple('LatencyBufferSize', ['elements', 'element_size'])
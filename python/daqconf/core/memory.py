@@ -0,0 +1,106 @@
+import re
+from collections import defaultdict
+from math import ceil
+from rich.console import Console
+
+from daqconf.core.latency_buffers import LATENCY_BUFFER_ELEMENTS
+
+console = Console()
+
+# Bytes per element of the latency buffers and queues whose element size
+# isn't known: about a TriggerPrimitive, or a message passed by value
+DEFAULT_ELEMENT_SIZE = 64
+
+# Rough sizes of the elements of the trigger buffers: a TriggerPrimitive,
+# and a TriggerActivity or TriggerCandidate with a few inputs
+TRIGGER_BUFFER_ELEMENT_SIZES = {
+    'TPBuffer': 64,
+    'TABuffer': 512,
+    'TCBuffer': 512,
+}
+
+# Plugins whose conf has a latencybufferconf and a requesthandlerconf
+LATENCY_BUFFER_PLUGINS = ['DataLinkHandler'] + list(TRIGGER_BUFFER_ELEMENT_SIZES.keys())
+
+# Memory of an app besides its buffers and queues: libraries, threads' stacks, ...
+APP_BASE_MEMORY = 512 * 2**20
+
+GiB = 2**30
+
+_queue_uri = re.compile(r"^queue://\w+:(\d+)$")
+
+def _pod(conf):
+    return conf.pod() if hasattr(conf, 'pod') else conf
+
+def estimate_app_memory(app, connections=(), latency_buffer_sizes=None):
+    """
+    Estimate the resident memory of `app`, from the configuration of its
+    modules and its queues, `connections` being its ConnectionIds. The
+    element sizes of its links' latency buffers and queues are taken from
+    `latency_buffer_sizes` (see readout_gen.get_latency_buffer_sizes).
+    Returns a dictionary from what the memory is taken by to bytes
+    """
+    latency_buffer_sizes = latency_buffer_sizes if latency_buffer_sizes else {}
+    element_sizes = {}
+    for source_id, size in latency_buffer_sizes.items():
+        if size.element_size is not None:
+            element_sizes[f"datahandler_{source_id}"] = size.element_size
+            for frontend_type in LATENCY_BUFFER_ELEMENTS:
+                element_sizes[f"{frontend_type}_link_{source_id}"] = size.element_size
+
+    memory = defaultdict(int)
+    memory["base"] = APP_BASE_MEMORY
+    for module in app.modulegraph.modules:
+        conf = _pod(module.conf)
+        if not isinstance(conf, dict):
+            continue
+        if module.plugin in LATENCY_BUFFER_PLUGINS:
+            element_size = element_sizes.get(module.name, TRIGGER_BUFFER_ELEMENT_SIZES.get(module.plugin, DEFAULT_ELEMENT_SIZE))
+            latency_buffer_size = (conf.get("latencybufferconf") or {}).get("latency_buffer_size") or 0
+            memory["latency buffers"] += latency_buffer_size * element_size
+            memory["stream buffers"] += (conf.get("requesthandlerconf") or {}).get("stream_buffer_size") or 0
+        elif module.plugin == "FelixCardReader":
+            memory["dma"] += ceil((conf.get("dma_memory_size_gb") or 0) * GiB)
+
+    for connection in connections:
+        match = _queue_uri.match(connection.uri) if connection.service_type == "kQueue" else None
+        if match is not None:
+            memory["queues"] += int(match.group(1)) * element_sizes.get(connection.uid, DEFAULT_ELEMENT_SIZE)
+    return dict(memory)
+
+def k8s_memory_request(memory, minimum_gi=1):
+    """The k8s memory request for an app with the `memory` of estimate_app_memory, in whole Gi, at least `minimum_gi`"""
+    return f"{max(minimum_gi, ceil(sum(memory.values()) / GiB))}Gi"
+
+def check_host_memory(the_system, app_memory, host_memory_gb=None, default_host_memory_gb=0, fail=False):
+    """
+    Add up the `app_memory` (a dictionary from app name to the result of
+    estimate_app_memory) of the apps of `the_system` on each host, and
+    compare it with the RAM of the host, from `host_memory_gb` (host to
+    GB), or `default_host_memory_gb` if it isn't there and it isn't 0.
+    Logs the estimate of each host, and warns, or raises a RuntimeError
+    if `fail` is set, about the hosts whose RAM is exceeded. Returns a
+    dictionary from host to estimated bytes
+    """
+    host_memory_gb = host_memory_gb if host_memory_gb else {}
+    hosts = defaultdict(lambda: defaultdict(int))
+    for app_name, memory in app_memory.items():
+        for what, size in memory.items():
+            hosts[the_system.apps[app_name].host][what] += size
+
+    totals = {}
+    overcommitted = []
+    for host, memory in hosts.items():
+        totals[host] = sum(memory.values())
+        details = ", ".join(f"{what} {size / GiB:.2f}" for what, size in memory.items() if size)
+        console.log(f"Estimated memory on {host}: {totals[host] / GiB:.2f} GiB ({details})")
+        ram_gb = host_memory_gb.get(host, default_host_memory_gb)
+        if ram_gb and totals[host] > ram_gb * GiB:
+            overcommitted.append(f"{host} ({totals[host] / GiB:.2f} GiB estimated, {ram_gb} GiB available)")
+
+    if overcommitted:
+        message = f"The estimated memory of the apps is more than the RAM of {', '.join(overcommitted)}"
+        if fail:
+            raise RuntimeError(message)
+        console.log(f"WARNING! {message}", style="bold red")
+    return totals
@@ -0,0 +1,174 @@
+import re
+from collections import namedtuple
+from itertools import cycle
+
+# The NUMA placement of a readout app: the NUMA node of its card, the CPUs
+# of that node that its threads run on by default, the CPUs of that node
+# that its readout threads are pinned to one by one (the node's isolated
+# CPUs if it has any, else all of them), and the EAL arguments of its DPDK
+# reader with their lcores on the node's first worker CPUs (None if it
+# has no DPDK reader)
+NUMAPlan = namedtuple('NUMAPlan', ['numa_id', 'cpus', 'worker_cpus', 'eal_args'])
+
+# Linux keeps the first 15 characters of the name of a thread
+THREAD_NAME_LENGTH = 15
+
+# The busy threads of the readout plugins, by plugin, as the names that
+# the plugins give them with ReusableThread::set_name(name, id), ie
+# "<name>-<id>" cut to THREAD_NAME_LENGTH. {source_id} is the source ID
+# of a link handler or of a link of a card reader, {card_id} and
+# {logical_unit} those of a FELIX card. The post-processing threads
+# ("postprocess-<task>-<source ID>") are those of link handlers with
+# software TPG, which have one task, hit finding. The other threads
+# (cleanup, recording, timesync, the FELIX e-link parsers, ...) stay on
+# the parent's CPUs, and the NICReceiver's lcores are placed through the
+# EAL arguments
+LINK_HANDLER_THREADS = ["consumer-{source_id}"]
+SOFTWARE_TPG_THREADS = ["postprocess-0-{source_id}"]
+CARD_READER_THREADS = {
+    'FelixCardReader': ["flxcard-{card_id}-{logical_unit}"],
+    'FakeCardReader':  ["fakeprod-{source_id}"],
+}
+
+def parse_cpu_list(cpu_list):
+    """The CPUs of a list like "0-3,8,10-11", as a list of ints"""
+    cpus = []
+    for part in cpu_list.replace(' ', '').split(','):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        try:
+            cpus += list(range(int(first), int(last if last else first) + 1))
+        except ValueError:
+            raise RuntimeError(f"Can't parse '{part}' in CPU list '{cpu_list}'")
+    return cpus
+
+def format_cpu_list(cpus):
+    """The inverse of parse_cpu_list"""
+    ranges = []
+    for cpu in sorted(set(cpus)):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(f"{first}-{last}" if last > first else f"{first}" for first, last in ranges)
+
+def _get_host_topology(cpu_topology, host):
+    for host_topology in cpu_topology:
+        if host_topology['host'] == host:
+            return host_topology
+    return None
+
+def get_numa_cpus(cpu_topology, host):
+    """The CPUs of each NUMA node of `host` in `cpu_topology` (as
+    readout.cpu_topology), by NUMA ID. Empty if the host isn't in it"""
+    host_topology = _get_host_topology(cpu_topology, host)
+    if host_topology is None:
+        return {}
+    return {node['numa_id']: parse_cpu_list(node['cpus']) for node in host_topology['numa_nodes']}
+
+def get_isolated_cpus(cpu_topology, host):
+    """The isolated CPUs of `host` in `cpu_topology`, as a list of ints"""
+    host_topology = _get_host_topology(cpu_topology, host)
+    return parse_cpu_list(host_topology['isolated_cpus']) if host_topology is not None else []
+
+def place_eal_lcores(eal_args, cpus):
+    """
+    `eal_args` with its lcore list (-l) replaced by an --lcores mapping
+    of the same lcore IDs to the first of `cpus`, so that the lcores
+    that the NICReceiver's links refer to run on those CPUs. Returns the
+    new EAL arguments and the CPUs that the lcores were put on
+    """
+    match = re.search(r"(?:^|\s)(-l\s+(\S+))", eal_args)
+    if match is None:
+        return eal_args, []
+    lcores = parse_cpu_list(match.group(2))
+    if len(lcores) > len(cpus):
+        raise RuntimeError(f"The EAL arguments '{eal_args}' need {len(lcores)} lcores, but there are only {len(cpus)} CPUs to put them on")
+    lcores_arg = "--lcores " + ",".join(f"{lcore}@{cpu}" for lcore, cpu in zip(lcores, cpus))
+    return eal_args[:match.start(1)] + lcores_arg + eal_args[match.end(1):], cpus[:len(lcores)]
+
+def make_numa_plan(host, numa_id, cpu_topology, eal_args=None):
+    """
+    The NUMAPlan of a readout app on `host` whose card is on NUMA node
+    `numa_id`. If the node has isolated CPUs, the readout threads get
+    those, and everything else the others. `eal_args` are the EAL
+    arguments of the app's DPDK reader, None if it has none: its lcores
+    are put on the first worker CPUs, which are then left to them
+    """
+    cpus = get_numa_cpus(cpu_topology, host).get(numa_id)
+    if not cpus:
+        raise RuntimeError(f"readout.cpu_topology gives no CPUs for NUMA node {numa_id} of {host}")
+    isolated = set(get_isolated_cpus(cpu_topology, host))
+    worker_cpus = [cpu for cpu in cpus if cpu in isolated]
+    if worker_cpus and len(worker_cpus) < len(cpus):
+        cpus = [cpu for cpu in cpus if cpu not in isolated]
+    else:
+        worker_cpus = cpus
+    if eal_args is not None:
+        eal_args, lcore_cpus = place_eal_lcores(eal_args, worker_cpus)
+        # The lcores have their CPUs to themselves, unless that leaves none
+        worker_cpus = [cpu for cpu in worker_cpus if cpu not in lcore_cpus] or worker_cpus
+    return NUMAPlan(numa_id, cpus, worker_cpus, eal_args)
+
+def _pod(conf):
+    return conf.pod() if hasattr(conf, 'pod') else conf
+
+def thread_pattern(thread, **ids):
+    """The readout-affinity.py pattern of the thread named after the
+    template `thread` with `ids`, as the kernel keeps its name"""
+    return f"{thread.format(**ids)[:THREAD_NAME_LENGTH]}$"
+
+def get_readout_threads(app):
+    """
+    The readout-affinity.py patterns of the threads of the readout
+    modules of `app` that get CPUs of their own: the card readers' first,
+    then those of each link handler, in the order of the module list.
+    Threads whose names only differ past THREAD_NAME_LENGTH have the
+    same pattern
+    """
+    sources = []
+    link_handlers = []
+    for module in app.modulegraph.modules:
+        conf = _pod(module.conf)
+        if not isinstance(conf, dict):
+            continue
+        if module.plugin == 'DataLinkHandler':
+            source_id = (conf.get('readoutmodelconf') or {}).get('source_id')
+            threads = LINK_HANDLER_THREADS
+            if (conf.get('rawdataprocessorconf') or {}).get('enable_software_tpg'):
+                threads = threads + SOFTWARE_TPG_THREADS
+            link_handlers += [thread_pattern(thread, source_id=source_id) for thread in threads]
+        elif module.plugin == 'FelixCardReader':
+            sources += [thread_pattern(thread, card_id=conf.get('card_id'), logical_unit=conf.get('logical_unit'))
+                        for thread in CARD_READER_THREADS[module.plugin]]
+        elif module.plugin in CARD_READER_THREADS:
+            sources += [thread_pattern(thread, source_id=link['source_id'])
+                        for link in conf.get('link_confs') or []
+                        for thread in CARD_READER_THREADS[module.plugin]]
+    return sources + link_handlers
+
+def make_thread_pinning(numa_plans, apps):
+    """
+    The thread pinning data for readout-affinity.py that keeps each
+    readout app of `numa_plans` (a dictionary from app name to NUMAPlan)
+    on the CPUs of its card's NUMA node, and pins the threads of its card
+    readers and link handlers to the node's worker CPUs, round-robin.
+    The threads that can't be told apart by their names share the CPUs
+    they get. `apps` is the dictionary from app name to App of the
+    system. The apps that share a NUMA node of a host share its
+    round-robin
+    """
+    workers = {}
+    pinning = {}
+    for app_name, plan in numa_plans.items():
+        app = apps[app_name]
+        worker_cpus = workers.setdefault((app.host, plan.numa_id), cycle(plan.worker_cpus))
+        threads = {}
+        for thread in get_readout_threads(app):
+            threads.setdefault(thread, []).append(next(worker_cpus))
+        pinning[f"--name {app_name}"] = {
+            "parent": format_cpu_list(plan.cpus),
+            "threads": {thread: format_cpu_list(cpus) for thread, cpus in threads.items()},
+        }
+    return {"daq_application": pinning}
@@ -0,0 +1,817 @@
+import json
+import math
+import os
+from os.path import exists, abspath, dirname
+from pathlib import Path
+from rich.console import Console
+
+from detchannelmaps._daq_detchannelmaps_py import HardwareMapService
+
+from daqconf.core.system import System
+from daqconf.core.metadata import write_metadata_file
+from daqconf.core.profiling import StageProfiler
+from daqconf.core.sourceid import SourceIDBroker, get_tpg_mode
+from daqconf.core.conf_utils import make_app_command_datas, make_system_connections, make_system_command_datas, write_json_files
+from daqconf.core.fragment_producers import connect_all_fragment_producers, set_mlt_links
+from daqconf.core.sweep import link_identical_files, unlink_shared_files, prune_store
+from daqconf.core.memory import estimate_app_memory, check_host_memory, k8s_memory_request
+from daqconf.core.queue_sizing import QueueRates, size_queues
+from daqconf.core.numa_plan import make_numa_plan, make_thread_pinning
+
+# Configuration types, loaded when a generation first uses them
+from daqconf.core.schema import lazy_types
+confgen = lazy_types('dunedaq.daqconf.confgen', 'daqconf/confgen.jsonnet')
+
+from daqconf.apps.dataflow_gen import get_dataflow_app
+from daqconf.apps.dqm_gen import get_dqm_app
+from daqconf.apps.readout_gen import get_readout_app, get_latency_buffer_sizes
+from daqconf.apps.trigger_gen import get_trigger_app
+from daqconf.apps.dfo_gen import get_dfo_app
+from daqconf.apps.hsi_gen import get_hsi_app
+from daqconf.apps.fake_hsi_gen import get_fake_hsi_app
+from daqconf.apps.tprtc_gen import get_tprtc_app
+from daqconf.apps.dpdk_sender_gen import get_dpdk_sender_app
+from daqconf.apps.tpwriter_gen import get_tpwriter_app
+
+console = Console()
+
+# The k8s memory request of the felix RU apps before it was estimated: it
+# is kept as their minimum
+FELIX_RU_MEMORY_GI = 32
+
+def thread_pinning_scripts(thread_pinning_file):
+    """The boot scripts that apply `thread_pinning_file` with readout-affinity.py"""
+    return {
+        "thread_pinning": {
+            "cmd": [
+                "readout-affinity.py --pinfile ${DUNEDAQ_THREAD_PIN_FILE}"
+            ],
+            "env": {
+                "DUNEDAQ_THREAD_PIN_FILE": thread_pinning_file,
+                "LD_LIBRARY_PATH": "getenv",
+                "PATH": "getenv"
+            }
+        }
+    }
+
+class GeneratedConfig:
+    """
+    The result of ConfigPipeline.generate: the System, the per-app and
+    whole-system command data, ready for ConfigPipeline.write, and the
+    confgen sections (boot, readout, ...) they were made from, and the
+    thread pinning data of the readout apps to write with them, if it is
+    generated.
+    """
+
+    def __init__(self, system, app_command_datas, system_command_datas, sections, thread_pinning=None):
+        self.system = system
+        self.app_command_datas = app_command_datas
+        self.system_command_datas = system_command_datas
+        self.sections = sections
+        self.thread_pinning = thread_pinning
+
+class ConfigPipeline:
+    """
+    Generates daqconf_multiru_gen configurations in-process.
+
+    generate() takes a parsed confgen.daqconf_multiru_gen configuration
+    and returns the System and command data it describes, and write()
+    writes them to an output directory. A pipeline can generate any
+    number of configurations: the schemas are only loaded once per
+    process, and hardware map files are only parsed again when they
+    change, so generating many variants of a configuration in one
+    process (see generate_batch) costs little more than the generation
+    itself.
+    """
+
+    def __init__(self, debug=False, jobs=1, profiler=None):
+        self.debug = debug
+        self.jobs = jobs
+        self.profiler = profiler if profiler is not None else StageProfiler(enabled=False)
+        # Resolved path -> (modification time, HardwareMapService, DRO infos)
+        self._hardware_maps = dict()
+
+    def hardware_map(self, hardware_map_file):
+        """The HardwareMapService and DRO infos of `hardware_map_file`,
+        parsed the first time it is asked for and after each change"""
+        path = os.path.realpath(hardware_map_file)
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._hardware_maps.get(path)
+        if cached is None or cached[0] != mtime:
+            hw_map_service = HardwareMapService(path)
+            cached = (mtime, hw_map_service, hw_map_service.get_all_dro_info())
+            self._hardware_maps[path] = cached
+        return cached[1], cached[2]
+
+    def sections(self, config_data, base_command_port=-1, hardware_map_file='', data_rate_slowdown_factor=0, enable_dqm=False, op_env=''):
+        """Make the confgen section objects of `config_data`, a
+        confgen.daqconf_multiru_gen, applying the daqconf_multiru_gen
+        command line options that override them"""
+        debug = self.debug
+
+        ## Hack, we shouldn't need to do that, in the future it should be, boot = config_data.boot
+        boot = confgen.boot(**config_data.boot)
+        if debug: console.log(f"boot configuration object: {boot.pod()}")
+
+        ## etc...
+        timing = confgen.timing(**config_data.timing)
+        if debug: console.log(f"timing configuration object: {timing.pod()}")
+
+        hsi = confgen.hsi(**config_data.hsi)
+        if debug: console.log(f"hsi configuration object: {hsi.pod()}")
+
+        readout = confgen.readout(**config_data.readout)
+        if debug: console.log(f"readout configuration object: {readout.pod()}")
+
+        trigger = confgen.trigger(**config_data.trigger)
+        if debug: console.log(f"trigger configuration object: {trigger.pod()}")
+
+        dataflow = confgen.dataflow(**config_data.dataflow)
+        if debug: console.log(f"dataflow configuration object: {dataflow.pod()}")
+
+        dqm = confgen.dqm(**config_data.dqm)
+        if debug: console.log(f"dqm configuration object: {dqm.pod()}")
+
+        dpdk_sender = confgen.dpdk_sender(**config_data.dpdk_sender)
+        if debug: console.log(f"dpdk_sender configuration object: {dpdk_sender.pod()}")
+
+        # Update with command-line options
+        if base_command_port != -1:
+           boot.base_command_port = base_command_port
+        if hardware_map_file != '':
+            readout.hardware_map_file = hardware_map_file
+        if data_rate_slowdown_factor != 0:
+            readout.data_rate_slowdown_factor = data_rate_slowdown_factor
+        dqm.enable_dqm |= enable_dqm
+        if dqm.impl == 'pocket':
+            dqm.kafka_address = boot.pocket_url + ":30092"
+        if op_env != '':
+            boot.op_env = op_env
+
+        return {
+            "boot": boot,
+            "timing": timing,
+            "hsi": hsi,
+            "readout": readout,
+            "trigger": trigger,
+            "dataflow": dataflow,
+            "dqm": dqm,
+            "dpdk_sender": dpdk_sender,
+        }
+
+    def generate(self, config_data, cache_dir=None, debug_dir=None, **options):
+        """
+        Generate the configuration described by `config_data`, a parsed
+        confgen.daqconf_multiru_gen. `options` are the command line
+        overrides of daqconf_multiru_gen (see sections()).
+
+        The hardware map is readout.hardware_map_file, parsed once per
+        pipeline (see hardware_map()). With `cache_dir`, the command
+        data of apps that are unchanged since a previous generation is
+        reused from the ConfigCache there. With `debug` set, dot files
+        of the system are written to `debug_dir`, if given.
+        """
+        debug = self.debug
+        profiler = self.profiler
+
+        # Get our config objects
+        profiler.begin("schema load")
+        sections = self.sections(config_data, **options)
+        boot = sections["boot"]
+        timing = sections["timing"]
+        hsi = sections["hsi"]
+        readout = sections["readout"]
+        trigger = sections["trigger"]
+        dataflow = sections["dataflow"]
+        dqm = sections["dqm"]
+        dpdk_sender = sections["dpdk_sender"]
+
+        profiler.begin("dataflow config")
+        sourceid_broker = SourceIDBroker()
+        sourceid_broker.debug = debug
+
+        if len(dataflow.apps) == 0:
+            console.log(f"No Dataflow apps defined, adding default dataflow0")
+            dataflow.apps = [confgen.dataflowapp()]
+
+        host_df = []
+        appconfig_df ={}
+        df_app_names = []
+        for d in dataflow.apps:
+            console.log(f"Parsing dataflow app config {d}")
+
+            ## Hack, we shouldn't need to do that, in the future, it should be appconfig = d
+            appconfig = confgen.dataflowapp(**d)
+
+            dfapp = appconfig.app_name
+            if dfapp in df_app_names:
+                appconfig_df[dfapp].update(appconfig)
+            else:
+                df_app_names.append(dfapp)
+                appconfig_df[dfapp] = appconfig
+                appconfig_df[dfapp].source_id = sourceid_broker.get_next_source_id("TRBuilder")
+                sourceid_broker.register_source_id("TRBuilder", appconfig_df[dfapp].source_id, None)
+                host_df += [appconfig.host_df]
+
+
+        if boot.use_k8s:
+            console.log(f'Using k8s')
+            trigger.tpset_output_path = abspath(trigger.tpset_output_path)
+            for df_app in appconfig_df.values():
+                new_output_path = []
+                for op in df_app.output_paths:
+                    new_output_path += [abspath(op)]
+                df_app.output_paths = new_output_path
+            readout.hardware_map_file = abspath(readout.hardware_map_file)
+            readout.data_file = abspath(readout.data_file)
+            if debug: console.log(f"Using data file {readout.data_file}")
+
+        config_cache = None
+        config_key = None
+        if cache_dir is not None:
+            profiler.begin("cache key")
+            from daqconf.core.cache import ConfigCache
+            config_cache = ConfigCache(cache_dir)
+            config_key = config_cache.config_key({
+                "boot": boot,
+                "timing": timing,
+                "hsi": hsi,
+                "readout": readout,
+                "trigger": trigger,
+                "dataflow": dataflow,
+                "dataflow_apps": [df_app.pod() for df_app in appconfig_df.values()],
+                "dqm": dqm,
+                "dpdk_sender": dpdk_sender,
+            }, readout.hardware_map_file)
+
+        console.log(f"Generating configs for hosts trigger={trigger.host_trigger} DFO={dataflow.host_dfo} dataflow={host_df} hsi={hsi.host_hsi} dqm={dqm.host_dqm}")
+
+        the_system = System(first_port=timing.port_timing+1)
+
+        # Load the hw map file here to extract ru hosts, cards, slr, links, forntend types, sourceIDs and geoIDs
+        # The ru apps are determined by the combinations of hostname and card_id, the SourceID determines the
+        # DLH (with physical slr+link information), the detId acts as system_type allows to infer the frontend_type
+        profiler.begin("hardware map")
+        hw_map_service, dro_infos = self.hardware_map(readout.hardware_map_file)
+
+        profiler.begin("source ids")
+        tp_mode = get_tpg_mode(readout.enable_firmware_tpg,readout.enable_software_tpg)
+        sourceid_broker.register_readout_source_ids(dro_infos, tp_mode)
+        sourceid_broker.generate_trigger_source_ids(dro_infos, tp_mode)
+        tp_infos = sourceid_broker.get_all_source_ids("Trigger")
+
+        profiler.end()
+
+        for dro_info in dro_infos:
+            console.log(f"Will start a RU process on {dro_info.host} reading card number {dro_info.card}, {len(dro_info.links)} links active")
+
+        if readout.enable_software_tpg and readout.use_fake_data_producers:
+            raise Exception("Fake data producers don't support software tpg")
+
+        if readout.use_fake_data_producers and dqm.enable_dqm:
+            raise Exception("DQM can't be used with fake data producers")
+
+        if trigger.enable_tpset_writing and not (readout.enable_software_tpg or readout.enable_firmware_tpg):
+            raise Exception("TP writing can only be used when either software or firmware TPG is enabled")
+
+        if readout.enable_firmware_tpg and not readout.use_felix:
+            raise Exception("firmware TPG can only be used if real felix card is also used.")
+
+        if readout.enable_firmware_tpg and readout.use_fake_data_producers:
+            raise Exception("Fake data producers don't support firmware tpg")
+
+        if hsi.use_hsi_hw and not hsi.hsi_device_name:
+            raise Exception("If --use-hsi-hw flag is set to true, --hsi-device-name must be specified!")
+
+        if timing.control_timing_partition and not timing.timing_partition_master_device_name:
+            raise Exception("If --control-timing-partition flag is set to true, --timing-partition-master-device-name must be specified!")
+
+        if hsi.control_hsi_hw and not hsi.use_hsi_hw:
+            raise Exception("HSI hardware control can only be enabled if HSI hardware is used!")
+
+        if boot.use_k8s and not boot.image:
+            raise Exception("You need to provide an --image if running with k8s")
+
+        max_expected_tr_sequences = 1
+        for df_config in appconfig_df.values():
+            if df_config.max_trigger_record_window >= 1:
+                df_max_sequences = ((trigger.trigger_window_before_ticks + trigger.trigger_window_after_ticks) / df_config.max_trigger_record_window)
+                if df_max_sequences > max_expected_tr_sequences:
+                    max_expected_tr_sequences = df_max_sequences
+
+        # 11-Jul-2022, KAB: added timeout calculations. The Readout and Trigger App DataRequest timeouts
+        # are set based on the command-line parameter that is specified in this script, and they are
+        # treated separately here in case we want to customize them somehow in the future.
+        # The trigger-record-building timeout is intended to be a multiple of the larger of those two,
+        # and it needs to have a non-trivial minimum value.
+        # We also include a factor in the TRB timeout that takes into account the number of data producers.
+        # At the moment, that factor uses the square root of the number of data producers, and it attempts
+        # to take into account the number of data producers in Readout and Trigger.
+        MINIMUM_BASIC_TRB_TIMEOUT = 200  # msec
+        TRB_TIMEOUT_SAFETY_FACTOR = 2
+        DFO_TIMEOUT_SAFETY_FACTOR = 3
+        MINIMUM_DFO_TIMEOUT = 10000
+        readout_data_request_timeout = boot.data_request_timeout_ms # can that be put somewhere else? in dataflow?
+        trigger_data_request_timeout = boot.data_request_timeout_ms
+        trigger_record_building_timeout = max(MINIMUM_BASIC_TRB_TIMEOUT, TRB_TIMEOUT_SAFETY_FACTOR * max(readout_data_request_timeout, trigger_data_request_timeout))
+        if len(dro_infos) >= 1:
+            effective_number_of_data_producers = len(dro_infos)  # number of DataLinkHandlers
+            if readout.enable_software_tpg or readout.enable_firmware_tpg:
+                effective_number_of_data_producers *= 2  # add in TPSet producers from Trigger (one per Link)
+                effective_number_of_data_producers += len(dro_infos)  # add in TA producers from Trigger (one per RU)
+            trigger_record_building_timeout = int(math.sqrt(effective_number_of_data_producers) * trigger_record_building_timeout)
+        trigger_record_building_timeout += 15 * TRB_TIMEOUT_SAFETY_FACTOR * max_expected_tr_sequences
+        dfo_stop_timeout = max(DFO_TIMEOUT_SAFETY_FACTOR * trigger_record_building_timeout, MINIMUM_DFO_TIMEOUT)
+
+        profiler.begin("hsi app")
+        hsi_source_id = sourceid_broker.get_next_source_id("HW_Signals_Interface")
+        sourceid_broker.register_source_id("HW_Signals_Interface", hsi_source_id, None)
+        if hsi.use_hsi_hw:
+            the_system.apps["hsi"] = get_hsi_app(
+                CLOCK_SPEED_HZ = readout.clock_speed_hz,
+                TRIGGER_RATE_HZ = trigger.trigger_rate_hz,
+                CONTROL_HSI_HARDWARE=hsi.control_hsi_hw,
+                CONNECTIONS_FILE=hsi.hsi_hw_connections_file,
+                READOUT_PERIOD_US = hsi.hsi_readout_period,
+                HSI_DEVICE_NAME = hsi.hsi_device_name,
+                HSI_ENDPOINT_ADDRESS = hsi.hsi_endpoint_address,
+                HSI_ENDPOINT_PARTITION = hsi.hsi_endpoint_partition,
+                HSI_RE_MASK=hsi.hsi_re_mask,
+                HSI_FE_MASK=hsi.hsi_fe_mask,
+                HSI_INV_MASK=hsi.hsi_inv_mask,
+                HSI_SOURCE=hsi.hsi_source,
+                HSI_SOURCE_ID=hsi_source_id,
+                TIMING_PARTITION=timing.timing_partition_name,
+                TIMING_HOST=timing.host_timing,
+                TIMING_PORT=timing.port_timing,
+                HOST=hsi.host_hsi,
+                DEBUG=debug)
+        else:
+            the_system.apps["hsi"] = get_fake_hsi_app(
+                CLOCK_SPEED_HZ = readout.clock_speed_hz,
+                DATA_RATE_SLOWDOWN_FACTOR = readout.data_rate_slowdown_factor,
+                TRIGGER_RATE_HZ = trigger.trigger_rate_hz,
+                HSI_SOURCE_ID=hsi_source_id,
+                MEAN_SIGNAL_MULTIPLICITY = hsi.mean_hsi_signal_multiplicity,
+                SIGNAL_EMULATION_MODE = hsi.hsi_signal_emulation_mode,
+                ENABLED_SIGNALS =  hsi.enabled_hsi_signals,
+                HOST=hsi.host_hsi,
+                DEBUG=debug)
+
+        if debug: console.log("hsi cmd data:", the_system.apps["hsi"])
+
+        if timing.control_timing_partition:
+            profiler.begin("tprtc app")
+            the_system.apps["tprtc"] = get_tprtc_app(
+                MASTER_DEVICE_NAME=timing.timing_partition_master_device_name,
+                TIMING_PARTITION_ID=timing.timing_partition_id,
+                TRIGGER_MASK=timing.timing_partition_trigger_mask,
+                RATE_CONTROL_ENABLED=timing.timing_partition_rate_control_enabled,
+                SPILL_GATE_ENABLED=timing.timing_partition_spill_gate_enabled,
+                TIMING_PARTITION=timing.timing_partition_name,
+                TIMING_HOST=timing.host_timing,
+                TIMING_PORT=timing.port_timing,
+                HOST=timing.host_tprtc,
+                DEBUG=debug)
+
+        profiler.begin("trigger app")
+        the_system.apps['trigger'] = get_trigger_app(
+            DATA_RATE_SLOWDOWN_FACTOR = readout.data_rate_slowdown_factor,
+            CLOCK_SPEED_HZ = readout.clock_speed_hz,
+            TP_CONFIG = tp_infos,
+            ACTIVITY_PLUGIN = trigger.trigger_activity_plugin,
+            ACTIVITY_CONFIG = trigger.trigger_activity_config,
+            CANDIDATE_PLUGIN = trigger.trigger_candidate_plugin,
+            CANDIDATE_CONFIG = trigger.trigger_candidate_config,
+            TTCM_S1=trigger.ttcm_s1,
+            TTCM_S2=trigger.ttcm_s2,
+            TRIGGER_WINDOW_BEFORE_TICKS = trigger.trigger_window_before_ticks,
+            TRIGGER_WINDOW_AFTER_TICKS = trigger.trigger_window_after_ticks,
+            HSI_TRIGGER_TYPE_PASSTHROUGH = trigger.hsi_trigger_type_passthrough,
+            MLT_BUFFER_TIMEOUT = trigger.mlt_buffer_timeout,
+            MLT_MAX_TD_LENGTH_MS = trigger.mlt_max_td_length_ms,
+            MLT_SEND_TIMED_OUT_TDS = trigger.mlt_send_timed_out_tds,
+            CHANNEL_MAP_NAME = trigger.tpg_channel_map,
+            DATA_REQUEST_TIMEOUT=trigger_data_request_timeout,
+            HOST=trigger.host_trigger,
+            DEBUG=debug)
+
+        profiler.begin("dfo app")
+        the_system.apps['dfo'] = get_dfo_app(
+            DF_CONF = appconfig_df,
+            STOP_TIMEOUT = dfo_stop_timeout,
+            HOST=dataflow.host_dfo,
+            DEBUG=debug)
+
+
+        if readout.latency_buffer_auto_size:
+            # The latency buffers have to hold the data of a trigger window until the
+            # data requests for it have timed out
+            trigger_window_ms = 1000 * (trigger.trigger_window_before_ticks + trigger.trigger_window_after_ticks) / readout.clock_speed_hz
+            latency_buffer_time_ms = readout_data_request_timeout + trigger_window_ms + readout.latency_buffer_margin_ms
+            console.log(f"Sizing the latency buffers to hold {latency_buffer_time_ms:.1f} ms of data")
+        else:
+            latency_buffer_time_ms = None
+
+        ru_app_names=[]
+        dqm_app_names = []
+        ru_latency_buffer_sizes = {}
+        numa_plans = {}
+        for dro_idx,dro_config in enumerate(dro_infos):
+            host=dro_config.host.replace("-","")
+            ru_name = f"ru{host}{dro_config.card}"
+            ru_app_names.append(ru_name)
+
+            ru_latency_buffer_sizes[ru_name] = get_latency_buffer_sizes(
+                dro_config,
+                CLOCK_SPEED_HZ = readout.clock_speed_hz,
+                DATA_RATE_SLOWDOWN_FACTOR = readout.data_rate_slowdown_factor,
+                LATENCY_BUFFER_SIZE = readout.latency_buffer_size,
+                BUFFER_TIME_MS = latency_buffer_time_ms)
+
+            numa_id = readout.numa_config['default_id']
+            for ex in readout.numa_config['exceptions']:
+                if ex['host'] == dro_config.host and ex['card'] == dro_config.card:
+                    numa_id = ex['numa_id']
+
+            eal_args = readout.eal_args
+            if readout.enable_numa_plan:
+                numa_plans[ru_name] = make_numa_plan(dro_config.host, numa_id, readout.cpu_topology,
+                                                     eal_args if readout.enable_dpdk_reader else None)
+                if readout.enable_dpdk_reader:
+                    eal_args = numa_plans[ru_name].eal_args
+
+            profiler.begin(f"{ru_name} app")
+            the_system.apps[ru_name] = get_readout_app(
+                HOST=dro_config.host,
+                DRO_CONFIG=dro_config,
+                EMULATOR_MODE = readout.emulator_mode,
+                DATA_RATE_SLOWDOWN_FACTOR = readout.data_rate_slowdown_factor,
+                DATA_FILE = readout.data_file,
+                FLX_INPUT = readout.use_felix,
+                CLOCK_SPEED_HZ = readout.clock_speed_hz,
+                RAW_RECORDING_ENABLED = readout.enable_raw_recording,
+                RAW_RECORDING_OUTPUT_DIR = readout.raw_recording_output_dir,
+                SOFTWARE_TPG_ENABLED = readout.enable_software_tpg,
+                FIRMWARE_TPG_ENABLED = readout.enable_firmware_tpg,
+                DTP_CONNECTIONS_FILE= readout.dtp_connections_file,
+                FIRMWARE_HIT_THRESHOLD= readout.firmware_hit_threshold,
+                TPG_CHANNEL_MAP = trigger.tpg_channel_map,
+                USE_FAKE_DATA_PRODUCERS = readout.use_fake_data_producers,
+                LATENCY_BUFFER_SIZE=readout.latency_buffer_size,
+                LATENCY_BUFFER_SIZES=ru_latency_buffer_sizes[ru_name],
+                DATA_REQUEST_TIMEOUT=readout_data_request_timeout,
+                SOURCEID_BROKER = sourceid_broker,
+                READOUT_SENDS_TP_FRAGMENTS = readout.readout_sends_tp_fragments,
+                ENABLE_DPDK_SENDER=dpdk_sender.enable_dpdk_sender,
+                ENABLE_DPDK_READER=readout.enable_dpdk_reader,
+                EAL_ARGS=eal_args,
+                BASE_SOURCE_IP=readout.base_source_ip,
+                DESTINATION_IP=readout.destination_ip,
+                NUMA_ID = numa_id,
+                LATENCY_BUFFER_NUMA_AWARE = readout.enable_numa_plan,
+                DEBUG=debug)
+
+            if boot.use_k8s:
+                if readout.use_felix:
+                    the_system.apps[ru_name].resources = {
+                        "felix.cern/flx0-data": "1", # requesting FLX0
+                        "memory": f"{FELIX_RU_MEMORY_GI}Gi" # yes bro
+                    }
+                # TODO: HACK, can't do that any other way now, please give me a nice asset manager
+                the_system.apps[ru_name].mounted_dirs += [{
+                    'name': 'frames-bin',
+                    'physical_location': dirname(readout.data_file),
+                    'in_pod_location':   dirname(readout.data_file),
+                    'read_only': True,
+                }]
+
+
+            if debug:
+                console.log(f"{ru_name} app: {the_system.apps[ru_name]}")
+
+            if dqm.enable_dqm:
+                dqm_name = "dqm" + ru_name
+                dqm_app_names.append(dqm_name)
+                dqm_links = [link.dro_source_id for link in dro_config.links]
+                profiler.begin(f"{dqm_name} app")
+                the_system.apps[dqm_name] = get_dqm_app(
+                    DQM_IMPL=dqm.impl,
+                    DATA_RATE_SLOWDOWN_FACTOR=readout.data_rate_slowdown_factor,
+                    CLOCK_SPEED_HZ=readout.clock_speed_hz,
+                    MAX_NUM_FRAMES=dqm.max_num_frames,
+                    DQMIDX = dro_idx,
+                    KAFKA_ADDRESS=dqm.kafka_address,
+                    KAFKA_TOPIC=dqm.kafka_topic,
+                    CMAP=dqm.cmap,
+                    RAW_PARAMS=dqm.raw_params,
+                    RMS_PARAMS=dqm.rms_params,
+                    STD_PARAMS=dqm.std_params,
+                    FOURIER_CHANNEL_PARAMS=dqm.fourier_channel_params,
+                    FOURIER_PLANE_PARAMS=dqm.fourier_plane_params,
+                    LINKS=dqm_links,
+                    HOST=dqm.host_dqm[dro_idx % len(dqm.host_dqm)],
+                    DRO_CONFIG=dro_config,
+                    DEBUG=debug)
+
+                if debug: console.log(f"{dqm_name} app: {the_system.apps[dqm_name]}")
+
+        dqm_df_app_names = []
+        idx = 0
+
+        for app_name,df_config in appconfig_df.items():
+            dfidx = df_config.source_id
+            profiler.begin(f"{app_name} app")
+            the_system.apps[app_name] = get_dataflow_app(
+                HOSTIDX=dfidx,
+                OUTPUT_PATHS = df_config.output_paths,
+                APP_NAME=app_name,
+                OPERATIONAL_ENVIRONMENT = boot.op_env,
+                MAX_FILE_SIZE = df_config.max_file_size,
+                MAX_TRIGGER_RECORD_WINDOW = df_config.max_trigger_record_window,
+                MAX_EXPECTED_TR_SEQUENCES = max_expected_tr_sequences,
+                TOKEN_COUNT = df_config.token_count,
+                TRB_TIMEOUT = trigger_record_building_timeout,
+                HOST=df_config.host_df,
+                HAS_DQM=dqm.enable_dqm,
+                HARDWARE_MAP_FILE=readout.hardware_map_file,
+                DEBUG=debug
+            )
+            if boot.use_k8s:
+                the_system.apps[app_name].mounted_dirs += [{
+                    'name': f'raw-data-{i}',
+                    'physical_location': opath,
+                    'in_pod_location': opath,
+                    'read_only': False,
+                } for i,opath in enumerate(set(df_config.output_paths))]
+                # doubling down on ugly hacking...
+                if dirname(readout.hardware_map_file) not in df_config.output_paths:
+                    the_system.apps[app_name].mounted_dirs += [{
+                        'name': 'hardware-map',
+                        'physical_location': dirname(readout.hardware_map_file),
+                        'in_pod_location': dirname(readout.hardware_map_file),
+                        'read_only': True,
+                    }]
+
+
+            if dqm.enable_dqm:
+                dqm_name = f"dqmdf{dfidx}"
+                dqm_df_app_names.append(dqm_name)
+                dqm_links = [link.dro_source_id for dro_config in dro_infos for link in dro_config.links]
+                profiler.begin(f"{dqm_name} app")
+                the_system.apps[dqm_name] = get_dqm_app(
+                    DQM_IMPL=dqm.impl,
+                    DATA_RATE_SLOWDOWN_FACTOR = readout.data_rate_slowdown_factor,
+                    CLOCK_SPEED_HZ = readout.clock_speed_hz,
+                    MAX_NUM_FRAMES=dqm.max_num_frames,
+                    DQMIDX = dfidx,
+                    KAFKA_ADDRESS=dqm.kafka_address,
+                    KAFKA_TOPIC=dqm.kafka_topic,
+                    CMAP=dqm.cmap,
+                    RAW_PARAMS=[0, 0],
+                    RMS_PARAMS=[0, 0],
+                    STD_PARAMS=[0, 0],
+                    FOURIER_CHANNEL_PARAMS=[0, 0],
+                    FOURIER_PLANE_PARAMS=[0, 0],
+                    LINKS=dqm_links,
+                    HOST=dqm.host_dqm[idx%len(dqm.host_dqm)],
+                    MODE='df',
+                    DF_RATE=dqm.df_rate * len(host_df),
+                    DF_ALGS=dqm.df_algs,
+                    DF_TIME_WINDOW=trigger.trigger_window_before_ticks + trigger.trigger_window_after_ticks,
+                    DRO_CONFIG=dro_config, # This is coming from the readout loop
+                    DEBUG=debug)
+
+                if debug: console.log(f"{dqm_name} app: {the_system.apps[dqm_name]}")
+            idx += 1
+
+        if trigger.enable_tpset_writing:
+            tpw_name=f'tpwriter'
+            dfidx = sourceid_broker.get_next_source_id("TRBuilder")
+            sourceid_broker.register_source_id("TRBuilder", dfidx, None)
+            profiler.begin(f"{tpw_name} app")
+            the_system.apps[tpw_name] = get_tpwriter_app(
+                OUTPUT_PATH = trigger.tpset_output_path,
+                APP_NAME = tpw_name,
+                OPERATIONAL_ENVIRONMENT = boot.op_env,
+                MAX_FILE_SIZE = trigger.tpset_output_file_size,
+                DATA_RATE_SLOWDOWN_FACTOR = readout.data_rate_slowdown_factor,
+                CLOCK_SPEED_HZ = readout.clock_speed_hz,
+                HARDWARE_MAP_FILE=readout.hardware_map_file,
+                SOURCE_IDX=dfidx,
+                HOST=trigger.host_tpw,
+                DEBUG=debug)
+            if boot.use_k8s: ## TODO schema
+                the_system.apps[tpw_name].mounted_dirs += [{
+                    'name': 'raw-data',
+                    'physical_location':trigger.tpset_output_path,
+                    'in_pod_location':trigger.tpset_output_path,
+                    'read_only': False
+                }]
+
+            if debug: console.log(f"{tpw_name} app: {the_system.apps[tpw_name]}")
+
+        all_apps_except_ru = []
+        all_apps_except_ru_and_df = []
+
+        if dpdk_sender.enable_dpdk_sender:
+            profiler.begin("dpdk_sender app")
+            the_system.apps["dpdk_sender"] = get_dpdk_sender_app(
+                HOST=dpdk_sender.host_dpdk_sender[0],
+            )
+
+        for name,app in the_system.apps.items():
+            if app.name=="__app":
+                app.name=name
+
+            if app.name not in ru_app_names:
+                all_apps_except_ru += [app]
+            if app.name not in ru_app_names+df_app_names:
+                all_apps_except_ru_and_df += [name]
+
+            # HACK
+            boot_order = ru_app_names + df_app_names + [app for app in all_apps_except_ru_and_df]
+            if debug:
+                console.log(f'Boot order: {boot_order}')
+
+        if debug and debug_dir is not None:
+            the_system.export(debug_dir / "system_no_frag_prod_connection.dot")
+        profiler.begin("fragment producers")
+        connect_all_fragment_producers(the_system, verbose=debug)
+
+        mlt_links = set_mlt_links(the_system, "trigger", verbose=debug)
+
+        # Raw TP links are only in the MLT's list of links if
+        # readout.readout_sends_tp_fragments is set, since readout_gen only
+        # makes them MLT fragment producers then. Any other links to leave
+        # out of the readout requests can be taken out in one go with eg
+        #
+        #   mlt_links.remove_selected(subsystem="Detector_Readout", min_element=1000)
+        #   mlt_links.apply()
+        if debug:
+            console.log(f"After set_mlt_links, mlt_links is {list(mlt_links)}")
+
+        if debug and debug_dir is not None:
+            the_system.export(debug_dir / "system.dot")
+
+        ####################################################################
+        # Application command data generation
+        ####################################################################
+
+        profiler.begin("connections")
+        make_system_connections(the_system, verbose=debug, use_k8s=boot.use_k8s)
+
+        if boot.queue_burst_ms > 0:
+            profiler.begin("queue sizes")
+            size_queues(the_system,
+                        QueueRates(clock_speed_hz=readout.clock_speed_hz,
+                                   data_rate_slowdown_factor=readout.data_rate_slowdown_factor,
+                                   tp_rate_per_link_hz=trigger.expected_tp_rate_per_link_hz,
+                                   tpset_rate_per_link_hz=trigger.expected_tpset_rate_per_link_hz,
+                                   ta_rate_hz=trigger.expected_ta_rate_hz,
+                                   trigger_rate_hz=trigger.trigger_rate_hz),
+                        boot.queue_burst_ms,
+                        verbose=debug)
+
+        profiler.begin("memory estimate")
+        app_memory = {name: estimate_app_memory(app, the_system.connections[name], ru_latency_buffer_sizes.get(name))
+                      for name, app in the_system.apps.items()}
+        check_host_memory(the_system, app_memory,
+                          host_memory_gb={h['host']: h['memory_gb'] for h in boot.host_memory},
+                          default_host_memory_gb=boot.default_host_memory_gb,
+                          fail=boot.memory_overcommit == 'fail')
+        if boot.use_k8s:
+            felix_ru_apps = ru_app_names if readout.use_felix else []
+            for name, memory in app_memory.items():
+                minimum_gi = FELIX_RU_MEMORY_GI if name in felix_ru_apps else 1
+                the_system.apps[name].resources["memory"] = k8s_memory_request(memory, minimum_gi)
+
+        # Arrange per-app command data into the format used by util.write_json_files()
+        profiler.begin("app command data")
+        app_command_datas = make_app_command_datas(the_system, jobs=self.jobs, verbose=debug, use_k8s=boot.use_k8s,
+                                                   cache=config_cache, config_key=config_key)
+
+        ##################################################################################
+
+        # Make boot.json config
+
+        # HACK: Make sure RUs start after trigger
+        forced_deps = []
+
+        for i,host in enumerate(dro_infos):
+            ru_name = ru_app_names[i]
+            forced_deps.append(['hsi', ru_name])
+            if trigger.enable_tpset_writing:
+                forced_deps.append(['tpwriter', ru_name])
+
+        if dqm.enable_dqm:
+            for i,host in enumerate(dro_infos):
+                dqm_name = dqm_app_names[i]
+                forced_deps.append([dqm_name, 'dfo'])
+            for i,host in enumerate(host_df):
+                dqm_name = dqm_df_app_names[i]
+                forced_deps.append([dqm_name, 'dfo'])
+        forced_deps.append(['trigger','hsi'])
+
+        profiler.begin("system command data")
+        system_command_datas = make_system_command_datas(
+            boot,
+            the_system,
+            forced_deps,
+            verbose=debug
+        )
+
+
+        if readout.thread_pinning_file != "":
+            resolved_thread_pinning_file = os.path.abspath(os.path.expanduser(os.path.expandvars(readout.thread_pinning_file)))
+            if not exists(resolved_thread_pinning_file):
+                raise RuntimeError(f'Cannot find the file {readout.thread_pinning_file} ({resolved_thread_pinning_file})')
+
+            system_command_datas['boot']['scripts'] = thread_pinning_scripts(resolved_thread_pinning_file)
+            thread_pinning = None
+        elif readout.enable_numa_plan:
+            thread_pinning = make_thread_pinning(numa_plans, the_system.apps)
+        else:
+            thread_pinning = None
+        profiler.end()
+
+        return GeneratedConfig(the_system, app_command_datas, system_command_datas, sections, thread_pinning)
+
+    def write(self, generated, output_dir, config_file=None, generator="daqconf_multiru_gen", compact=False, update=False, deduplicate=False, debug_dir=None):
+        """
+        Write the json files of `generated`, a GeneratedConfig, to
+        `output_dir`, with the metadata file and a copy of the hardware
+        map. `compact`, `update` and `deduplicate` are as for
+        write_json_files
+        """
+        output_dir = Path(output_dir)
+        readout = generated.sections["readout"]
+
+        if generated.thread_pinning is not None:
+            # readout-affinity.py is run from wherever nanorc is, so refer to the file by its absolute path
+            thread_pinning_file = output_dir.resolve() / "thread_pinning.json"
+            output_dir.mkdir(parents=True, exist_ok=True)
+            with open(thread_pinning_file, 'w') as f:
+                json.dump(generated.thread_pinning, f, indent=4)
+            generated.system_command_datas['boot']['scripts'] = thread_pinning_scripts(str(thread_pinning_file))
+
+        self.profiler.begin("json files")
+        write_json_files(generated.app_command_datas, generated.system_command_datas, output_dir,
+                         verbose=self.debug, jobs=self.jobs, compact=compact, update=update,
+                         deduplicate=deduplicate)
+        self.profiler.end()
+
+        console.log(f"MDAapp config generated in {output_dir}")
+
+        write_metadata_file(output_dir, generator, config_file)
+        with open(readout.hardware_map_file, 'r') as hwmap_file:
+            hwmap_data = hwmap_file.read()
+        with open(output_dir/'hwmap.json', 'w') as f :
+            json.dump({
+                '__to_read_(rm_backslashes)': f"python -c \"import json,sys;print(json.load(open(sys.argv[1]))['hwmap'])\" {output_dir}/hwmap.json",
+                'hwmap': hwmap_data
+            }, f, indent=2)
+
+        if self.debug and debug_dir is not None:
+            for name in generated.system.apps:
+                generated.system.apps[name].export(debug_dir / f"{name}.dot")
+
+    def generate_batch(self, variants, output_root, compact=False, update=False, deduplicate=False, use_cache=False, store_dir=None, **options):
+        """
+        Generate and write a configuration for each (name, config_data,
+        config_file) of `variants`, into `output_root`/name, config_file
+        being the file config_data was read from, or None. The schemas, the
+        hardware maps and, with `use_cache`, the command data of apps
+        that don't change between variants (see ConfigCache) are shared
+        by all of them. With `store_dir`, the files that are identical in
+        several variants are hard links to a single copy kept there (see
+        sweep.link_identical_files); with `update`, each variant's files
+        get their own copies again before it is rewritten, and the copies
+        in `store_dir` that are no longer used are removed at the end.
+        `options` are passed to generate(). Returns the output directories
+        """
+        output_root = Path(output_root)
+        cache_dir = output_root.resolve() / ".daqconf_cache" if use_cache else None
+        output_dirs = []
+        for name, config_data, config_file in variants:
+            output_dir = output_root / name
+            if output_dir.exists() and not update:
+                raise RuntimeError(f"Directory {output_dir} already exists")
+            debug_dir = output_dir / 'debug'
+            if self.debug:
+                debug_dir.mkdir(parents=True, exist_ok=update)
+            console.rule(f"Generating {name}")
+            generated = self.generate(config_data, cache_dir=cache_dir, debug_dir=debug_dir, **options)
+            if store_dir is not None and output_dir.exists():
+                # write() rewrites some files in place: don't let that change the other variants
+                unlink_shared_files(output_dir)
+            self.write(generated, output_dir, config_file=config_file, compact=compact, update=update, deduplicate=deduplicate, debug_dir=debug_dir)
+            if store_dir is not None:
+                shared = link_identical_files(output_dir, store_dir)
+                console.log(f"{shared} files of {name} are shared with other configurations")
+            output_dirs.append(output_dir)
+        if store_dir is not None:
+            removed = prune_store(store_dir)
+            if removed:
+                console.log(f"Removed {removed} files that are no longer used from {store_dir}")
+        return output_dirs
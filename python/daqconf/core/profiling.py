@@ -0,0 +1,90 @@
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from rich.console import Console
+
+console = Console()
+
+def _cpu_time():
+    # Include the children, e.g. the make_app_command_datas workers, once they have been waited for
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+class StageProfiler:
+    """Records the wall time, CPU time and tracemalloc peak of the
+    consecutive stages of a generation
+
+    A stage lasts from begin() to the next begin() or end(), or is the
+    body of a `with profiler.stage(name)` block. Stages don't nest. The
+    memory peak of a stage is the peak of what was allocated during it,
+    since tracing is restarted at every stage. When the profiler isn't
+    enabled, all of this does nothing, so the calls can stay in place.
+    """
+
+    def __init__(self, enabled=True, trace_memory=True):
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.stages = []
+        self._current = None
+
+    def begin(self, name):
+        if not self.enabled:
+            return
+        self.end()
+        if self.trace_memory:
+            tracemalloc.start()
+        self._current = (name, time.perf_counter(), _cpu_time())
+
+    def end(self):
+        if not self.enabled or self._current is None:
+            return
+        name, wall_start, cpu_start = self._current
+        wall = time.perf_counter() - wall_start
+        cpu = _cpu_time() - cpu_start
+        peak = None
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.stages.append({
+            "stage": name,
+            "wall_time_s": wall,
+            "cpu_time_s": cpu,
+            "peak_memory_bytes": peak,
+        })
+        self._current = None
+
+    @contextmanager
+    def stage(self, name):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def totals(self):
+        return {
+            "wall_time_s": sum(s["wall_time_s"] for s in self.stages),
+            "cpu_time_s": sum(s["cpu_time_s"] for s in self.stages),
+            "peak_memory_bytes": max((s["peak_memory_bytes"] or 0 for s in self.stages), default=0) if self.trace_memory else None,
+        }
+
+    def log(self):
+        """Print a table of the stages, slowest first"""
+        if not self.enabled:
+            return
+        console.rule("Profile")
+        for s in sorted(self.stages, key=lambda s: s["wall_time_s"], reverse=True):
+            peak = f"{s['peak_memory_bytes'] / 1e6:9.1f} MB" if s["peak_memory_bytes"] is not None else ""
+            console.log(f"{s['stage']:<30} {s['wall_time_s']:9.3f} s wall {s['cpu_time_s']:9.3f} s CPU {peak}")
+        totals = self.totals()
+        console.log(f"{'total':<30} {totals['wall_time_s']:9.3f} s wall {totals['cpu_time_s']:9.3f} s CPU")
+
+    def write(self, path):
+        """Write the stages and their totals to the json file `path`"""
+        if not self.enabled:
+            return
+        self.end()
+        with open(path, 'w') as f:
+            json.dump({"stages": self.stages, "total": self.totals()}, f, indent=4)
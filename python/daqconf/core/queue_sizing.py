@@ -0,0 +1,185 @@
+import re
+from collections import namedtuple, defaultdict
+from math import ceil
+from rich.console import Console
+
+from daqconf.core.conf_utils import Direction
+from daqconf.core.latency_buffers import LATENCY_BUFFER_ELEMENTS
+
+console = Console()
+
+# Smallest queue capacity, as the default of ModuleGraph.connect_modules
+MIN_QUEUE_SIZE = 10
+
+# The expected message rates that the queue sizes are computed from
+QueueRates = namedtuple('QueueRates', ['clock_speed_hz',
+                                       'data_rate_slowdown_factor',
+                                       'tp_rate_per_link_hz',
+                                       'tpset_rate_per_link_hz',
+                                       'ta_rate_hz',
+                                       'trigger_rate_hz'])
+
+# Model of a plugin: `rate(rates, input_rate, queue_name, sink)` is the
+# rate in Hz of the messages that a module sends to the queue
+# `queue_name` from its `sink`, `rates` being the QueueRates and
+# `input_rate` the rate of the messages it gets from its input queues
+# (None if it has none, or if it isn't known). It returns None if it
+# isn't known. `latency_ms` is how long the module can take to get to a
+# message of its input queues
+PluginModel = namedtuple('PluginModel', ['rate', 'latency_ms'])
+
+def _no_rate(rates, input_rate, queue_name, sink):
+    return None
+
+def _frame_rate(rates, input_rate, queue_name, sink):
+    """Rate of the latency buffer elements of a link, whose queue is <frontend type>_link_<source ID>"""
+    element = LATENCY_BUFFER_ELEMENTS.get(queue_name.split('_link_')[0])
+    if element is None:
+        return None
+    return rates.clock_speed_hz / (element.ticks * rates.data_rate_slowdown_factor)
+
+def _fixed(field):
+    """A module that sends messages at the QueueRates' `field`"""
+    def rate(rates, input_rate, queue_name, sink):
+        return getattr(rates, field)
+    return rate
+
+def _passthrough(field):
+    """A module that forwards what it gets, at the QueueRates' `field`
+    when its inputs aren't queues"""
+    def rate(rates, input_rate, queue_name, sink):
+        return input_rate if input_rate is not None else getattr(rates, field)
+    return rate
+
+def _tp_out(rates, input_rate, queue_name, sink):
+    return rates.tp_rate_per_link_hz if sink == 'tp_out' else None
+
+PLUGIN_MODELS = {
+    # Readout
+    'FakeCardReader':              PluginModel(_frame_rate, 0),
+    'FelixCardReader':             PluginModel(_frame_rate, 0),
+    'NICReceiver':                 PluginModel(_frame_rate, 0),
+    'DataLinkHandler':             PluginModel(_tp_out, 1),
+    # HSI
+    'FakeHSIEventGenerator':       PluginModel(_fixed('trigger_rate_hz'), 0),
+    'HSIReadout':                  PluginModel(_fixed('trigger_rate_hz'), 0),
+    'HSIDataLinkHandler':          PluginModel(_no_rate, 1),
+    # Trigger
+    'TPChannelFilter':             PluginModel(_passthrough('tpset_rate_per_link_hz'), 1),
+    'TPSetTee':                    PluginModel(_passthrough('tpset_rate_per_link_hz'), 1),
+    'FakeTPCreatorHeartbeatMaker': PluginModel(_passthrough('tpset_rate_per_link_hz'), 1),
+    'TPZipper':                    PluginModel(_passthrough('tpset_rate_per_link_hz'), 10),
+    'TPBuffer':                    PluginModel(_no_rate, 1),
+    'TriggerActivityMaker':        PluginModel(_fixed('ta_rate_hz'), 10),
+    'TASetTee':                    PluginModel(_passthrough('ta_rate_hz'), 1),
+    'TAZipper':                    PluginModel(_passthrough('ta_rate_hz'), 10),
+    'TABuffer':                    PluginModel(_no_rate, 1),
+    'TriggerCandidateMaker':       PluginModel(_fixed('trigger_rate_hz'), 10),
+    'TimingTriggerCandidateMaker': PluginModel(_fixed('trigger_rate_hz'), 1),
+    'TCTee':                       PluginModel(_passthrough('trigger_rate_hz'), 1),
+    'TCBuffer':                    PluginModel(_no_rate, 1),
+    'ModuleLevelTrigger':          PluginModel(_fixed('trigger_rate_hz'), 10),
+}
+
+_queue_uri = re.compile(r"^(queue://\w+:)(\d+)$")
+
+def _module_name(address):
+    return address.split('.')[0]
+
+def _sink_name(address):
+    return address.split('.', 1)[1] if '.' in address else None
+
+def _app_queues(app, connections):
+    """The addresses of the producers and consumers of each queue
+    connection of `app`, by uid"""
+    queues = {}
+    for connection in connections:
+        if connection.service_type == "kQueue":
+            queues[connection.uid] = ([], [])
+    for queue in app.modulegraph.queues:
+        if queue.name in queues:
+            queues[queue.name] = (queue.push_modules, queue.pop_modules)
+    # Queues made from endpoints of this app only
+    for endpoint in app.modulegraph.endpoints:
+        if endpoint.external_name in queues and endpoint.internal_name is not None:
+            push, pop = queues[endpoint.external_name]
+            (push if endpoint.direction == Direction.OUT else pop).append(endpoint.internal_name)
+    return queues
+
+def compute_app_queue_sizes(app, connections, rates, burst_ms):
+    """
+    The capacity that each queue of `app` needs to hold `burst_ms` of
+    messages on top of the processing latency of its consumers, by uid,
+    for the queues whose message rate follows from the PLUGIN_MODELS
+    """
+    queues = _app_queues(app, connections)
+    plugins = {module.name: module.plugin for module in app.modulegraph.modules}
+    inputs = defaultdict(list)
+    for uid, (push, pop) in queues.items():
+        for address in pop:
+            inputs[_module_name(address)].append(uid)
+
+    queue_rates = {}
+    visiting = set()
+
+    def queue_rate(uid):
+        if uid in queue_rates:
+            return queue_rates[uid]
+        if uid in visiting:
+            # A loop of queues: nothing to go on
+            return None
+        visiting.add(uid)
+        total = None
+        for address in queues[uid][0]:
+            model = PLUGIN_MODELS.get(plugins.get(_module_name(address)))
+            if model is None:
+                total = None
+                break
+            input_rates = [queue_rate(input_uid) for input_uid in inputs[_module_name(address)]]
+            known = [r for r in input_rates if r is not None]
+            rate = model.rate(rates, sum(known) if known else None, uid, _sink_name(address))
+            if rate is None:
+                total = None
+                break
+            total = rate if total is None else total + rate
+        visiting.discard(uid)
+        queue_rates[uid] = total
+        return total
+
+    sizes = {}
+    for uid, (push, pop) in queues.items():
+        rate = queue_rate(uid)
+        if rate is None:
+            continue
+        latency_ms = max([PLUGIN_MODELS[plugins[_module_name(a)]].latency_ms for a in pop
+                          if plugins.get(_module_name(a)) in PLUGIN_MODELS], default=0)
+        sizes[uid] = max(MIN_QUEUE_SIZE, ceil(rate * (burst_ms + latency_ms) / 1000))
+    return sizes
+
+def size_queues(the_system, rates, burst_ms, verbose=False):
+    """
+    Rewrite the capacity in the URIs of the queue connections of
+    `the_system`, made by make_system_connections, with the sizes from
+    compute_app_queue_sizes. The queues whose rate isn't known keep the
+    sizes the generators gave them. Returns a dictionary from app name to
+    uid to (old size, new size) of the resized queues
+    """
+    resized = {}
+    for app_name, app in the_system.apps.items():
+        sizes = compute_app_queue_sizes(app, the_system.connections[app_name], rates, burst_ms)
+        for connection in the_system.connections[app_name]:
+            match = _queue_uri.match(connection.uri) if connection.uid in sizes else None
+            if match is None:
+                continue
+            old_size = int(match.group(2))
+            if old_size != sizes[connection.uid]:
+                connection.uri = f"{match.group(1)}{sizes[connection.uid]}"
+                resized.setdefault(app_name, {})[connection.uid] = (old_size, sizes[connection.uid])
+                if verbose:
+                    console.log(f"Queue {connection.uid} of {app_name}: {old_size} -> {sizes[connection.uid]}")
+
+    n_resized = sum(len(queues) for queues in resized.values())
+    old_total = sum(old for queues in resized.values() for old, _ in queues.values())
+    new_total = sum(new for queues in resized.values() for _, new in queues.values())
+    console.log(f"Resized {n_resized} queues for {burst_ms} ms bursts, from {old_total} to {new_total} elements in total")
+    return resized
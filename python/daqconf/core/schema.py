@@ -0,0 +1,137 @@
+# Set moo schema search path
+from dunedaq.env import get_moo_model_path
+import moo.io
+moo.io.default_load_path = get_moo_model_path()
+
+import hashlib
+import importlib
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+import moo.otypes
+
+def schema_cache_dir():
+    """Where evaluated schemas are kept between runs. Set
+    DAQCONF_SCHEMA_CACHE to another directory to move it, or to an empty
+    string to turn the cache off"""
+    cache_dir = os.getenv("DAQCONF_SCHEMA_CACHE")
+    if cache_dir is None:
+        cache_dir = Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "daqconf" / "schemas"
+    return Path(cache_dir) if cache_dir else None
+
+_jsonnet_import = re.compile(r"""\bimport(?:str)?\s+['"]([^'"]+)['"]""")
+
+def _find_schema(schema_file, search_path, relative_to=None):
+    candidates = [Path(relative_to) / schema_file] if relative_to else []
+    candidates += [Path(d) / schema_file for d in search_path]
+    for candidate in candidates:
+        if candidate.is_file():
+            return candidate.resolve()
+    return None
+
+def _schema_files(schema_file, search_path):
+    """The file `schema_file` resolves to and the files it imports,
+    recursively, as (path, mtime) pairs. Imports that aren't in the
+    search path, like moo's own moo.jsonnet, are listed by name with no
+    mtime. None if `schema_file` itself can't be found"""
+    if _find_schema(schema_file, search_path) is None:
+        return None
+    found = dict()
+    todo = [(schema_file, None)]
+    while todo:
+        name, relative_to = todo.pop()
+        path = _find_schema(name, search_path, relative_to)
+        if path is None:
+            found[name] = None
+            continue
+        if path in found:
+            continue
+        found[path] = path.stat().st_mtime_ns
+        if path.suffix in ('.jsonnet', '.libsonnet'):
+            todo += [(imported, path.parent) for imported in _jsonnet_import.findall(path.read_text())]
+    return sorted([str(path), mtime] for path, mtime in found.items())
+
+def _schema_cache_file(schema_file):
+    cache_dir = schema_cache_dir()
+    if cache_dir is None:
+        return None
+    search_path = [str(d) for d in get_moo_model_path()]
+    files = _schema_files(schema_file, search_path)
+    if files is None:
+        return None
+    key = json.dumps([schema_file, search_path, files, moo.__file__])
+    return cache_dir / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+def load_schema(schema_file):
+    """The evaluated moo schema `schema_file`, as moo.io.load returns it.
+    The result is kept on disk, keyed by the path the schema resolves to
+    in get_moo_model_path(), the search path itself and the modification
+    times of the schema and of everything it imports, so that jsonnet is
+    only evaluated again when one of those changes"""
+    cache_file = _schema_cache_file(schema_file)
+    if cache_file is not None and cache_file.exists():
+        try:
+            with open(cache_file, 'r') as f:
+                return json.load(f)
+        except (OSError, json.decoder.JSONDecodeError):
+            pass
+
+    schema = moo.io.load(schema_file)
+
+    if cache_file is not None:
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=cache_file.parent, suffix=".tmp")
+            with os.fdopen(fd, 'w') as f:
+                json.dump(schema, f)
+            os.replace(tmp, cache_file)
+        except OSError:
+            # The cache is only an optimisation: a read-only home is fine
+            pass
+    return schema
+
+# Schema file -> the types made from it
+_loaded_types = dict()
+
+def load_types(schema_file):
+    """moo.otypes.load_types, but each schema file is only evaluated
+    once per process, and the evaluated schema is reused from the
+    on-disk cache across processes (see load_schema)"""
+    if schema_file not in _loaded_types:
+        _loaded_types[schema_file] = [moo.otypes.make_type(**t) for t in load_schema(schema_file)]
+    return _loaded_types[schema_file]
+
+class LazyTypes:
+    """Stand-in for a module of moo types (eg dunedaq.dfmodules.datawriter)
+    that only loads the schemas providing it when one of its attributes is
+    first used"""
+
+    def __init__(self, module_name, *schema_files):
+        self._module_name = module_name
+        self._schema_files = schema_files
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            for schema_file in self._schema_files:
+                load_types(schema_file)
+            self._module = importlib.import_module(self._module_name)
+        return self._module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __repr__(self):
+        return f"LazyTypes({self._module_name!r}, loaded={self._module is not None})"
+
+def lazy_types(module_name, *schema_files):
+    """`module_name`, made from `schema_files` when first used. Use in
+    place of
+
+        moo.otypes.load_types(schema_file)
+        import module_name
+
+    so that importing a generator doesn't evaluate its schemas"""
+    return LazyTypes(module_name, *schema_files)
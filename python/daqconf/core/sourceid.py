@@ -5,6 +5,8 @@ moo.io.default_load_path = get_moo_model_path()
 from rich.console import Console
 from enum import Enum
 from collections import namedtuple, defaultdict
+import bisect
+import math
 
 console = Console()
 
@@ -39,13 +41,46 @@ class TAInfo:
 class TCInfo:
     ru_count = 0
 
+# SourceID IDs are 32-bit unsigned integers
+MAX_SOURCE_ID = 2**32 - 1
+
 class SourceIDBroker:
-    sourceid_map = {}
+    """
+    Hands out and records the SourceIDs of each subsystem, with the info
+    object each one was registered with. For each subsystem, the IDs
+    that are still free are kept as a sorted list of disjoint [start,
+    end) intervals, so finding the next free ID is a bisection rather
+    than a scan of the IDs in use. Each broker has its own IDs, so
+    several configurations can be generated in one process.
+    """
     debug: bool = False
 
+    def __init__(self, debug=False, max_source_id=MAX_SOURCE_ID):
+        self.debug = debug
+        self.max_source_id = max_source_id
+        # subsystem -> {SourceID -> info}
+        self.sourceid_map = {}
+        # subsystem -> (starts, ends) of the free intervals
+        self._free = {}
+        # subsystem -> {(type(info), info) -> [SourceIDs]}, for the info
+        # objects that can be hashed. The type is part of the key because
+        # eg FWTPID and FWTPOUTID tuples with the same values are equal
+        self._info_index = {}
+
+    def _free_intervals(self, subsystem):
+        if subsystem not in self._free:
+            self._free[subsystem] = ([-math.inf], [self.max_source_id + 1])
+        return self._free[subsystem]
+
     def get_next_source_id(self, subsystem, start_id = 0):
-        while self.source_id_exists(subsystem, start_id):
-            start_id += 1
+        starts, ends = self._free_intervals(subsystem)
+        # The last free interval that starts at or before start_id
+        i = bisect.bisect_right(starts, start_id) - 1
+        if i < 0 or ends[i] <= start_id:
+            # start_id is in use, the next free ID starts the next interval
+            if i + 1 == len(starts):
+                raise RuntimeError(f"No SourceID from {start_id} up to {self.max_source_id} is free for subsystem {subsystem}")
+            start_id = starts[i + 1]
         if self.debug: console.log(f"Returning {start_id} from get_next_source_id for subsystem {subsystem}")
         return start_id
 
@@ -62,8 +97,33 @@ class SourceIDBroker:
             return sid in self.sourceid_map[subsystem]
         return False
 
+    def find_source_ids(self, subsystem, info):
+        """The SourceIDs of `subsystem` registered with an info object
+        equal to, and of the same type as, `info`, in the order they were
+        registered"""
+        try:
+            return list(self._info_index.get(subsystem, {}).get((type(info), info), []))
+        except TypeError:
+            # info can't be hashed, so wasn't indexed
+            return [sid for sid, sid_info in self.get_all_source_ids(subsystem).items()
+                    if type(sid_info) == type(info) and sid_info == info]
+
+    def find_infos(self, subsystem, info_type, **fields):
+        """
+        The (SourceID, info) pairs of `subsystem`, in SourceID order, of
+        the info objects of type `info_type` whose attributes have the
+        values of `fields`, eg find_infos("Detector_Readout", FWTPID,
+        host=host, card=card). Only info objects that can be hashed are
+        found
+        """
+        return sorted((sid, info) for (type_, info), sids in self._info_index.get(subsystem, {}).items()
+                      if type_ is info_type and all(getattr(info, k) == v for k, v in fields.items())
+                      for sid in sids)
+
     def register_source_id(self, subsystem, sid, info):
         if self.debug: console.log(f"Going to register Source ID {sid} for Subsystem {subsystem} with info object {info}")
+        if sid > self.max_source_id:
+            raise ValueError(f"SourceID {sid} for Subsystem {subsystem} is more than the largest SourceID, {self.max_source_id}")
         if not subsystem in self.sourceid_map:
             self.sourceid_map[subsystem] = {}
         if not self.source_id_exists(subsystem, sid):
@@ -71,6 +131,24 @@ class SourceIDBroker:
         else:
             raise ValueError(f"SourceID {sid} already exists for Subsystem {subsystem}!")
 
+        # Take sid out of the free interval that contains it
+        starts, ends = self._free_intervals(subsystem)
+        i = bisect.bisect_right(starts, sid) - 1
+        start, end = starts[i], ends[i]
+        del starts[i], ends[i]
+        if sid + 1 < end:
+            starts.insert(i, sid + 1)
+            ends.insert(i, end)
+        if start < sid:
+            starts.insert(i, start)
+            ends.insert(i, sid)
+
+        if info is not None:
+            try:
+                self._info_index.setdefault(subsystem, {}).setdefault((type(info), info), []).append(sid)
+            except TypeError:
+                pass
+
     def register_readout_source_ids(self, dro_configs, tp_mode: TPGenMode):
         if self.debug: console.log(f"Generating Detector_Readout Source IDs, tp_mode is {tp_mode}, dro_configs are {dro_configs}")
         fw_tp_ids = []
@@ -110,7 +188,6 @@ class SourceIDBroker:
         tc_info = TCInfo()
         ta_infos = {}
         fw_tp_infos = {}
-        dro_sids = self.get_all_source_ids("Detector_Readout")
 
         if self.debug: console.log(f"Generating Trigger Source IDs, tp_mode is {tp_mode}, dro_configs are {dro_configs}")
 
@@ -131,15 +208,12 @@ class SourceIDBroker:
                     fw_tp_id = FWTPID(dro_config.host, dro_config.card, link.dro_slr)
                     if fw_tp_id not in fw_tp_infos:
                         fwtp_link = TPInfo(link)
-                        fwtpid_found = False
-                        for fwsid,fwid in dro_sids.items():
-                            if isinstance(fwid, FWTPID) and fwid == fw_tp_id:
-                                if fwtpid_found == True:
-                                    raise ValueError(f"Multiple matches found for firmware TP ID {fw_tp_id}")
-                                fwtp_link.dro_source_id = fwsid
-                                fwtpid_found = True
-                        if fwtpid_found == False:
+                        fwsids = self.find_source_ids("Detector_Readout", fw_tp_id)
+                        if len(fwsids) > 1:
+                            raise ValueError(f"Multiple matches found for firmware TP ID {fw_tp_id}")
+                        if len(fwsids) == 0:
                             raise ValueError(f"No match found for firmware TP ID {fw_tp_id}")
+                        fwtp_link.dro_source_id = fwsids[0]
                         sid = self.get_next_source_id("Trigger")
                         if self.debug: console.log(f"Adding Trigger SourceID {sid} for FW TP ID {fw_tp_id}")
                         self.register_source_id("Trigger", sid, fwtp_link)
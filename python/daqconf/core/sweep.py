@@ -0,0 +1,144 @@
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+from rich.console import Console
+
+from daqconf.core.config_file import _strict_recursive_update
+
+console = Console()
+
+# One component of a parameter path: a key, optionally indexing a list
+# with [N] or with [*] for all of its elements
+_path_component = re.compile(r"^(\w+)(?:\[(\*|\d+)\])?$")
+
+def load_sweep_file(filename):
+    """
+    Read a sweep file: a json object from parameter paths, eg
+    "readout.latency_buffer_size" or "dataflow.apps[*].token_count", to
+    the list of values each should take. Returns it as a dict
+    """
+    with open(filename, 'r') as f:
+        try:
+            grids = json.load(f)
+        except json.decoder.JSONDecodeError as e:
+            raise RuntimeError(f"Couldn't parse sweep file {filename}, error: {e}")
+    if not isinstance(grids, dict) or len(grids) == 0:
+        raise RuntimeError(f"Sweep file {filename} should hold a non-empty object of parameter paths to lists of values")
+    for path, values in grids.items():
+        if not isinstance(values, list) or len(values) == 0:
+            raise RuntimeError(f"Sweep parameter '{path}' in {filename} should have a non-empty list of values, not {values}")
+    return grids
+
+def sweep_points(grids):
+    """All the combinations of the values in `grids`, as dicts of
+    parameter path -> value, in the order of itertools.product"""
+    paths = list(grids.keys())
+    return [dict(zip(paths, values)) for values in itertools.product(*grids.values())]
+
+def _set_value(data, components, value, path):
+    name, index = components[0]
+    if not isinstance(data, dict) or name not in data:
+        available = list(data.keys()) if isinstance(data, dict) else []
+        raise RuntimeError(f"'{name}' key of '{path}' is unknown, available keys are: {available}")
+    if index is None:
+        targets = [data]
+        keys = [name]
+    else:
+        if not isinstance(data[name], list):
+            raise RuntimeError(f"'{name}' in '{path}' isn't a list")
+        if index == "*":
+            if len(data[name]) == 0:
+                raise RuntimeError(f"'{name}' in '{path}' is empty, list its elements in the configuration file to sweep over them")
+            keys = list(range(len(data[name])))
+        else:
+            if int(index) >= len(data[name]):
+                raise RuntimeError(f"'{name}' in '{path}' only has {len(data[name])} elements")
+            keys = [int(index)]
+        targets = [data[name]] * len(keys)
+    for target, key in zip(targets, keys):
+        if len(components) == 1:
+            target[key] = value
+        else:
+            _set_value(target[key], components[1:], value, path)
+
+def apply_sweep_point(config_data, point):
+    """
+    A copy of `config_data` (a parsed configuration, eg a
+    confgen.daqconf_multiru_gen) with the parameter values of `point`,
+    validated like the values of a configuration file
+    """
+    parameters = config_data.pod()
+    for path, value in point.items():
+        components = []
+        for component in path.split('.'):
+            match = _path_component.match(component)
+            if match is None:
+                raise RuntimeError(f"Can't parse '{component}' in sweep parameter '{path}'")
+            components.append(match.groups())
+        _set_value(parameters, components, value, path)
+
+    point_config = type(config_data)()
+    _strict_recursive_update(point_config.pod(), parameters)
+    point_config.update(parameters)
+    return point_config
+
+def link_identical_files(output_dir, store_dir):
+    """
+    Replace each file under `output_dir` by a hard link to the file with
+    the same contents in `store_dir`, adding it to `store_dir` if it
+    isn't there yet, so that the files that several configurations have
+    in common are only stored once. Returns the number of files that
+    were already in the store
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    shared = 0
+    for path in sorted(Path(output_dir).rglob('*')):
+        if not path.is_file() or path.is_symlink():
+            continue
+        stored = store_dir / f"{hashlib.sha256(path.read_bytes()).hexdigest()}{path.suffix}"
+        try:
+            if stored.exists():
+                if not os.path.samefile(stored, path):
+                    tmp = path.with_name(f".{path.name}.link")
+                    os.link(stored, tmp)
+                    os.replace(tmp, path)
+                shared += 1
+            else:
+                os.link(path, stored)
+        except OSError as e:
+            # Eg a file system without hard links: the files just aren't shared
+            console.log(f"Couldn't link {path} to {stored}: {e}")
+            return shared
+    return shared
+
+def unlink_shared_files(output_dir):
+    """
+    Give each file under `output_dir` that is a hard link shared with
+    other configurations (see link_identical_files) its own copy, so
+    that rewriting it in place doesn't change the others. Returns the
+    number of files copied
+    """
+    copied = 0
+    for path in sorted(Path(output_dir).rglob('*')):
+        if not path.is_file() or path.is_symlink() or path.stat().st_nlink < 2:
+            continue
+        tmp = path.with_name(f".{path.name}.copy")
+        shutil.copy2(path, tmp)
+        os.replace(tmp, path)
+        copied += 1
+    return copied
+
+def prune_store(store_dir):
+    """Remove the files of `store_dir` that no configuration links to
+    any more. Returns the number of files removed"""
+    removed = 0
+    for stored in Path(store_dir).iterdir():
+        if stored.is_file() and stored.stat().st_nlink == 1:
+            stored.unlink()
+            removed += 1
+    return removed
@@ -1,5 +1,36 @@
 from daqconf.core.conf_utils import Direction
 import networkx as nx
+from collections import defaultdict
+
+class ConnectionRegistry:
+    """
+    The ConnectionIds of one application, in the order they were added,
+    indexed by uid. Iterating over it gives the connections in that order,
+    as the `connections` list of the app's appfwk.Init expects them.
+    """
+
+    def __init__(self, connections=None):
+        self._connections = []
+        self._uids = set()
+        for connection in connections if connections else []:
+            self.append(connection)
+
+    def append(self, connection):
+        """Add `connection`, even if one with the same uid is already there"""
+        self._connections.append(connection)
+        self._uids.add(connection.uid)
+
+    def __contains__(self, uid):
+        return uid in self._uids
+
+    def __iter__(self):
+        return iter(self._connections)
+
+    def __len__(self):
+        return len(self._connections)
+
+    def __repr__(self):
+        return f"ConnectionRegistry({self._connections!r})"
 
 class System:
     """
@@ -18,10 +49,13 @@ class System:
     def __init__(self, apps=None, connections=None, app_start_order=None,
                  first_port=12345):
         self.apps=apps if apps else dict()
-        self.connections = connections if connections else dict()
+        self.connections = dict()
+        for app_name, app_connections in (connections if connections else dict()).items():
+            self.connections[app_name] = ConnectionRegistry(app_connections)
         self.app_start_order = app_start_order
         self._next_port = first_port
         self.digraph = None
+        self._digraph_cache = dict()
 
     def __rich_repr__(self):
         yield "apps", self.apps
@@ -29,6 +63,11 @@ class System:
         yield "app_connections", self.app_connections
         yield "app_start_order", self.app_start_order
 
+    def reset_connections(self, app_name):
+        """Start a new, empty ConnectionRegistry for `app_name`"""
+        self.connections[app_name] = ConnectionRegistry()
+        return self.connections[app_name]
+
     def get_fragment_producers(self):
         """Get a list of all the fragment producers in the system"""
         all_producers = []
@@ -42,30 +81,52 @@ class System:
                 all_producers.append(producer)
         return all_producers
 
+    def _digraph_key(self):
+        """The state that the digraph depends on: which apps are in the
+        system, and how many times each of their modulegraphs has changed"""
+        return tuple((name, app.modulegraph, app.modulegraph.generation) for name, app in self.apps.items())
+
     def make_digraph(self, for_toposort=False):
+        """
+        Make a networkx DiGraph of the dependencies between the
+        applications in the system. The result is cached until one of the
+        apps' modulegraphs changes, and a copy is returned so that callers
+        can modify it freely
+        """
+        key = self._digraph_key()
+        cached = self._digraph_cache.get(for_toposort)
+        if cached is None or cached[0] != key:
+            cached = (key, self._build_digraph(for_toposort))
+            self._digraph_cache[for_toposort] = cached
+        return cached[1].copy()
+
+    def _build_digraph(self, for_toposort):
         deps = nx.DiGraph()
 
         for app_name in self.apps.keys():
             deps.add_node(app_name)
 
+        # Join OUT endpoints to IN endpoints on their external name
+        in_endpoints = defaultdict(list)
+        for to_app_n, to_app in self.apps.items():
+            for to_ep in to_app.modulegraph.endpoints:
+                if to_ep.direction == Direction.IN:
+                    in_endpoints[to_ep.external_name].append((to_app_n, to_ep))
+
         for from_app_n, from_app in self.apps.items():
             for from_ep in from_app.modulegraph.endpoints:
-                if from_ep.direction == Direction.OUT:
-                    for to_app_n, to_app in self.apps.items():
-                        for to_ep in to_app.modulegraph.endpoints:
-                            if to_ep.direction == Direction.IN:
-                                if from_ep.external_name == to_ep.external_name:
-                                    color="red"
-                                    if from_ep.toposort or to_ep.toposort:
-                                        color="blue"
-                                    elif for_toposort:
-                                        continue
-                                    deps.add_edge(from_app_n, to_app_n, label=to_ep.external_name, color=color)
-
+                if from_ep.direction != Direction.OUT:
+                    continue
+                for to_app_n, to_ep in in_endpoints.get(from_ep.external_name, []):
+                    color="red"
+                    if from_ep.toposort or to_ep.toposort:
+                        color="blue"
+                    elif for_toposort:
+                        continue
+                    deps.add_edge(from_app_n, to_app_n, label=to_ep.external_name, color=color)
 
         return deps
 
-
     def export(self, filename):
         self.digraph = self.make_digraph()
         nx.drawing.nx_pydot.write_dot(self.digraph, filename)